@@ -0,0 +1,90 @@
+import re
+import json
+import logging
+from json.decoder import scanstring
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library parser is used without it
+    orjson = None
+
+# Every escape in the JS string literal, read in pairs so an escaped backslash is not split,
+# and every bare double quote, which a single-quoted literal does not escape
+JS_ESCAPE = re.compile(r'\\(.)|"', re.DOTALL)
+STOREPAGE_FEED_KEY = re.compile(r'"storepageFeed"\s*:\s*')
+
+_decoder = json.JSONDecoder()
+
+
+def _json_escape(match):
+    if match.group(1) is None:
+        return '\\"'
+    # JS accepts escapes JSON does not, e.g. \' or \$, and reads them as the bare character
+    return match.group(0) if match.group(1) in '"\\/bfnrtu' else match.group(1)
+
+
+def _unescape_literal(literal):
+    # Rewrite the body of a JS string literal as a JSON string and decode it
+    text, _ = scanstring(JS_ESCAPE.sub(_json_escape, literal) + '"', 0, False)
+    return text
+
+
+def payload_text(script_text):
+    """Return the JSON text embedded in the apolloCacheData script.
+
+    The payload is usually a JS string literal holding escaped JSON; it is
+    unescaped straight out of the script text in one pass. A payload that is
+    already plain JSON is returned as is. Literals with a prefix before the
+    payload (e.g. "5:{...}") or in single quotes are unescaped from the
+    first brace to the last.
+    """
+    start = script_text.find('{')
+    if start < 0:
+        raise json.JSONDecodeError("No JSON object in the Apollo script", script_text, 0)
+    end = script_text.rfind('}') + 1
+    quote = script_text[start - 1] if start else ''
+    if quote == '"':
+        try:
+            text, _ = scanstring(script_text, start, False)
+            return text
+        except json.JSONDecodeError:
+            # Drop the escapes JSON rejects and unescape again, only on the payload itself
+            return _unescape_literal(script_text[start:end])
+    if quote != "'" and script_text.startswith('{"', start):
+        return script_text[start:end]
+    return _unescape_literal(script_text[start:end])
+
+
+def loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def load_apollo_payload(script_text):
+    """Decode the whole apolloCacheData payload."""
+    return loads(payload_text(script_text))
+
+
+def find_storepage_feed(json_data):
+    for result in json_data.get('platformProps', {}).get('apolloCacheData', []):
+        storepage_feed = result.get('data', {}).get('storepageFeed', {})
+        if storepage_feed:
+            return storepage_feed
+    return None
+
+
+def extract_storepage_feed(script_text):
+    """Decode only the storepageFeed entry of the apolloCacheData payload.
+
+    The rest of the Apollo cache (other queries, experiments, the layout) is
+    skipped rather than parsed. Falls back to decoding the full payload if the
+    key cannot be found directly.
+    """
+    text = payload_text(script_text)
+    for match in STOREPAGE_FEED_KEY.finditer(text):
+        storepage_feed, _ = _decoder.raw_decode(text, match.end())
+        if storepage_feed:
+            return storepage_feed
+    logging.info("storepageFeed not found directly, decoding the full Apollo payload")
+    return find_storepage_feed(loads(text))
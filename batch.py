@@ -0,0 +1,147 @@
+import os
+import time
+import logging
+import threading
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor
+
+# Largest number of restaurants accepted in one batch request
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '500'))
+# Restaurants of one platform scraped at the same time, 0 for no limit besides the workers
+BATCH_PLATFORM_LIMIT = int(os.environ.get('BATCH_PLATFORM_LIMIT', '0'))
+# 'pipeline' overlaps page loads with parsing and saving (see pipeline.py), 'scheduler' scrapes one restaurant per worker
+BATCH_ENGINE = os.environ.get('BATCH_ENGINE', 'pipeline')
+
+
+def parse_batch(payload, platforms):
+    """Validate a batch request body, returning the list of {platform, url, menu_id} entries."""
+    restaurants = payload.get('restaurants')
+    if not isinstance(restaurants, list) or not restaurants:
+        raise ValueError("'restaurants' must be a non-empty list of {platform, url, menu_id}")
+    if len(restaurants) > BATCH_MAX_SIZE:
+        raise ValueError(f"A batch can hold at most {BATCH_MAX_SIZE} restaurants")
+    entries = []
+    for position, restaurant in enumerate(restaurants):
+        if not isinstance(restaurant, dict):
+            raise ValueError(f"Restaurant {position} must be an object")
+        platform = restaurant.get('platform')
+        url = restaurant.get('url')
+        menu_id = restaurant.get('menu_id')
+        if platform not in platforms:
+            raise ValueError(f"Restaurant {position}: 'platform' must be one of {', '.join(platforms)}")
+        if not url or menu_id in (None, ''):
+            raise ValueError(f"Restaurant {position}: 'url' and 'menu_id' are required")
+        entries.append({'platform': platform, 'url': url, 'menu_id': str(menu_id)})
+    return entries
+
+
+def interleave_platforms(entries):
+    # Alternate platforms so each one has work from the start of the batch
+    by_platform = {}
+    for entry in entries:
+        by_platform.setdefault(entry['platform'], []).append(entry)
+    return [entry for group in zip_longest(*by_platform.values()) for entry in group if entry is not None]
+
+
+class BatchScheduler:
+    """Run a batch of restaurant scrapes on a bounded number of workers.
+
+    scrapers maps a platform to scrape(url, menu_id, report) returning the
+    restaurant data; each call checks out its own browser, so workers should
+    not exceed the driver pool. At most platform_limit restaurants of one
+    platform run at once, a worker picks the next restaurant of another
+    platform instead of waiting. restaurants holds the live per-restaurant
+    status and timing.
+    """
+
+    def __init__(self, entries, scrapers, workers, platform_limit=BATCH_PLATFORM_LIMIT, progress=None):
+        self.scrapers = scrapers
+        self.workers = max(1, workers)
+        self.platform_limit = platform_limit or self.workers
+        self.progress = progress
+        self.restaurants = [
+            {**entry, 'status': 'queued', 'started_at': None, 'finished_at': None, 'elapsed': None,
+             'items': None, 'error': None}
+            for entry in entries
+        ]
+        self._pending = interleave_platforms(self.restaurants)
+        self._running = {}
+        self._condition = threading.Condition()
+        self.done = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def _next(self):
+        with self._condition:
+            while self._pending:
+                for position, restaurant in enumerate(self._pending):
+                    if self._running.get(restaurant['platform'], 0) < self.platform_limit:
+                        self._running[restaurant['platform']] = self._running.get(restaurant['platform'], 0) + 1
+                        return self._pending.pop(position)
+                self._condition.wait()
+            return None
+
+    def _finish(self, restaurant):
+        with self._condition:
+            self._running[restaurant['platform']] -= 1
+            self.done += 1
+            self._condition.notify_all()
+        if self.progress:
+            self.progress(self.done, len(self.restaurants))
+
+    def _scrape(self, restaurant):
+        restaurant['status'] = 'running'
+        restaurant['started_at'] = time.time()
+        report = {}
+        try:
+            restaurant_data = self.scrapers[restaurant['platform']](restaurant['url'], restaurant['menu_id'], report)
+            if restaurant_data:
+                restaurant['status'] = report.get('status', 'finished')
+                restaurant['items'] = sum(len(category['menu'])
+                                          for category in restaurant_data.get('data', {}).get('categories', []))
+            else:
+                restaurant['status'] = 'failed'
+                restaurant['error'] = 'Failed to scrape the menu data'
+        except Exception as e:
+            logging.error(f"Error scraping {restaurant['platform']} menu {restaurant['menu_id']}: {e}")
+            restaurant['status'] = 'failed'
+            restaurant['error'] = str(e)
+        finally:
+            restaurant['finished_at'] = time.time()
+            restaurant['elapsed'] = round(restaurant['finished_at'] - restaurant['started_at'], 3)
+
+    def _work(self):
+        while True:
+            restaurant = self._next()
+            if restaurant is None:
+                return
+            try:
+                self._scrape(restaurant)
+            finally:
+                self._finish(restaurant)
+
+    def run(self):
+        self.started_at = time.time()
+        if self.progress:
+            self.progress(0, len(self.restaurants))
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch-scrape') as executor:
+            for future in [executor.submit(self._work) for _ in range(self.workers)]:
+                future.result()
+        self.finished_at = time.time()
+        return self.summary()
+
+    def summary(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0
+        counts = {}
+        for restaurant in self.restaurants:
+            counts[restaurant['status']] = counts.get(restaurant['status'], 0) + 1
+        scraped = counts.get('finished', 0)
+        return {
+            'restaurants': len(self.restaurants),
+            'statuses': counts,
+            'elapsed': round(elapsed, 3),
+            # Only restaurants that needed a browser count towards the scrape rate
+            'restaurants_per_hour': round(scraped / elapsed * 3600, 1) if elapsed and scraped else None,
+            'workers': self.workers,
+            'platform_limit': self.platform_limit,
+        }
@@ -0,0 +1,100 @@
+"""Time the apolloCacheData decoders on a payload the size of a real store page.
+
+Run from the repository root:
+
+    python benchmarks/bench_apollo_payload.py [--repeat N]
+
+There is no saved store page, so the script text is rebuilt from the scraped
+menus in the repository: restaurant_detail.json stands in for storepageFeed
+and the UberEats menus for the rest of the Apollo cache, escaped into a JS
+string literal the way the page embeds it. Every decoder is also checked
+on the other ways pages embed the payload: behind a "5:" style prefix
+inside the literal and as a single-quoted literal.
+"""
+import re
+import json
+import time
+import argparse
+
+from fixtures import load_fixture
+
+import apollo_payload
+
+
+def build_script_text():
+    store = load_fixture('restaurant_detail.json')['data']
+    apollo_cache = [
+        {'data': {'menuLayout': load_fixture('ubereats_menu_18344.json')}},
+        {'data': {'storepageFeed': store}},
+        {'data': {'recommendations': load_fixture('ubereats_menu_18345.json')}},
+    ]
+    # Pages carry non-ASCII text as UTF-8, not as \u escapes
+    payload = json.dumps({'platformProps': {'apolloCacheData': apollo_cache}}, ensure_ascii=False)
+    return f'self.__next_f.push([1,{json.dumps(payload, ensure_ascii=False)}])', payload, store
+
+
+def script_variants(payload):
+    literal = json.dumps(payload, ensure_ascii=False)
+    single_quoted = "'" + payload.replace('\\', '\\\\').replace("'", "\\'") + "'"
+    return {
+        'prefixed literal': f'self.__next_f.push([1,"5:{literal[1:]}])',
+        'single-quoted literal': f'self.__next_f.push([1,{single_quoted}])',
+    }
+
+
+def legacy_decode(json_text):
+    # The decoder parse_store_data used before apollo_payload
+    json_start = json_text.find('{')
+    json_end = json_text.rfind('}') + 1
+    json_str = json_text[json_start:json_end]
+    json_str = re.sub(r'\\(?!["\\/bfnrt])', r'\\\\', json_str)
+    json_str = json_str.encode().decode('unicode_escape')
+    return apollo_payload.find_storepage_feed(json.loads(json_str))
+
+
+def full_decode(json_text):
+    return apollo_payload.find_storepage_feed(apollo_payload.load_apollo_payload(json_text))
+
+
+def time_call(func, argument, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(argument)
+        timings.append(time.perf_counter() - started)
+    return min(timings), sum(timings) / len(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    script_text, payload, store = build_script_text()
+    print(f"Script text: {len(script_text) / 1e6:.2f} MB, "
+          f"orjson {'available' if apollo_payload.orjson else 'not installed'}")
+
+    decoders = [
+        ('legacy regex + unicode_escape', legacy_decode),
+        ('full payload', full_decode),
+        ('storepageFeed only', apollo_payload.extract_storepage_feed),
+    ]
+    baseline = None
+    for name, func in decoders:
+        best, mean, result = time_call(func, script_text, args.repeat)
+        if result != store:
+            print(f"{name}: decoded storepageFeed differs from the fixture")
+        baseline = baseline or best
+        print(f"{name:32s} best {best * 1000:7.1f} ms  mean {mean * 1000:7.1f} ms  {baseline / best:5.1f}x")
+
+    for variant, text in script_variants(payload).items():
+        for name, func in decoders:
+            try:
+                matches = func(text) == store
+            except ValueError as e:
+                matches = f"failed ({e})"
+            print(f"{variant:22s} {name:32s} {'decoded' if matches is True else matches or 'differs'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Compare the full and normalized menu response formats on the scraped menus.
+
+Run from the repository root:
+
+    python benchmarks/bench_menu_format.py [--repeat N]
+
+For each menu prints the JSON payload size, the server side cost
+(normalize + serialize on first request, serialize only once the
+normalized form is memoized) and the client side cost (parse, and parse +
+expand for clients that want the full shape back).
+"""
+import json
+import time
+import argparse
+
+from fixtures import DOORDASH_FIXTURE, UBEREATS_FIXTURES, load_fixture
+
+from menu_format import normalize_menu, expand_menu
+
+
+def unseen(restaurant):
+    # A new categories list is not in the normalized memo, as for a menu served the first time
+    return {**restaurant, 'data': {**restaurant['data'], 'categories': list(restaurant['data']['categories'])}}
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    for fixture in (DOORDASH_FIXTURE,) + UBEREATS_FIXTURES:
+        restaurant = load_fixture(fixture)
+        full_text = json.dumps(restaurant)
+        normalized_text = json.dumps(normalize_menu(restaurant))
+        if expand_menu(json.loads(normalized_text)) != restaurant:
+            print(f"{fixture}: expanded menu differs from the original")
+
+        rows = [
+            ('size (KiB)', len(full_text) / 1024, len(normalized_text) / 1024),
+            ('serialize first (ms)', best_of(lambda: json.dumps(restaurant), args.repeat) * 1000,
+             best_of(lambda: json.dumps(normalize_menu(unseen(restaurant))), args.repeat) * 1000),
+            ('serialize (ms)', best_of(lambda: json.dumps(restaurant), args.repeat) * 1000,
+             best_of(lambda: json.dumps(normalize_menu(restaurant)), args.repeat) * 1000),
+            ('parse (ms)', best_of(lambda: json.loads(full_text), args.repeat) * 1000,
+             best_of(lambda: json.loads(normalized_text), args.repeat) * 1000),
+            ('parse + expand (ms)', best_of(lambda: json.loads(full_text), args.repeat) * 1000,
+             best_of(lambda: expand_menu(json.loads(normalized_text)), args.repeat) * 1000),
+        ]
+        print(fixture)
+        for name, full, normalized in rows:
+            print(f"  {name:20s} full {full:9.1f}  normalized {normalized:9.1f}  {full / normalized:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
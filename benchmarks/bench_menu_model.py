@@ -0,0 +1,79 @@
+"""Measure the memory of the scraped menus as nested dicts and as menu_model objects.
+
+Run from the repository root:
+
+    python benchmarks/bench_menu_model.py [--repeat N] [--scales 1 10]
+
+Memory is what tracemalloc sees allocated for one menu, the times are the
+best of --repeat conversions each way. Dicts loaded from the JSON files
+share nothing, while a live scrape reuses one dict per distinct option
+group (ModifierGroupCache), so the model is compared against both: the
+gain over the loaded dicts is mostly interning, the gain over the
+scrape-shaped dicts is what slots and interned options add on top.
+"""
+import json
+import time
+import argparse
+import tracemalloc
+
+from fixtures import DOORDASH_FIXTURE, UBEREATS_FIXTURES, load_fixture, scale
+
+from menu_model import Restaurant
+
+
+def share_groups(restaurant):
+    """The menu as a live scrape holds it, identical option groups are one shared dict."""
+    groups = {}
+    for category in restaurant['data']['categories']:
+        for menu_item in category['menu']:
+            if isinstance(menu_item.get('ingredientsGroups'), list):
+                menu_item['ingredientsGroups'] = [
+                    groups.setdefault(json.dumps(group, sort_keys=True), group)
+                    for group in menu_item['ingredientsGroups']
+                ]
+    return restaurant
+
+
+def allocated(build):
+    """Bytes still allocated by build() once it returns, with the result kept alive."""
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--scales', type=int, nargs='+', default=(1, 10))
+    args = parser.parse_args()
+
+    for fixture in (DOORDASH_FIXTURE,) + UBEREATS_FIXTURES:
+        for factor in args.scales:
+            text = json.dumps(scale(load_fixture(fixture), factor))
+            dict_bytes, restaurant = allocated(lambda: json.loads(text))
+            shared_bytes, _ = allocated(lambda: share_groups(json.loads(text)))
+            model_bytes, model = allocated(lambda: Restaurant.from_dict(json.loads(text)))
+            if model.to_dict() != restaurant:
+                print(f"{fixture} {factor}x: serialized model differs from the menu")
+            from_dict = best_of(lambda: Restaurant.from_dict(restaurant), args.repeat)
+            to_dict = best_of(model.to_dict, args.repeat)
+            print(f"{fixture:28s} {factor:4d}x {model.item_count():6d} items  "
+                  f"loaded {dict_bytes / 1024:9.1f} KiB  scraped {shared_bytes / 1024:9.1f} KiB  "
+                  f"model {model_bytes / 1024:9.1f} KiB ({dict_bytes / model_bytes:4.1f}x / "
+                  f"{shared_bytes / model_bytes:4.1f}x)  from_dict {from_dict * 1000:7.2f} ms  "
+                  f"to_dict {to_dict * 1000:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
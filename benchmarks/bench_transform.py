@@ -0,0 +1,171 @@
+"""Benchmark the pure-Python transform stages on the recorded menu fixtures.
+
+Run from the repository root:
+
+    python benchmarks/bench_transform.py              # print ops/sec and peak memory
+    python benchmarks/bench_transform.py --save       # record them as the baselines
+    python benchmarks/bench_transform.py --check      # exit 1 on a regression against the baselines
+
+Every stage runs on the fixtures as recorded and scaled to 10x and 100x the
+items. Baselines are machine specific, record them on the machine that runs
+--check.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+from fixtures import (ROOT, DOORDASH_FIXTURE, UBEREATS_FIXTURES, load_fixture, scale, item_details,
+                      doordash_storepage_feed, ubereats_ld_json)
+
+import doordash_ubereats as scraper
+
+BASELINES = os.path.join(ROOT, 'benchmarks', 'baselines.json')
+SCALES = (1, 10, 100)
+# Seconds each case is timed for
+MIN_TIME = 0.5
+# Allowed slowdown (ops/sec) and memory growth against the baseline
+TOLERANCE = 0.25
+
+
+def bare_spider():
+    # The parsing methods do not touch the browser, skip __init__ so none is launched
+    spider = scraper.UberEatsSpider.__new__(scraper.UberEatsSpider)
+    spider.menu_index = None
+    return spider
+
+
+def doordash_cases(name, restaurant):
+    feed = doordash_storepage_feed(restaurant)
+    mx_info = feed['mxInfo']
+    store_header = scraper.extract_store_header(feed)
+    store_hours = scraper.extract_store_hours(mx_info)
+    menu_groups = scraper.extract_menu_groups(feed['menuBook'])
+    categories = scraper.transform_item_lists(feed['itemLists'])
+    details = item_details(restaurant)
+
+    def merge_all(menu):
+        # scrape_menu builds the index once per menu, as ScrapeSession.set_menu does
+        index = scraper.index_for(menu['data']['categories'])
+        for item in details:
+            scraper.append_item_details_to_menu_doordash(menu, item, index)
+
+    return {
+        f"{name}/extract_store_hours": (lambda: (mx_info,), scraper.extract_store_hours),
+        f"{name}/transform_item_lists": (lambda: (feed['itemLists'],), scraper.transform_item_lists),
+        f"{name}/compile_restaurant_data": (
+            lambda: (store_header, mx_info, store_hours, menu_groups, categories),
+            scraper.compile_restaurant_data),
+        f"{name}/transform_storepage_feed": (lambda: (feed,), scraper.transform_storepage_feed),
+        # A fresh menu each time, details are only merged into items without them
+        f"{name}/append_item_details_to_menu": (
+            lambda: (scraper.transform_storepage_feed(feed),), merge_all),
+    }
+
+
+def ubereats_cases(name, restaurant):
+    ld_json = ubereats_ld_json(restaurant)
+    details = item_details(restaurant)
+    spider = bare_spider()
+
+    def merge_all(spider, menu):
+        for item in details:
+            spider.append_item_details_to_menu(menu, item)
+
+    return {
+        f"{name}/parse_opening_hours": (
+            lambda: (ld_json['openingHoursSpecification'],), spider.parse_opening_hours),
+        f"{name}/parse_menu": (lambda: (ld_json['hasMenu'],), spider.parse_menu),
+        f"{name}/append_item_details_to_menu": (
+            lambda: (bare_spider(), spider.parse_menu(ld_json['hasMenu'])), merge_all),
+    }
+
+
+def build_cases(scales):
+    cases = {}
+    for factor in scales:
+        restaurant = scale(load_fixture(DOORDASH_FIXTURE), factor)
+        cases.update(doordash_cases(f"doordash/{factor}x", restaurant))
+        for fixture in UBEREATS_FIXTURES:
+            menu_name = os.path.splitext(fixture)[0].replace('ubereats_menu_', '')
+            restaurant = scale(load_fixture(fixture), factor)
+            cases.update(ubereats_cases(f"ubereats_{menu_name}/{factor}x", restaurant))
+    return cases
+
+
+def measure(setup, func, min_time=MIN_TIME):
+    """Return ops/sec and peak traced memory in bytes of func(*setup()), setup is not timed."""
+    # Peak memory of one call, traced separately because tracing slows the timed calls down
+    args = setup()
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    calls = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        args = setup()
+        started = time.perf_counter()
+        func(*args)
+        elapsed += time.perf_counter() - started
+        calls += 1
+    return calls / elapsed, peak
+
+
+def check(results, baselines, tolerance):
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        if result['ops_per_sec'] < baseline['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['ops_per_sec']:.1f} ops/sec, baseline {baseline['ops_per_sec']:.1f}")
+        if result['peak_bytes'] > baseline['peak_bytes'] * (1 + tolerance):
+            regressions.append(f"{name}: peak {result['peak_bytes']} bytes, baseline {baseline['peak_bytes']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--save', action='store_true', help='write the results as the new baselines')
+    parser.add_argument('--check', action='store_true', help='fail if a case regressed against the baselines')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--min-time', type=float, default=MIN_TIME)
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES)
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this')
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as infile:
+            baselines = json.load(infile)
+
+    results = {}
+    for name, (setup, func) in build_cases(args.scales).items():
+        if args.filter not in name:
+            continue
+        ops_per_sec, peak = measure(setup, func, args.min_time)
+        results[name] = {'ops_per_sec': round(ops_per_sec, 2), 'peak_bytes': peak}
+        baseline = baselines.get(name)
+        change = f"{ops_per_sec / baseline['ops_per_sec'] - 1:+7.1%}" if baseline else ''
+        print(f"{name:52s} {ops_per_sec:12.1f} ops/sec {peak / 1024:10.1f} KiB peak  {change}")
+
+    if args.save:
+        with open(BASELINES, 'w') as outfile:
+            json.dump({**baselines, **results}, outfile, indent=2, sort_keys=True)
+            outfile.write('\n')
+        print(f"Baselines written to {BASELINES}")
+
+    if args.check:
+        regressions = check(results, baselines, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Inputs for the offline benchmarks, rebuilt from the scraped menus in the repository.
+
+The repository keeps the scraper output, not the pages, so the DoorDash
+storepageFeed and the UberEats ld+json menu are reconstructed from
+restaurant_detail.json and ubereats_menu_*.json. scale() multiplies the
+items of a menu so the hot paths can be timed on large stores too.
+"""
+import os
+import sys
+import copy
+import json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DOORDASH_FIXTURE = 'restaurant_detail.json'
+UBEREATS_FIXTURES = ('ubereats_menu_18344.json', 'ubereats_menu_18345.json')
+
+
+def load_fixture(name):
+    with open(os.path.join(ROOT, name)) as infile:
+        return json.load(infile)
+
+
+def scale(restaurant, factor):
+    """Return a copy of a scraped menu with every category holding factor times the items."""
+    if factor == 1:
+        return restaurant
+    scaled = copy.deepcopy(restaurant)
+    for category in scaled['data']['categories']:
+        items = category['menu']
+        category['menu'] = [
+            {**menu_item, 'name': f"{menu_item['name']} #{copy_number}",
+             **({'id': f"{menu_item['id']}-{copy_number}"} if menu_item.get('id') else {})}
+            if copy_number else menu_item
+            for copy_number in range(factor) for menu_item in items
+        ]
+    return scaled
+
+
+def item_details(restaurant):
+    """The per-item details the modal readers would have produced for this menu."""
+    details = {}
+    for category in restaurant['data']['categories']:
+        for menu_item in category['menu']:
+            if menu_item.get('ingredientsGroups'):
+                details[menu_item['name']] = {
+                    'item_id': menu_item.get('id'),
+                    'item_name': menu_item['name'],
+                    'image_url': menu_item.get('image_url'),
+                    'item_details': menu_item['ingredientsGroups'],
+                }
+    return list(details.values())
+
+
+def doordash_storepage_feed(restaurant):
+    data = restaurant['data']
+    address = data['restaurantAddress']
+    schedule = []
+    for opening in data['storeOpeningHours']:
+        day, _, time_slot = opening.partition(' ')
+        schedule.append({
+            'dayOfWeek': day.upper(),
+            'timeSlotList': [time_slot.replace('a.m.', 'AM').replace('p.m.', 'PM')],
+        })
+    return {
+        'storeHeader': {
+            'name': data['title'],
+            'businessHeaderImgUrl': data['ImageURL'],
+            'coverSquareImgUrl': data['LogoURL'],
+            'priceRangeDisplayString': data['priceRange'],
+            'address': {'lat': str(data['latitude']), 'lng': str(data['longitude'])},
+        },
+        'mxInfo': {
+            'address': {
+                '__typename': address['@type'],
+                'street': address['streetAddress'],
+                'city': address['addressLocality'],
+                'state': address['addressRegion'],
+                'displayAddress': f"{address['streetAddress']}, {address['addressLocality']}, "
+                                  f"{address['addressRegion']} {address['postalCode']}",
+                'countryShortname': address['addressCountry'],
+            },
+            'phoneno': data['telephone'],
+            'operationInfo': {'storeOperationHourInfo': {'operationSchedule': schedule}},
+        },
+        'menuBook': {'menuCategories': [{'name': name} for name in data['menu_groups']]},
+        'itemLists': [
+            {
+                'name': category['title'],
+                'items': [
+                    {
+                        'id': menu_item.get('id') or f"{position}-{index}",
+                        'name': menu_item['name'],
+                        'description': menu_item['description'],
+                        'imageUrl': menu_item['imageUrl'],
+                        'displayPrice': f"${menu_item['price']:,.2f}",
+                    }
+                    for index, menu_item in enumerate(category['menu'])
+                ],
+            }
+            for position, category in enumerate(data['categories'])
+        ],
+    }
+
+
+def ubereats_ld_json(restaurant):
+    data = restaurant['data']
+    opening_hours = []
+    for opening in data['storeOpeningHours']:
+        day, _, hours = opening.partition(' ')
+        opens, _, closes = hours.partition('-')
+        opening_hours.append({'dayOfWeek': [day], 'opens': opens, 'closes': closes})
+    return {
+        'openingHoursSpecification': opening_hours,
+        'hasMenu': {
+            'hasMenuSection': [
+                {
+                    'name': category['title'],
+                    'hasMenuItem': [
+                        {
+                            '@type': menu_item.get('type'),
+                            'name': menu_item['name'],
+                            'description': menu_item['description'],
+                            'offers': {'price': menu_item['price']},
+                        }
+                        for menu_item in category['menu']
+                    ],
+                }
+                for category in data['categories']
+            ]
+        },
+    }
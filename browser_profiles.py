@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # No cross-process profile locks where flock is unavailable (Windows)
+    fcntl = None
+
+# Keep Chrome profiles (HTTP cache, cookies, localStorage) between scrapes
+BROWSER_PROFILES = os.environ.get('BROWSER_PROFILES', 'true').lower() in ('1', 'true', 'yes')
+BROWSER_PROFILE_DIR = os.environ.get('BROWSER_PROFILE_DIR', 'profiles')
+# Upper bound of the HTTP disk cache of each profile
+PROFILE_DISK_CACHE_MB = int(os.environ.get('PROFILE_DISK_CACHE_MB', '256'))
+# A profile is thrown away after this many seconds or scrapes, so a flagged session does not stick
+PROFILE_MAX_AGE = float(os.environ.get('PROFILE_MAX_AGE', str(3 * 24 * 3600)))
+PROFILE_MAX_USES = int(os.environ.get('PROFILE_MAX_USES', '200'))
+
+PROFILE_META = 'scraper_profile.json'
+
+
+class BrowserProfiles:
+    """Reusable Chrome user data directories, named <name>-<slot>.
+
+    Chrome locks a profile while a browser runs on it, so acquire() hands
+    out the first slot of the name that no browser holds. A slot is held
+    through an flock on <slot>.lock next to the profile, so server processes
+    sharing the directory never start Chrome on the same profile and
+    cleanup() skips the ones another process uses. Each profile counts its
+    age and scrapes; once either limit is reached it is deleted on release
+    and the slot starts over from a blank profile.
+    """
+
+    def __init__(self, directory=BROWSER_PROFILE_DIR, max_age=PROFILE_MAX_AGE, max_uses=PROFILE_MAX_USES):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self._lock = threading.Lock()
+        # Profile path to the open lock file holding its slot
+        self._in_use = {}
+        self.rotated = 0
+
+    def _lock_slot(self, path):
+        # Open file holding the slot's lock, None when another process holds it
+        os.makedirs(self.directory, exist_ok=True)
+        handle = open(f"{path}.lock", 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return None
+        return handle
+
+    def _read_meta(self, path):
+        try:
+            with open(os.path.join(path, PROFILE_META)) as infile:
+                return json.load(infile)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, path, meta):
+        with open(os.path.join(path, PROFILE_META), 'w') as outfile:
+            json.dump(meta, outfile)
+
+    def expired(self, meta):
+        return (meta is None or time.time() - meta['created_at'] > self.max_age
+                or meta['uses'] >= self.max_uses)
+
+    def _remove(self, path):
+        shutil.rmtree(path, ignore_errors=True)
+        self.rotated += 1
+        logging.info(f"Rotated browser profile {path}")
+
+    def acquire(self, name):
+        """Reserve a profile directory of name and return its path."""
+        with self._lock:
+            slot = 0
+            while True:
+                path = os.path.join(self.directory, f"{name}-{slot}")
+                if path not in self._in_use:
+                    handle = self._lock_slot(path)
+                    if handle is not None:
+                        self._in_use[path] = handle
+                        break
+                slot += 1
+        meta = self._read_meta(path)
+        if os.path.isdir(path) and self.expired(meta):
+            self._remove(path)
+            meta = None
+        if meta is None:
+            os.makedirs(path, exist_ok=True)
+            meta = {'created_at': time.time(), 'uses': 0}
+            self._write_meta(path, meta)
+        return path
+
+    def use(self, path):
+        """Count one scrape on the profile, returning True once it is due for rotation."""
+        meta = self._read_meta(path) or {'created_at': time.time(), 'uses': 0}
+        meta['uses'] += 1
+        try:
+            self._write_meta(path, meta)
+        except OSError as e:
+            logging.warning(f"Could not update browser profile {path}: {e}")
+        return self.expired(meta)
+
+    def release(self, path):
+        """Hand back a profile after its browser quit, deleting it when it is due for rotation."""
+        if self.expired(self._read_meta(path)):
+            self._remove(path)
+        with self._lock:
+            handle = self._in_use.pop(path, None)
+        if handle is not None:
+            # Closing the lock file drops its lock, the file stays for the next holder
+            handle.close()
+
+    def cleanup(self):
+        """Delete expired profiles no browser of any process is using, e.g. left over from a previous run."""
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            if not os.path.isdir(path):
+                continue
+            with self._lock:
+                if path in self._in_use:
+                    continue
+                handle = self._lock_slot(path)
+            if handle is None:
+                continue
+            try:
+                if self.expired(self._read_meta(path)):
+                    self._remove(path)
+            finally:
+                handle.close()
+
+    def stats(self):
+        profiles = ([entry for entry in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, entry))]
+                    if os.path.isdir(self.directory) else [])
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'profiles': len(profiles),
+                'in_use': len(self._in_use),
+                'rotated': self.rotated,
+                'disk_cache_mb': PROFILE_DISK_CACHE_MB,
+                'max_age': self.max_age,
+                'max_uses': self.max_uses,
+            }
+
+
+browser_profiles = BrowserProfiles()
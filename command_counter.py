@@ -0,0 +1,52 @@
+import threading
+
+
+class CommandCounter:
+    """Count the WebDriver commands a driver sends while the block runs.
+
+    Every command, including WebElement calls, goes through driver.execute,
+    so wrapping it on the instance sees all chromedriver round trips.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.count = 0
+
+    def __enter__(self):
+        self._instance_execute = self.driver.__dict__.get('execute')
+        execute = self.driver.execute
+
+        def counting_execute(*args, **kwargs):
+            self.count += 1
+            return execute(*args, **kwargs)
+
+        self.driver.execute = counting_execute
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._instance_execute is not None:
+            self.driver.execute = self._instance_execute
+        else:
+            del self.driver.execute
+        return False
+
+
+class CommandStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modes = {}
+
+    def record(self, mode, count):
+        with self._lock:
+            entry = self._modes.setdefault(mode, {'items': 0, 'commands': 0, 'max': 0})
+            entry['items'] += 1
+            entry['commands'] += count
+            entry['max'] = max(entry['max'], count)
+
+    def stats(self):
+        with self._lock:
+            return {mode: dict(entry, per_item=entry['commands'] / entry['items'])
+                    for mode, entry in self._modes.items()}
+
+
+command_stats = CommandStats()
@@ -0,0 +1,97 @@
+import os
+import gzip
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, responses are gzipped without it
+    brotli = None
+
+# Responses smaller than this many bytes are sent as they are
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_GZIP_LEVEL = 6
+# Brotli quality 5 compresses menus better than gzip 6 at a similar speed
+COMPRESS_BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain')
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, None for identity."""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for coding in ('br', 'gzip'):
+        if coding == 'br' and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def etag_matches(if_none_match, etag):
+    # Compressed responses carry the encoding in their ETag, any encoding of the same content matches
+    return any(tag == etag or tag.startswith(f"{etag}-") for tag in if_none_match) or if_none_match.star_tag
+
+
+def representation_etag(etag, encoding):
+    # Compressed responses carry the encoding in their strong ETag
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+def not_modified(etag):
+    """A 304 for etag if the request's If-None-Match matches it, else None.
+
+    The 304 carries the ETag of the representation a 200 would have sent,
+    i.e. with the negotiated encoding. Bodies it is used for are well above
+    COMPRESS_MIN_SIZE, so they would always be compressed.
+    """
+    if request.method not in ('GET', 'HEAD') or not etag_matches(request.if_none_match, etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(representation_etag(etag, negotiate_encoding(request.headers.get('Accept-Encoding', ''))))
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def finalize_response(response):
+    """after_request hook adding a content hash ETag, 304 for a matching If-None-Match and compression.
+
+    Streamed responses (NDJSON, SSE) are left alone so events are not buffered.
+    """
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or response.mimetype not in COMPRESSIBLE_TYPES or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    etag, _ = response.get_etag()
+    if not etag:
+        response.add_etag()
+        etag, _ = response.get_etag()
+    if request.method in ('GET', 'HEAD') and etag_matches(request.if_none_match, etag):
+        response.status_code = 304
+        response.set_data(b'')
+        response.headers.pop('Content-Type', None)
+        return response
+
+    data = response.get_data()
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding and len(data) >= COMPRESS_MIN_SIZE:
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # A different representation of the same content needs its own strong ETag
+        response.set_etag(representation_etag(etag, encoding))
+    return response
@@ -1,5 +1,4 @@
 import json
-import time
 import re
 import logging
 from selenium.webdriver.common.by import By
@@ -8,6 +7,13 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime
 from re import search
+from menu_index import index_for
+from waits import wait_until, item_modal_filled, elements_settled
+from scrape_session import ScrapeSession
+from menu_enumeration import enumerate_menu_items, menu_item_locator
+from persistence import menu_writer, menu_path
+from apollo_payload import extract_storepage_feed, find_storepage_feed
+from resource_blocking import BLOCK_RESOURCES, apply_resource_blocking, measured_page_load
 from flask import Flask, request, jsonify,Blueprint
 
 # Set up logging to console
@@ -17,9 +23,6 @@ app = Flask(__name__)
 
 doorbash_bp = Blueprint('doordash', __name__)
 
-restaurant_detail = {}
-all_items_details = []
-clicked_items = set()
 def extract_store_header(storepage_feed):
     return storepage_feed.get('storeHeader', {})
 
@@ -139,34 +142,37 @@ def extract_and_transform_json_data(json_data):
         logging.error("No results found in the provided JSON data.")
         return {}
 
-    for result in results:
-        storepage_feed = result.get('data', {}).get('storepageFeed', {})
-        if storepage_feed:
-            store_header = extract_store_header(storepage_feed)
-            mx_info = storepage_feed.get('mxInfo', {})
-            store_opening_hours = extract_store_hours(mx_info)
-            menu_book = storepage_feed.get('menuBook', {})
-            menu_groups = extract_menu_groups(menu_book)
-            item_lists = storepage_feed.get('itemLists', {})
-            transformed_categories = transform_item_lists(item_lists)
+    storepage_feed = find_storepage_feed(json_data)
+    if storepage_feed:
+        return transform_storepage_feed(storepage_feed)
 
-            restaurant = compile_restaurant_data(
-                store_header,
-                mx_info,
-                store_opening_hours,
-                menu_groups,
-                transformed_categories
-            )
 
-            return restaurant
+def transform_storepage_feed(storepage_feed):
+    store_header = extract_store_header(storepage_feed)
+    mx_info = storepage_feed.get('mxInfo', {})
+    store_opening_hours = extract_store_hours(mx_info)
+    menu_book = storepage_feed.get('menuBook', {})
+    menu_groups = extract_menu_groups(menu_book)
+    item_lists = storepage_feed.get('itemLists', {})
+    transformed_categories = transform_item_lists(item_lists)
+
+    restaurant = compile_restaurant_data(
+        store_header,
+        mx_info,
+        store_opening_hours,
+        menu_groups,
+        transformed_categories
+    )
+
+    return restaurant
 
 
 def parse_store_data(driver):
     try:
         # Wait for the script tag containing the Apollo data
-        script_tag = WebDriverWait(driver, 60).until(
-            EC.presence_of_element_located((By.XPATH, '(//script[contains(text(),"apolloCacheData") and contains(text(), "query")])'))
-        )
+        script_tag = wait_until(driver, EC.presence_of_element_located(
+            (By.XPATH, '(//script[contains(text(),"apolloCacheData") and contains(text(), "query")])')),
+            'apollo_script', 60)
         json_text = script_tag.get_attribute('textContent')
 
         logging.debug("Raw JSON text: %s", json_text)  # Log the raw JSON for debugging
@@ -176,50 +182,33 @@ def parse_store_data(driver):
         return {}
 
     try:
-        # Extract JSON part by finding the first occurrence of '{' and last '}'
-        json_start = json_text.find('{')
-        json_end = json_text.rfind('}') + 1
-        json_str = json_text[json_start:json_end]
-
-        # Clean up problematic escape sequences
-        json_str = re.sub(r'\\(?!["\\/bfnrt])', r'\\\\', json_str)  # Correct invalid escape sequences
-
-        # Decode JSON content, handle unicode characters
-        json_str = json_str.encode().decode('unicode_escape')
-
-        # Parse the sanitized JSON string
-        json_data = json.loads(json_str)
-    #        logging.info(f"json_data: {json_data}")
+        # Unescape the embedded payload and decode only its storepageFeed entry
+        storepage_feed = extract_storepage_feed(json_text)
 
     except json.JSONDecodeError as e:
         logging.error("JSON decoding failed: %s", e)
         return {}
 
-    restaurant_detail = extract_and_transform_json_data(json_data)
-    return restaurant_detail
-
+    if not storepage_feed:
+        logging.error("No storepageFeed found in the Apollo data.")
+        return {}
 
-def save_json_to_file(data, filename='restaurant_detail.json'):
-    with open(filename, 'w') as outfile:
-        json.dump(data, outfile, indent=4)
+    restaurant_detail = transform_storepage_feed(storepage_feed)
+    return restaurant_detail
 
 
-def click_item(driver, item):
+def click_item(session, item):
     """Click the item and handle the item modal."""
-    global all_items_details, clicked_items  # Declare global variables before use
+    driver = session.driver
     try:
         WebDriverWait(driver, 60).until(EC.element_to_be_clickable(item))
         item_text = item.text
-        if item_text not in clicked_items:
+        if session.claim_item(item_text):
             item.click()
-            clicked_items.add(item_text)
             logging.info(f"Item clicked: {item_text}")
-            time.sleep(5)  # Wait for item modal to load
 
-            # Wait for the item modal to become visible
-            WebDriverWait(driver, 60).until(
-                EC.visibility_of_element_located((By.CSS_SELECTOR, '[data-testid="ItemModal"]'))
-            )
+            # Wait for the item modal to be visible with its option groups rendered
+            wait_until(driver, item_modal_filled(), 'item_modal', 60)
             logging.info("Item modal visible")
 
             # Extract item name
@@ -312,12 +301,12 @@ def click_item(driver, item):
                     'ingredients': options
                 })
 
-            # Append the item details to the global list
+            # Append the item details to the session
             item_details = {
                 'item_name': item_name,
                 'item_details': details
             }
-            all_items_details.append(item_details)
+            session.add_item_details(item_details)
 
             # Close the modal and handle any issues with closing
             close_button = driver.find_element(By.CSS_SELECTOR, 'button[aria-label^="Close"]')
@@ -327,26 +316,32 @@ def click_item(driver, item):
             logging.info("Close button clicked")
 
             # Wait for the modal to close
-            WebDriverWait(driver, 60).until(
-                EC.invisibility_of_element_located((By.CSS_SELECTOR, '[data-testid="ItemModal"]'))
-            )
+            wait_until(driver, EC.invisibility_of_element_located((By.CSS_SELECTOR, '[data-testid="ItemModal"]')),
+                       'modal_closed', 60)
             logging.info("Item modal closed")
-            time.sleep(5)
 
-            # Update the global menu with the item details
-            global restaurant_detail
-            if restaurant_detail:
-                restaurant_detail = append_item_details_to_menu(restaurant_detail, item_details)
+            # Update the session menu with the item details
+            if session.restaurant_detail:
+                append_item_details_to_menu(session.restaurant_detail, item_details, session.menu_index)
         else:
             logging.info(f"Item already clicked: {item_text}")
 
     except Exception as e:
         logging.error(f"Error interacting with item: {e}")
-        time.sleep(2)
+        # Let a modal left open by the failure close before the next item is clicked
+        try:
+            wait_until(driver, EC.invisibility_of_element_located((By.CSS_SELECTOR, '[data-testid="ItemModal"]')),
+                       'modal_closed', 2, required=False)
+        except Exception:
+            pass
 
 
 
-def append_item_details_to_menu(menu, item_details):
+def append_item_details_to_menu(menu, item_details, index=None):
+    """Merge one item's details into every listing of the item in menu.
+
+    Pass the MenuIndex built for menu to merge in O(1), otherwise one is built.
+    """
     if not item_details:
         return menu
 
@@ -355,12 +350,11 @@ def append_item_details_to_menu(menu, item_details):
     if not item_name:
         return menu
 
-    for section in menu['data']['categories']:
-        for menu_item in section['menu']:
-            if menu_item['name'] == item_name:
-                # Only add details if the item does not already have them
-                if not menu_item.get('ingredientsGroups'):
-                    menu_item['ingredientsGroups'] = item_details['item_details']
+    index = index_for(menu['data']['categories'], index)
+    for menu_item in index.lookup(item_name, item_details.get('item_id')):
+        # Only add details if the item does not already have them
+        if not menu_item.get('ingredientsGroups'):
+            menu_item['ingredientsGroups'] = item_details['item_details']
 
     return menu
 
@@ -370,25 +364,39 @@ def is_scrolling(driver, previous_scroll_position):
 
 
 def scrape_menu(url, menu_id):
-    global restaurant_detail, all_items_details, clicked_items
     driver = Driver(uc=True, undetectable=True, headless=False)
+    if BLOCK_RESOURCES:
+        apply_resource_blocking(driver)
+    session = ScrapeSession(driver, menu_id)
 #    driver.set_window_size(1024, 1024)  # Example for an iPad in portrait mode
     driver.maximize_window()
 
-    driver.get(url)
-    time.sleep(50)  # Adjust the sleep time based on how long the page takes to load
+    with measured_page_load(driver, 'doordash'):
+        driver.get(url)
 
-    # Parse and save restaurant data
+    # Parse and save restaurant data, this waits for the Apollo script to load
     restaurant_detail = parse_store_data(driver)
     restaurant_detail['data']['menu_id'] = menu_id  # Set the menu_id received as input
-
-    # Scroll and fetch items
-    driver.execute_script("window.scrollBy(0, 2000);")
-    time.sleep(10)
-
-    # Fetch all items initially
+    # Item details are merged as each modal closes
+    session.set_menu(restaurant_detail)
+
+    # Enumerate every menu item in page order and visit each one once
+    work_list = enumerate_menu_items(driver, 'div[data-testid="MenuItem"]', session.menu_index)
+    for work_item in work_list:
+        try:
+            card = WebDriverWait(driver, 5).until(menu_item_locator('div[data-testid="MenuItem"]', work_item))
+        except Exception:
+            logging.warning(f"Menu item not found on the page: {work_item['name']}")
+            continue
+        click_item(session, card)
+
+    # Scroll and fetch items, only needed when enumeration found nothing
     items_xpath = '//div[@data-testid="MenuItem"]'
-    items = driver.find_elements(By.XPATH, items_xpath)
+    items = []
+    if not work_list:
+        driver.execute_script("window.scrollBy(0, 2000);")
+        wait_until(driver, elements_settled(items_xpath), 'menu_items', 10, required=False)
+        items = driver.find_elements(By.XPATH, items_xpath)
 
     previous_scroll_position = driver.execute_script("return window.scrollY;")
     no_new_items_count = 0
@@ -396,11 +404,11 @@ def scrape_menu(url, menu_id):
 
     while items:
         for item in items:
-            click_item(driver, item)
+            click_item(session, item)
 
         # Scroll and check if new items are loaded
         driver.execute_script("window.scrollBy(0, 100);")
-        time.sleep(2)
+        wait_until(driver, elements_settled(items_xpath), 'scroll_step', 2, required=False)
         items = driver.find_elements(By.XPATH, items_xpath)
 
         if not items:
@@ -417,11 +425,6 @@ def scrape_menu(url, menu_id):
                 logging.info("No new items found after scrolling multiple times. Quitting.")
                 break
 
-    # After processing all items, update the restaurant data
-    if restaurant_detail:
-        for item_details in all_items_details:
-            restaurant_detail = append_item_details_to_menu(restaurant_detail, item_details)
-
     # Close the browser when done
     driver.quit()
 
@@ -441,8 +444,9 @@ def scrape_menu_api():
         # Call the scrape function
         restaurant_data = scrape_menu(url, menu_id)
 
-        # Save the restaurant data to a file
-        save_json_to_file(restaurant_data, 'restaurant_detail.json')
+        # Save the restaurant data in the background, one file per menu_id
+        if restaurant_data:
+            menu_writer.save(menu_path('doordash', menu_id), restaurant_data)
 
         return jsonify(restaurant_data), 200
 
@@ -0,0 +1,123 @@
+import re
+import json
+import base64
+import logging
+
+ITEM_PAGE_OPERATION = 'itemPage'
+
+
+class GraphQLCapture:
+    """Collect DoorDash GraphQL responses from the Chrome performance log.
+
+    The driver must be started with performance logging enabled
+    (create_driver(log_cdp_events=True)).
+    """
+
+    def __init__(self, driver, operation=ITEM_PAGE_OPERATION):
+        self.driver = driver
+        self.operation = operation
+        self.pending = set()  # Matching requests whose body has not finished loading
+        self.finished = set()
+
+    def reset(self):
+        # Drop log entries from earlier page activity
+        self.driver.get_log('performance')
+        self.pending.clear()
+        self.finished.clear()
+
+    def _matches(self, url):
+        return '/graphql' in url and self.operation in url
+
+    def _poll_log(self):
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.responseReceived':
+                if self._matches(params.get('response', {}).get('url', '')):
+                    self.pending.add(params.get('requestId'))
+            elif method == 'Network.loadingFinished':
+                self.finished.add(params.get('requestId'))
+
+    def _read_body(self, request_id):
+        try:
+            body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception as e:
+            logging.warning(f"Could not read GraphQL response body: {e}")
+            return None
+        text = body.get('body', '')
+        if body.get('base64Encoded'):
+            text = base64.b64decode(text).decode('utf-8')
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            logging.warning(f"GraphQL response is not JSON: {e}")
+            return None
+
+    def responses(self):
+        """Return the decoded bodies of matching responses that finished loading."""
+        self._poll_log()
+        payloads = []
+        for request_id in list(self.pending & self.finished):
+            self.pending.discard(request_id)
+            payload = self._read_body(request_id)
+            if payload:
+                payloads.append(payload)
+        return payloads
+
+    def item_page_ready(self, driver):
+        # WebDriverWait condition returning the first itemPage payload
+        for payload in self.responses():
+            if payload.get('data', {}).get('itemPage'):
+                return payload
+        return False
+
+
+def option_price(option):
+    unit_amount = option.get('unitAmount')
+    if isinstance(unit_amount, (int, float)):
+        decimal_places = option.get('decimalPlaces')
+        return unit_amount / (10 ** (2 if decimal_places is None else decimal_places))
+    # Fall back to the display string, for example "+$1.50"
+    match = re.search(r'(\d+(?:\.\d+)?)', (option.get('displayString') or '').replace(',', ''))
+    return float(match.group(1)) if match else 0
+
+
+def option_lists_to_groups(option_lists):
+    groups = []
+    for option_list in option_lists or []:
+        options = []
+        for option in option_list.get('options') or []:
+            cleaned_price = option_price(option)
+            options.append({
+                'name': option.get('name', ''),
+                # Options with a quantity stepper can be added more than once
+                'possibleToAdd': 999999 if (option.get('maxOptionChoiceQuantity') or 1) > 1 else 1,
+                'price': cleaned_price * 2,
+                'leftHalfPrice': cleaned_price,
+                'rightHalfPrice': cleaned_price,
+                'ingredientsGroup': option_lists_to_groups(option.get('nestedExtrasList'))
+            })
+
+        groups.append({
+            'type': "general",
+            'name': option_list.get('name', ''),
+            'requiresSelectionMin': option_list.get('minNumOptions') or 0,
+            'requiresSelectionMax': option_list.get('maxNumOptions') or 0,
+            'ingredients': options
+        })
+    return groups
+
+
+def item_page_to_details(payload):
+    """Map an itemPage GraphQL response to the item_details structure used by the menu merge."""
+    item_page = payload.get('data', {}).get('itemPage') or {}
+    item_header = item_page.get('itemHeader') or {}
+    return {
+        'item_id': item_header.get('id'),
+        'item_name': item_header.get('name', ''),
+        'item_details': option_lists_to_groups(item_page.get('optionLists'))
+    }
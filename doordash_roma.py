@@ -3,11 +3,14 @@ import time
 import re
 import logging
 from selenium.webdriver.common.by import By
-from seleniumbase import Driver
+from driver_pool import create_driver, quit_driver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime
 from flask import Flask, request, jsonify
+from scrape_session import ScrapeSession
+from persistence import menu_writer, menu_path
+from resource_blocking import measured_page_load
 
 
 
@@ -16,10 +19,6 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 app = Flask(__name__)
 
-restaurant_detail = {}
-all_items_details = []
-clicked_items = set()
-
 def extract_store_header(storepage_feed):
     return storepage_feed.get('storeHeader', {})
 
@@ -53,8 +52,8 @@ def extract_menu_groups(menu_book):
     return [category.get('name') for category in menu_categories]
 
 
-def transform_item_lists(item_lists, item_name):  # Add item_name as an argument
-    global all_items_details  # Declare the global list
+def transform_item_lists(item_lists, item_name, ingredients_groups):  # Add item_name as an argument
+    # ingredients_groups is the session list that select_items_from_modal fills in later
 
     transformed_categories = []
     for item_list in item_lists:
@@ -77,7 +76,7 @@ def transform_item_lists(item_lists, item_name):  # Add item_name as an argument
                     "description": item.get('description', 'No Description'),
                     "imageUrl": item.get('imageUrl', 'No Image URL'),
                     "price": price,
-                    "ingredientsGroups": all_items_details  # Append global list here
+                    "ingredientsGroups": ingredients_groups  # Filled in when the item modal is read
                 }
                 category["menu"].append(menu_item)
 
@@ -124,7 +123,7 @@ def compile_restaurant_data(store_header, mx_info, store_opening_hours, menu_gro
 
 
 # Update the call to extract_and_transform_json_data in parse_store_data to include item_name
-def parse_store_data(driver, item_name):
+def parse_store_data(driver, item_name, ingredients_groups):
     try:
         script_tag = WebDriverWait(driver, 60).until(
             EC.presence_of_element_located((By.XPATH, '(//script[contains(text(),"ApolloSSRDataTransport")])[2]'))
@@ -143,17 +142,12 @@ def parse_store_data(driver, item_name):
         logging.error("JSON decoding failed: %s", e)
         return {}
 
-    restaurant_detail = extract_and_transform_json_data(json_data, item_name)  # Pass item_name
+    restaurant_detail = extract_and_transform_json_data(json_data, item_name, ingredients_groups)  # Pass item_name
     return restaurant_detail
 
 
-def save_json_to_file(data, filename='restaurant_detail.json'):
-    with open(filename, 'w') as outfile:
-        json.dump(data, outfile, indent=4)
-
-
-def select_items_from_modal(driver, selected_items):
-    global all_items_details  # Initialize the list to hold all item details
+def select_items_from_modal(session, selected_items):
+    driver = session.driver
 
     try:
         details = []
@@ -257,16 +251,17 @@ def select_items_from_modal(driver, selected_items):
 
         # Append all grouped ingredients to details
         details.append(list(ingredients_group.values()))
-        all_items_details.append(details)
+        session.add_item_details(details)
 
     except Exception as e:
         logging.error(f"Error selecting items from modal: {e}")
 
-    return all_items_details
+    return session.all_items_details
 
 
 
-def click_item(driver, item, selected_items):
+def click_item(session, item, selected_items):
+    driver = session.driver
     try:
         # Scroll down by a static amount of 400 pixels
         driver.execute_script("window.scrollBy(0, 400);")
@@ -287,7 +282,7 @@ def click_item(driver, item, selected_items):
         time.sleep(5)
 
         # Select items in the modal (element 1 and element 2)
-        select_items_from_modal(driver, selected_items)
+        select_items_from_modal(session, selected_items)
 
         # Click the "Add to Cart" button
         add_to_cart_button = driver.find_element(By.CSS_SELECTOR, '[data-testid="AddToCartButton"]')
@@ -310,7 +305,7 @@ def click_item(driver, item, selected_items):
         logging.error(f"Error interacting with the item: {e}")
 
 
-def extract_and_transform_json_data(json_data, item_name):  # Pass item_name to this function
+def extract_and_transform_json_data(json_data, item_name, ingredients_groups):  # Pass item_name to this function
     if not json_data:
         logging.error("No JSON data provided for transformation.")
         return {}
@@ -331,7 +326,7 @@ def extract_and_transform_json_data(json_data, item_name):  # Pass item_name to
             item_lists = storepage_feed.get('itemLists', {})
 
             # Update the call to transform_item_lists to include item_name
-            transformed_categories = transform_item_lists(item_lists, item_name)
+            transformed_categories = transform_item_lists(item_lists, item_name, ingredients_groups)
 
             restaurant = compile_restaurant_data(
                 store_header,
@@ -344,11 +339,13 @@ def extract_and_transform_json_data(json_data, item_name):  # Pass item_name to
             return restaurant
 
 def open_browser_and_scrape_menu(url, item_name, selected_items, menu_id):
-    driver = Driver(uc=True, undetectable=True, headless=True)
+    driver = create_driver(profile='doordash_roma')
+    session = ScrapeSession(driver, menu_id)
 
 #    driver.set_window_size(1024, 1024)  # Set the window size for an iPad in portrait mode
     logging.info(f"Opening URL: {url}")
-    driver.get(url)
+    with measured_page_load(driver, 'doordash_roma'):
+        driver.get(url)
     # Save screenshot after loading the page
     screenshot_path = 'screenshot.png'  # Define the file name for the screenshot
     driver.save_screenshot(screenshot_path)
@@ -363,8 +360,9 @@ def open_browser_and_scrape_menu(url, item_name, selected_items, menu_id):
         time.sleep(50)
 
         # Parse and save restaurant data
-        restaurant_detail = parse_store_data(driver, item_name)  # Pass item_name here
+        restaurant_detail = parse_store_data(driver, item_name, session.all_items_details)  # Pass item_name here
         restaurant_detail['data']['menu_id'] = menu_id
+        session.restaurant_detail = restaurant_detail
 
         # Searching for the desired items by scrolling
         while True:
@@ -380,7 +378,7 @@ def open_browser_and_scrape_menu(url, item_name, selected_items, menu_id):
 
                 if item_name.lower() in item_text.lower():
                     logging.info(f"Item found: {item_text}")
-                    click_item(driver, item, selected_items)
+                    click_item(session, item, selected_items)
                     return restaurant_detail  # Exit after clicking the item and return data
 
             # Scroll down if no item was found
@@ -412,7 +410,7 @@ def open_browser_and_scrape_menu(url, item_name, selected_items, menu_id):
     except Exception as e:
         logging.error(f"Error during scraping: {e}")
     finally:
-        driver.quit()
+        quit_driver(driver)
 
     return restaurant_detail  # Return restaurant data after scraping
 
@@ -433,8 +431,9 @@ def scrape_menu_api():
         # Call the scrape function with the correct arguments
         restaurant_data = open_browser_and_scrape_menu(url, item_name, selected_items, menu_id)
 
-        # Save the restaurant data to a file
-        save_json_to_file(restaurant_data, 'restaurant_detail.json')
+        # Save the restaurant data in the background, one file per menu_id
+        if restaurant_data:
+            menu_writer.save(menu_path('doordash_roma', menu_id), restaurant_data)
 
         return jsonify(restaurant_data), 200
 
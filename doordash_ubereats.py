@@ -1,34 +1,75 @@
+import os
 import json
 import time
 import re
 import logging
-from flask import Flask, request, jsonify, Blueprint
+from flask import Flask, Response, request, jsonify, Blueprint
 from selenium.webdriver.common.by import By
-from seleniumbase import Driver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime
+from driver_pool import DriverPool, create_driver, quit_driver
+from browser_profiles import browser_profiles
+from jobs import jobs_bp, job_manager, job_accepted, JobQueueFull
+from waits import wait_until, wait_timings, item_modal_filled, elements_settled, ScriptSettled
+from doordash_graphql import GraphQLCapture, item_page_to_details
+from item_snapshots import (DOORDASH_ITEM_MODAL_JS, DOORDASH_GROUP_FINGERPRINTS_JS, doordash_snapshot_to_details,
+                            UBEREATS_DIALOG_JS, ubereats_snapshot_to_details)
+from command_counter import CommandCounter, command_stats
+from sharding import SCRAPE_PARALLELISM, shard_of, ShardProgress, share_store_context, run_shards
+from menu_cache import menu_cache, parse_cache_args, with_menu_id
+from menu_index import index_for
+from scrape_session import ScrapeSession
+from menu_enumeration import enumerate_menu_items, menu_item_locator
+from menu_format import parse_format, format_menu
+from compression import finalize_response, not_modified
+from apollo_payload import extract_storepage_feed, find_storepage_feed
+from persistence import menu_writer, menu_path, load_menu
+from batch import BATCH_ENGINE, BatchScheduler, parse_batch
+from pipeline import BatchPipeline
+from metrics import metrics, PROMETHEUS_CONTENT_TYPE
+from resource_blocking import page_load_stats, measured_page_load
+from streaming import MenuStream, run_streamed, stream_response, streamed_job_events, cached_events, wants_sse
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# How DoorDash item modals are read: 'snapshot' serializes the modal in one script call,
+# 'dom' walks the modal element by element, 'network' reads the itemPage GraphQL response
+DOORDASH_CAPTURE_MODES = ('snapshot', 'dom', 'network')
+DOORDASH_CAPTURE_MODE = os.environ.get('DOORDASH_CAPTURE_MODE', 'snapshot')
+# Performance logging is needed to read GraphQL responses over CDP, but its log grows with every request the
+# browser makes, so pooled browsers only log when network capture is the default. A capture=network request
+# on a pooled browser without the log reads the modals from the DOM instead.
+DRIVER_POOL_CDP_EVENTS = os.environ.get('DRIVER_POOL_CDP_EVENTS',
+                                        str(DOORDASH_CAPTURE_MODE == 'network')).lower() in ('1', 'true', 'yes')
+
 app = Flask(__name__)
+driver_pool = DriverPool(factory=lambda: create_driver(log_cdp_events=DRIVER_POOL_CDP_EVENTS, profile='pool'))
 ubereats_bp = Blueprint('ubereats', __name__)
 
 class UberEatsSpider:
-    def __init__(self):
-        # Initialize the driver with undetectable mode enabled
-        self.driver = Driver(uc=True, undetectable=True, headless=True)
+    def __init__(self, driver=None, on_event=None):
+        # Use a pooled driver when given one, otherwise launch our own
+        self.owns_driver = driver is None
+        self.driver = driver if driver is not None else create_driver(profile='ubereats')
         self.driver.set_window_size(1024, 768)  # Set window size for consistency
         self.data = {}  # Initialize a dictionary to store the data
         self.section_names = set()  # Initialize a set to store unique section names
+        self.menu_index = None  # MenuIndex of the menu being filled in
+        self.on_event = on_event  # Called with (event, data) as parts of the menu are ready
+
+    def emit(self, event, data):
+        if self.on_event:
+            self.on_event(event, data)
 
-    def parse(self, url, menu_id):
+    def load_store(self, url):
         # Load the URL using Selenium
-        self.driver.get(url)
-        # Try reloading the page after initial load to ensure it functions properly
-        time.sleep(5)  # Give it a moment to load the initial elements
-        self.driver.refresh()  # Manually refresh the page
+        with measured_page_load(self.driver, 'ubereats'):
+            self.driver.get(url)
+            # Try reloading the page after initial load to ensure it functions properly
+            time.sleep(5)  # Give it a moment to load the initial elements
+            self.driver.refresh()  # Manually refresh the page
         self.handle_delivery_popup()
 
         # Wait for the necessary elements to load
@@ -38,67 +79,129 @@ class UberEatsSpider:
             )
         except Exception as e:
             logging.error(f"Error loading page elements: {e}")
+            return False
+        return True
+
+    def extract_menu_items(self, menu_data, shard=0, shard_count=1, shard_progress=None):
+        """Open the item dialogs belonging to this shard and merge their details into menu_data."""
+        items = self.driver.find_elements(By.CSS_SELECTOR, 'li[data-testid^="store-item-"]')
+        logging.info(f"Item name extracted: {items}")
+
+        for index, item in enumerate(items):
+            if index % shard_count != shard:
+                continue
+            item_started = time.perf_counter()
+            try:
+                item.click()
+                logging.info(f"Item name extracted: {item}")
+                self.handle_popup()
+
+                details = self.extract_item_details()
+
+                if details:
+                    with metrics.span('ubereats', 'merge'):
+                        menu_data = self.append_item_details_to_menu(menu_data, details)
+                    metrics.inc('items_scraped', 'ubereats')
+                    self.emit('item', {'item_name': details['item_name'], 'image_url': details.get('image_url'),
+                                       'ingredientsGroups': details['item_details']})
+                else:
+                    metrics.inc('modal_failures', 'ubereats')
+                with metrics.span('ubereats', 'modal_close'):
+                    self.driver.back()
+                    WebDriverWait(self.driver, 10).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, 'li[data-testid^="store-item-"]'))
+                    )
+                metrics.observe('ubereats', 'item', time.perf_counter() - item_started)
+            except Exception as e:
+                logging.error(f"Error occurred while processing item: {e}")
+                metrics.inc('modal_failures', 'ubereats')
+                continue
+            finally:
+                if shard_progress:
+                    shard_progress.advance()
+
+        return menu_data
+
+    def extract_shard(self, url, menu_data, shard, shard_count, shard_progress, source_driver):
+        share_store_context(source_driver, self.driver, url)
+        self.driver.refresh()
+        self.handle_delivery_popup()
+        WebDriverWait(self.driver, 10).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'li[data-testid^="store-item-"]'))
+        )
+        self.extract_menu_items(menu_data, shard, shard_count, shard_progress)
+
+    def parse(self, url, menu_id, progress=None, shard_drivers=()):
+        started = time.perf_counter()
+        with metrics.span('ubereats', 'page_load'):
+            loaded = self.load_store(url)
+        if not loaded:
             return
 
         # Extract the JSON data from the <script type="application/ld+json"> tag
         try:
-            script_tag = self.driver.find_element(By.XPATH, '//script[@type="application/ld+json"]')
-            json_data = script_tag.get_attribute('textContent')
-            data = json.loads(json_data) if json_data else {}
+            json_data = self.read_store_json()
+            with metrics.span('ubereats', 'json_extract'):
+                data = json.loads(json_data) if json_data else {}
         except Exception as e:
             logging.error(f"Error extracting JSON data: {e}")
             return
 
         if data:
-            menu_data = self.parse_menu(data.get('hasMenu', {}))  # Parse initial menu structure
-            self.section_names.update(section['title'] for section in menu_data)
+            restaurant = self.build_restaurant(data, menu_id)
+            menu_data = restaurant['data']['categories']
+            self.emit('store', restaurant)
+
+            # Split the item dialogs across this browser and any shard browsers
+            item_count = len(self.driver.find_elements(By.CSS_SELECTOR, 'li[data-testid^="store-item-"]'))
+            shard_progress = ShardProgress(progress, item_count)
+            shard_count = len(shard_drivers) + 1
+            shard_workers = [
+                lambda shard=shard, shard_driver=shard_driver: UberEatsSpider(shard_driver, self.on_event).extract_shard(
+                    url, menu_data, shard, shard_count, shard_progress, self.driver)
+                for shard, shard_driver in enumerate(shard_drivers, start=1)
+            ]
+            with metrics.span('ubereats', 'modals'):
+                run_shards(lambda: self.extract_menu_items(menu_data, 0, shard_count, shard_progress), shard_workers)
 
-            items = self.driver.find_elements(By.CSS_SELECTOR, 'li[data-testid^="store-item-"]')
-            logging.info(f"Item name extracted: {items}")
+            self.data = restaurant  # Store the data in the dictionary
+            metrics.observe('ubereats', 'total', time.perf_counter() - started)
+            return restaurant
 
-            for item in items:
-                try:
-                    item.click()
-                    logging.info(f"Item name extracted: {item}")
-                    self.handle_popup()
+    def read_store_json(self):
+        # Text of the <script type="application/ld+json"> tag describing the store
+        script_tag = self.driver.find_element(By.XPATH, '//script[@type="application/ld+json"]')
+        return script_tag.get_attribute('textContent')
 
-                    details = self.extract_item_details()
+    def build_restaurant(self, data, menu_id):
+        """Build the restaurant dict from the decoded ld+json data, before any item dialog is read."""
+        with metrics.span('ubereats', 'transform'):
+            menu_data = self.parse_menu(data.get('hasMenu', {}))  # Parse initial menu structure
+        self.section_names.update(section['title'] for section in menu_data)
 
-                    if details:
-                        menu_data = self.append_item_details_to_menu(menu_data, details)
-                    self.driver.back()
-                    WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, 'li[data-testid^="store-item-"]'))
-                    )
-                except Exception as e:
-                    logging.error(f"Error occurred while processing item: {e}")
-                    continue
-
-            # Yield the final restaurant data with complete menu details
-            restaurant = {
-                'data': {
-                    "menu_id": menu_id,
-                    'titleURL': data.get('@id'),
-                    'title_id': '',
-                    'Context': data.get('@context'),
-                    'title': data.get('name'),
-                    'images': data.get('image', []),
-                    'LogoURL': '',
-                    'restaurantAddress': self.extract_address(data.get('address', {})),
-                    'storeOpeningHours': self.parse_opening_hours(data.get('openingHoursSpecification', [])),
-                    'priceRange': data.get('priceRange'),
-                    'telephone': data.get('telephone'),
-                    'ratingValue': data.get('aggregateRating', {}).get('ratingValue'),
-                    'ratingCount': data.get('aggregateRating', {}).get('reviewCount'),
-                    'latitude': data.get('geo', {}).get('latitude'),
-                    'longitude': data.get('geo', {}).get('longitude'),
-                    'cuisine': data.get('servesCuisine', []),
-                    'menu_groups': list(self.section_names),
-                    'categories': menu_data
-                }
+        # The item details are filled into menu_data in place as the dialogs are read
+        return {
+            'data': {
+                "menu_id": menu_id,
+                'titleURL': data.get('@id'),
+                'title_id': '',
+                'Context': data.get('@context'),
+                'title': data.get('name'),
+                'images': data.get('image', []),
+                'LogoURL': '',
+                'restaurantAddress': self.extract_address(data.get('address', {})),
+                'storeOpeningHours': self.parse_opening_hours(data.get('openingHoursSpecification', [])),
+                'priceRange': data.get('priceRange'),
+                'telephone': data.get('telephone'),
+                'ratingValue': data.get('aggregateRating', {}).get('ratingValue'),
+                'ratingCount': data.get('aggregateRating', {}).get('reviewCount'),
+                'latitude': data.get('geo', {}).get('latitude'),
+                'longitude': data.get('geo', {}).get('longitude'),
+                'cuisine': data.get('servesCuisine', []),
+                'menu_groups': list(self.section_names),
+                'categories': menu_data
             }
-            self.data = restaurant  # Store the data in the dictionary
-            return restaurant
+        }
 
     def extract_address(self, address_data):
         return {
@@ -190,153 +293,26 @@ class UberEatsSpider:
             logging.info(f"Delivery popup not found or already closed: {e}")
 
     def extract_item_details(self):
-        details = []
-        item_name = ''
-        image_url = ''
-        time.sleep(10)
-
-        # Check if the dialog is present
+        # Read the whole dialog (title, image and every customization group) in one round trip per poll,
+        # the snapshot is taken once two polls in a row agree
         try:
-            dialog = self.driver.find_element(By.CSS_SELECTOR, 'div[role="dialog"][aria-label="dialog"]')
-            logging.info(f"Dialog tag visible: {dialog}")
-            if not dialog:
-                logging.warning("Dialog not found.")
-                return ''
+            with metrics.span('ubereats', 'modal_read'), CommandCounter(self.driver) as counter:
+                snapshot = wait_until(self.driver, ScriptSettled(UBEREATS_DIALOG_JS), 'ubereats_modal', 10,
+                                      required=False)
+            command_stats.record('ubereats_snapshot', counter.count)
         except Exception as e:
-            logging.error(f"Error finding dialog: {e}")
+            logging.error(f"Error reading dialog: {e}")
             return ''
 
-        # Extract item name
-        try:
-            logging.info("Attempting to extract item name.")
-            item_name_element = dialog.find_element(By.CSS_SELECTOR, 'h1')
-            item_name = item_name_element.text.strip() if item_name_element else ''
-            logging.info(f"Item name extracted: {item_name}")
-        except Exception as e:
-            logging.error(f"Error extracting item name: {e}")
-
-        # Extract image URL
-        try:
-            logging.info("Attempting to extract image URL.")
-            image_element = dialog.find_element(By.CSS_SELECTOR, 'img[role="presentation"]')
-            image_url = image_element.get_attribute('src') if image_element else ''
-            logging.info(f"Image URL extracted: {image_url}")
-        except Exception as e:
-            logging.error(f"Error extracting image URL: {e}")
-
-        # Extract "pick many" options
-        try:
-            logging.info("Attempting to extract 'pick many' options.")
-            detail_elements = dialog.find_elements(By.CSS_SELECTOR, 'div[data-testid="customization-pick-many"]')
-
-            for element in detail_elements:
-                logging.info("Processing a 'pick many' element.")
-                category_names = \
-                element.find_elements(By.CSS_SELECTOR, 'div[data-testid="customization-pick-many"] > div > div > div')[
-                    0]
-                category_name = category_names.find_elements(By.CSS_SELECTOR, 'div')[0].text
-                text = element.find_element(By.CSS_SELECTOR,
-                                            'div[data-testid="customization-pick-many"] > div > div > div').text
-                match = re.search(r'(\d+)', text)
-                requires_selection_max = int(match.group(1)) if match else 0
-                logging.info(f"Category name: {category_name}, Requires selection max: {requires_selection_max}")
-
-                options = element.find_elements(By.CSS_SELECTOR, 'label')
-                option_details = []
-
-                for option in options:
-                    logging.info("Processing an option in 'pick many'.")
-                    try:
-                        name = option.find_elements(By.CSS_SELECTOR, 'label > div > div > div > div > div')[0].text
-                        logging.info(f"Option name extracted: {name}")
-                    except Exception as e:
-                        logging.error(f"Error extracting option name: {e}")
-                        name = ''
-
-                    try:
-                        price_text = option.find_elements(By.CSS_SELECTOR, 'label > div > div > div > div > div')[
-                            2].text
-                        price_cleaned = re.sub(r'[^\d.]+', '', price_text).strip()
-                        price = float(price_cleaned) if price_cleaned else 0.0
-                        logging.info(f"Option price extracted: {price}")
-                    except Exception as e:
-                        logging.error(f"Error extracting option price: {e}")
-                        price = 0.0
-                    cleaned_price = price * 2
-
-                    option_details.append(
-                        {'name': name.strip() if name else '', 'possibleToAdd': 1, 'price': cleaned_price,
-                         'leftHalfPrice': price, 'rightHalfPrice': price})
-
-                details.append({
-                    'type': "general",
-                    'name': category_name.strip() if category_name else '',
-                    'requiresSelectionMin': 0,
-                    'requiresSelectionMax': requires_selection_max,
-                    'ingredients': option_details
-                })
-
-        except Exception as e:
-            logging.error(f"Error extracting details (pick many): {e}")
-
-        # Extract "pick one" options similarly
-        try:
-            logging.info("Attempting to extract 'pick one' options.")
-            pick_one_elements = dialog.find_elements(By.CSS_SELECTOR, 'div[data-testid="customization-pick-one"]')
-
-            for element in pick_one_elements:
-                logging.info("Processing a 'pick one' element.")
-
-                category_names = \
-                element.find_elements(By.CSS_SELECTOR, 'div[data-testid="customization-pick-one"] > div > div > div')[0]
-                category_name = category_names.find_elements(By.CSS_SELECTOR, 'div')[0].text
-                text = element.find_element(By.CSS_SELECTOR,
-                                            'div[data-testid="customization-pick-one"] > div > div > div').text
-                match = re.search(r'(\d+)', text)
-                requires_selection_max = int(match.group(1)) if match else 0
-                logging.info(f"Category name: {category_name}, Requires selection max: {requires_selection_max}")
-
-                options = element.find_elements(By.CSS_SELECTOR, 'label')
-                option_details = []
-
-                for option in options:
-                    logging.info("Processing an option in 'pick one'.")
-                    try:
-                        name = option.find_elements(By.CSS_SELECTOR, 'label > div > div > div > div > div')[0].text
-                        logging.info(f"Option name extracted: {name}")
-                    except Exception as e:
-                        logging.error(f"Error extracting option name: {e}")
-                        name = ''
-
-                    try:
-                        price_text = option.find_elements(By.CSS_SELECTOR, 'label > div > div > div > div > div')[
-                            2].text
-                        price_cleaned = re.sub(r'[^\d.]+', '', price_text).strip()
-                        price = float(price_cleaned) if price_cleaned else 0.0
-                        logging.info(f"Option price extracted: {price}")
-                    except Exception as e:
-                        logging.error(f"Error extracting option price: {e}")
-                        price = 0.0
-                    cleaned_price = price * 2
-
-                    option_details.append(
-                        {'name': name.strip() if name else '', 'possibleToAdd': 1, 'price': cleaned_price,
-                         'leftHalfPrice': price, 'rightHalfPrice': price})
-
-                details.append({
-                    'type': "general",
-                    'name': category_name.strip() if category_name else '',
-                    'requiresSelectionMin': 0,
-                    'requiresSelectionMax': requires_selection_max,
-                    'ingredients': option_details
-                })
-
-        except Exception as e:
-            logging.error(f"Error extracting details (pick one): {e}")
+        if not snapshot:
+            logging.warning("Dialog not found.")
+            return ''
 
-        if details or item_name:
-            logging.info("Item details extraction completed successfully.")
-            return {'item_name': item_name, 'image_url': image_url, 'item_details': details}
+        item_details = ubereats_snapshot_to_details(snapshot)
+        if item_details['item_details'] or item_details['item_name']:
+            logging.info(f"Item details extracted for {item_details['item_name']}: "
+                         f"{len(item_details['item_details'])} groups")
+            return item_details
         else:
             logging.warning("No details were extracted.")
             return ''
@@ -350,49 +326,152 @@ class UberEatsSpider:
         if not item_name:
             return menu
 
-        for section in menu:
-            for menu_item in section['menu']:
-                if menu_item['name'] == item_name:
-                    menu_item['ingredientsGroups'] = item_details['item_details']
-                    if image_url:
-                        menu_item['image_url'] = image_url
-                    return menu
+        # Update every listing of the item, e.g. when it also appears under a featured section
+        self.menu_index = index_for(menu, self.menu_index)
+        for menu_item in self.menu_index.lookup(item_name):
+            menu_item['ingredientsGroups'] = item_details['item_details']
+            if image_url:
+                menu_item['image_url'] = image_url
 
         return menu
 
-    def save_data_to_file(self, filename='ubereats_data.json'):
-        with open(filename, 'w') as f:
-            json.dump(self.data, f, indent=4)
-
     def close(self):
-        self.driver.quit()
+        # Pooled drivers are returned to the pool by the caller
+        if self.owns_driver:
+            quit_driver(self.driver)
 
 @ubereats_bp.route('/ubereats_get_menu', methods=['POST'])
 def scrape():
-    url = request.args.get('url')
-    menu_id = request.args.get('menu_id')
+    try:
+        url, menu_id, parallelism, max_age, force_refresh = parse_ubereats_args(request.args)
+        menu_format = parse_format(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not force_refresh:
+        cached = menu_cache.get('ubereats', url, max_age)
+        if cached:
+            return jsonify({'restaurant_data': format_menu(with_menu_id(cached, menu_id), menu_format)}), 200
+
+    try:
+        job = job_manager.submit('ubereats', lambda job: run_ubereats_scrape(job, url, menu_id, parallelism),
+                                 {'url': url, 'menu_id': menu_id, 'parallelism': parallelism})
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return job_accepted(job)
+
+
+@ubereats_bp.route('/ubereats_menus/<menu_id>', methods=['GET'])
+def stored_ubereats_menu(menu_id):
+    return stored_menu_response('ubereats', menu_id, wrap='restaurant_data')
+
 
+@ubereats_bp.route('/ubereats_get_menu/stream', methods=['POST'])
+def scrape_stream():
+    """Stream the menu as NDJSON (or SSE with Accept: text/event-stream) while it is scraped."""
+    try:
+        url, menu_id, parallelism, max_age, force_refresh = parse_ubereats_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not force_refresh:
+        cached = menu_cache.get('ubereats', url, max_age)
+        if cached:
+            return stream_response(cached_events(with_menu_id(cached, menu_id), wants_sse(request)),
+                                   wants_sse(request))
+
+    stream = MenuStream(wants_sse(request))
+    try:
+        job = job_manager.submit(
+            'ubereats', lambda job: run_streamed(
+                job, stream, lambda job: run_ubereats_scrape(job, url, menu_id, parallelism, stream.emit)),
+            {'url': url, 'menu_id': menu_id, 'parallelism': parallelism, 'stream': True})
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return stream_response(streamed_job_events(job, stream), stream.sse)
+
+
+def parse_ubereats_args(args):
+    """Read url, menu_id, parallelism, max_age and force_refresh, raising ValueError for bad input."""
+    url = args.get('url')
+    menu_id = args.get('menu_id')
     if not url or not menu_id:
-        return jsonify({'error': 'URL and menu_id are required'}), 400
+        raise ValueError('URL and menu_id are required')
+    parallelism = parse_parallelism(args.get('parallelism'))
+    max_age, force_refresh = parse_cache_args(args)
+    return url, menu_id, parallelism, max_age, force_refresh
+
 
-    spider = UberEatsSpider()
+def stored_menu_response(platform, menu_id, wrap=None):
+    """Serve the last stored menu of menu_id, answering 304 while its content hash is unchanged."""
     try:
-        restaurant_data = spider.parse(url, menu_id)
-        if restaurant_data:
-            spider.save_data_to_file(f"ubereats_menu_{menu_id}.json")
-            return jsonify({
-                'restaurant_data': restaurant_data
-            }), 200
-        else:
-            return jsonify({'error': 'Failed to scrape the menu data'}), 500
-    finally:
-        spider.close()
+        menu_format = parse_format(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    path = menu_path(platform, menu_id)
+    # A menu still waiting to be written gets the hash of the bytes the writer will put on disk
+    etag = menu_writer.etag(path)
+    if etag:
+        etag = f"{etag}.{menu_format}"
+        response = not_modified(etag)
+        if response is not None:
+            return response
+    try:
+        menu = load_menu(path)
+    except FileNotFoundError:
+        return jsonify({'error': 'Menu not found'}), 404
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not read stored menu {path}: {e}")
+        return jsonify({'error': 'Could not read the stored menu'}), 500
+    menu = format_menu(menu, menu_format)
+    response = jsonify({wrap: menu} if wrap else menu)
+    if etag:
+        response.set_etag(etag)
+    return response
+
+
+def save_menu(platform, url, menu_id, restaurant_data):
+    # Serve the menu from memory right away, the file is indexed once the writer has put it on disk
+    menu_cache.put(platform, url, restaurant_data)
+    menu_writer.save(menu_path(platform, menu_id), restaurant_data,
+                     on_written=lambda path: menu_cache.record_file(platform, url, path), platform=platform)
+
+
+def parse_parallelism(value):
+    # Number of browsers for one scrape, capped by the pool size
+    if value is None:
+        return max(1, min(SCRAPE_PARALLELISM, driver_pool.size))
+    try:
+        parallelism = int(value)
+    except ValueError:
+        raise ValueError("'parallelism' must be an integer")
+    if parallelism < 1:
+        raise ValueError("'parallelism' must be at least 1")
+    return min(parallelism, driver_pool.size)
+
+
+def run_ubereats_scrape(job, url, menu_id, parallelism=1, on_event=None):
+    with driver_pool.driver() as driver:
+        # Extra browsers are only used if they are free right now
+        shard_drivers = driver_pool.checkout_available(parallelism - 1)
+        spider = UberEatsSpider(driver, on_event)
+        try:
+            restaurant_data = spider.parse(url, menu_id, progress=job.progress, shard_drivers=shard_drivers)
+            if restaurant_data:
+                save_menu('ubereats', url, menu_id, restaurant_data)
+                return {'restaurant_data': restaurant_data}
+            return None
+        finally:
+            spider.close()
+            for shard_driver in shard_drivers:
+                driver_pool.release(shard_driver)
 
 doorbash_bp = Blueprint('doordash', __name__)
 
-restaurant_detail = {}
-all_items_details = []
-clicked_items = set()
+APOLLO_SCRIPT_XPATH = '(//script[contains(text(),"apolloCacheData")])[2]'
+MENU_ITEMS_XPATH = '//div[@data-testid="MenuItem"]'
+MENU_ITEMS_SELECTOR = 'div[data-testid="MenuItem"]'
+
 def extract_store_header(storepage_feed):
     return storepage_feed.get('storeHeader', {})
 
@@ -452,6 +531,7 @@ def transform_item_lists(item_lists):
                 price = 0.0  # Default value or handle as needed
 
             menu_item = {
+                "id": item.get('id'),
                 "name": item.get('name', 'Unnamed Item'),
                 "description": item.get('description', 'No Description'),
                 "imageUrl": item.get('imageUrl', 'No Image URL'),
@@ -512,214 +592,295 @@ def extract_and_transform_json_data(json_data):
         logging.error("No results found in the provided JSON data.")
         return {}
 
-    for result in results:
-        storepage_feed = result.get('data', {}).get('storepageFeed', {})
-        if storepage_feed:
-            store_header = extract_store_header(storepage_feed)
-            mx_info = storepage_feed.get('mxInfo', {})
-            store_opening_hours = extract_store_hours(mx_info)
-            menu_book = storepage_feed.get('menuBook', {})
-            menu_groups = extract_menu_groups(menu_book)
-            item_lists = storepage_feed.get('itemLists', {})
-            transformed_categories = transform_item_lists(item_lists)
-
-            restaurant = compile_restaurant_data(
-                store_header,
-                mx_info,
-                store_opening_hours,
-                menu_groups,
-                transformed_categories
-            )
+    storepage_feed = find_storepage_feed(json_data)
+    if storepage_feed:
+        return transform_storepage_feed(storepage_feed)
 
-            return restaurant
 
+def transform_storepage_feed(storepage_feed):
+    store_header = extract_store_header(storepage_feed)
+    mx_info = storepage_feed.get('mxInfo', {})
+    store_opening_hours = extract_store_hours(mx_info)
+    menu_book = storepage_feed.get('menuBook', {})
+    menu_groups = extract_menu_groups(menu_book)
+    item_lists = storepage_feed.get('itemLists', {})
+    transformed_categories = transform_item_lists(item_lists)
 
-def parse_store_data(driver):
+    restaurant = compile_restaurant_data(
+        store_header,
+        mx_info,
+        store_opening_hours,
+        menu_groups,
+        transformed_categories
+    )
+
+    return restaurant
+
+
+def read_store_script(driver):
+    """Wait for the script tag holding the Apollo data and return its text, None if it never loaded."""
     try:
-        # Wait for the script tag containing the Apollo data
-        script_tag = WebDriverWait(driver, 60).until(
-            EC.presence_of_element_located((By.XPATH, '(//script[contains(text(),"apolloCacheData")])[2]'))
-        )
-        json_text = script_tag.get_attribute('textContent')
+        with metrics.span('doordash', 'apollo_wait'):
+            script_tag = wait_until(driver, EC.presence_of_element_located((By.XPATH, APOLLO_SCRIPT_XPATH)),
+                                    'apollo_script', 60)
+            json_text = script_tag.get_attribute('textContent')
 
         logging.debug("Raw JSON text: %s", json_text)  # Log the raw JSON for debugging
+        return json_text
 
     except Exception as e:
         logging.error("Could not find the script tag: %s", e)
-        return {}
+        return None
 
-    try:
-        # Extract JSON part by finding the first occurrence of '{' and last '}'
-        json_start = json_text.find('{')
-        json_end = json_text.rfind('}') + 1
-        json_str = json_text[json_start:json_end]
-
-        # Clean up problematic escape sequences
-        json_str = re.sub(r'\\(?!["\\/bfnrt])', r'\\\\', json_str)  # Correct invalid escape sequences
-
-        # Decode JSON content, handle unicode characters
-        json_str = json_str.encode().decode('unicode_escape')
 
-        # Parse the sanitized JSON string
-        json_data = json.loads(json_str)
-    #        logging.info(f"json_data: {json_data}")
+def decode_store_data(json_text):
+    # CPU-only half of parse_store_data, no browser is needed once the script text is read
+    if not json_text:
+        return {}
+    try:
+        # Unescape the embedded payload and decode only its storepageFeed entry
+        with metrics.span('doordash', 'json_extract'):
+            storepage_feed = extract_storepage_feed(json_text)
 
     except json.JSONDecodeError as e:
         logging.error("JSON decoding failed: %s", e)
         return {}
 
-    restaurant_detail = extract_and_transform_json_data(json_data)
+    if not storepage_feed:
+        logging.error("No storepageFeed found in the Apollo data.")
+        return {}
+
+    with metrics.span('doordash', 'transform'):
+        restaurant_detail = transform_storepage_feed(storepage_feed)
     return restaurant_detail
 
 
-def save_json_to_file(data, filename='restaurant_detail.json'):
-    with open(filename, 'w') as outfile:
-        json.dump(data, outfile, indent=4)
+def parse_store_data(driver):
+    return decode_store_data(read_store_script(driver))
+
+
+def extract_item_modal_dom(driver, group_cache=None):
+    """Read the open item modal by walking its DOM elements.
+
+    With a group_cache, groups already parsed for an earlier item are reused
+    and their elements are not walked again.
+    """
+    # Extract item name
+    item_name = driver.find_element(By.XPATH, '//h2[@class="Text-sc-1nm69d8-0 dtvoNG"]/span').text
+    logging.info(f"Item name: {item_name}")
+
+    details = []
+
+    # Extract details similar to salad choices
+    details_elements = driver.find_elements(By.CSS_SELECTOR, 'div[role="group"]')
+    logging.info(f"details_elements: {details_elements}")
+    fingerprints = [None] * len(details_elements)
+    if group_cache is not None:
+        # One call fingerprints every group, only unknown groups are walked below
+        fingerprints = driver.execute_script(DOORDASH_GROUP_FINGERPRINTS_JS) or []
+        if len(fingerprints) != len(details_elements):
+            fingerprints = [None] * len(details_elements)
+    for detail, fingerprint in zip(details_elements, fingerprints):
+        cached = group_cache.get(fingerprint) if fingerprint else None
+        if cached is not None:
+            details.append(cached)
+            continue
+        detail_name = detail.find_element(By.CSS_SELECTOR, 'h3.Text-sc-1nm69d8-0.hBnZXN').text
+        logging.info(f"detail_name: {detail_name}")
+        select_spans = detail.find_elements(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0.gFJzBa')
+        logging.info(f"select_spans: {select_spans}")
+        if len(select_spans) > 1:
+            select_value_text = select_spans[1].text.strip()
+            select_value = re.sub(r'[^0-9]', '', select_value_text)
+            if not select_value:
+                select_value = 0
+            else:
+                select_value = int(select_value)  # Convert to integer
+        else:
+            select_value = 0
+
+        options = []
+
+        # Check for element type 1 specific structure
+        option_elements = detail.find_elements(By.CSS_SELECTOR, 'div.sc-724a33a-8')
+        if not option_elements:
+            # Fallback to the original option_elements selector
+            option_elements = detail.find_elements(By.CSS_SELECTOR, 'label')
+
+        logging.info(f"option_elements: {option_elements}")
+        for option in option_elements:
+            # For element type 1
+            if 'sc-724a33a-8' in option.get_attribute('class'):
+                option_name = option.find_element(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0.ZNLaC').text
+                # Filter out calorie-only elements and extract only price elements
+                price_elements = [elem for elem in
+                                  option.find_elements(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0.dCneXH')
+                                  if '+' in elem.text]  # This will include only price elements
+            else:
+                # For element type 2 and 3
+                option_name = option.find_element(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0').text
+                price_elements = [elem for elem in
+                                  option.find_elements(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0.dCneXH')
+                                  if '+' in elem.text]
+
+            logging.info(f"option_name: {option_name}")
+            logging.info(f"price_elements: {price_elements}")
+
+            if price_elements:
+                raw_price = price_elements[0].text
+                # Remove unwanted characters and any additional text
+                raw_price = raw_price.replace('US', '').replace('+', '').replace('$', '').strip()
+
+                try:
+                    # Attempt to convert to float
+                    cleaned_price = float(raw_price)
+                except ValueError:
+                    # Handle cases where conversion to float fails
+                    cleaned_price = 0
+            else:
+                # Handle cases where price_elements was not used or found
+                logging.info(f"No price found for {option_name}. Setting default price.")
+                cleaned_price = 0  # Or you can set a default value like 0 or 0.0
+
+            # Multiply cleaned price by 2
+            price = cleaned_price * 2
+
+            # Define possibleToAdd value based on element type
+            possible_to_add = 999999 if 'sc-724a33a-8' in option.get_attribute('class') else 1
+
+            options.append({
+                'name': option_name,
+                'possibleToAdd': possible_to_add,
+                'price': price,
+                'leftHalfPrice': cleaned_price,
+                'rightHalfPrice': cleaned_price,
+                'ingredientsGroup': []
+            })
+
+        group_details = {
+            'type': "general",
+            'name': detail_name,
+            'requiresSelectionMin': 0,
+            'requiresSelectionMax': select_value,
+            'ingredients': options
+        }
+        if group_cache is not None:
+            group_details = group_cache.put(fingerprint, group_details)
+        details.append(group_details)
+
+    return {
+        'item_name': item_name,
+        'item_details': details
+    }
 
 
-def click_item(driver, item):
-    """Click the item and handle the item modal."""
-    global all_items_details, clicked_items  # Declare global variables before use
+def extract_item_modal(driver, capture_mode, group_cache=None):
+    """Read the open item modal, returning the item details and the method used.
+
+    Option groups found in group_cache are not read from the page again.
+    """
+    if capture_mode != 'dom':
+        known = group_cache.fingerprints() if group_cache is not None else []
+        snapshot = driver.execute_script(DOORDASH_ITEM_MODAL_JS, known)
+        if snapshot:
+            item_details = doordash_snapshot_to_details(snapshot, group_cache)
+            if item_details is None:
+                # Only happens if the cache lost a group, read them all again
+                snapshot = driver.execute_script(DOORDASH_ITEM_MODAL_JS, [])
+                item_details = doordash_snapshot_to_details(snapshot, group_cache) if snapshot else None
+            if item_details is not None:
+                return item_details, 'snapshot'
+        logging.warning("Item modal snapshot failed, walking the modal DOM")
+    return extract_item_modal_dom(driver, group_cache), 'dom'
+
+
+def click_item(session, driver, item, capture=None, capture_mode=DOORDASH_CAPTURE_MODE, item_filter=None):
+    """Click the item and handle the item modal.
+
+    driver is the browser showing item, a shard browser or the session's own.
+    When a GraphQLCapture is given the details come from the itemPage network
+    response, falling back to reading the modal if no response is seen.
+    Items rejected by item_filter (called with the card text) are left to other shards.
+    """
     try:
         WebDriverWait(driver, 60).until(EC.element_to_be_clickable(item))
         item_text = item.text
-        if item_text not in clicked_items:
+        if item_filter and not item_filter(item_text):
+            return None
+        if session.claim_item(item_text):
+            item_started = time.perf_counter()
+            if capture is not None:
+                capture.reset()
             item.click()
-            clicked_items.add(item_text)
             logging.info(f"Item clicked: {item_text}")
-            time.sleep(5)  # Wait for item modal to load
 
-            # Wait for the item modal to become visible
-            WebDriverWait(driver, 60).until(
-                EC.visibility_of_element_located((By.CSS_SELECTOR, '[data-testid="ItemModal"]'))
-            )
-            logging.info("Item modal visible")
-
-            # Extract item name
-            item_name = driver.find_element(By.XPATH, '//h2[@class="Text-sc-1nm69d8-0 dtvoNG"]/span').text
-            logging.info(f"Item name: {item_name}")
-
-            details = []
-
-            # Extract details similar to salad choices
-            details_elements = driver.find_elements(By.CSS_SELECTOR, 'div[role="group"]')
-            logging.info(f"details_elements: {details_elements}")
-            for detail in details_elements:
-                detail_name = detail.find_element(By.CSS_SELECTOR, 'h3.Text-sc-1nm69d8-0.hBnZXN').text
-                logging.info(f"detail_name: {detail_name}")
-                select_spans = detail.find_elements(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0.gFJzBa')
-                logging.info(f"select_spans: {select_spans}")
-                if len(select_spans) > 1:
-                    select_value_text = select_spans[1].text.strip()
-                    select_value = re.sub(r'[^0-9]', '', select_value_text)
-                    if not select_value:
-                        select_value = 0
-                    else:
-                        select_value = int(select_value)  # Convert to integer
-                else:
-                    select_value = 0
-
-                options = []
-
-                # Check for element type 1 specific structure
-                option_elements = detail.find_elements(By.CSS_SELECTOR, 'div.sc-724a33a-8')
-                if not option_elements:
-                    # Fallback to the original option_elements selector
-                    option_elements = detail.find_elements(By.CSS_SELECTOR, 'label')
-
-                logging.info(f"option_elements: {option_elements}")
-                for option in option_elements:
-                    # For element type 1
-                    if 'sc-724a33a-8' in option.get_attribute('class'):
-                        option_name = option.find_element(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0.ZNLaC').text
-                        # Filter out calorie-only elements and extract only price elements
-                        price_elements = [elem for elem in
-                                          option.find_elements(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0.dCneXH')
-                                          if '+' in elem.text]  # This will include only price elements
-                    else:
-                        # For element type 2 and 3
-                        option_name = option.find_element(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0').text
-                        price_elements = [elem for elem in
-                                          option.find_elements(By.CSS_SELECTOR, 'span.Text-sc-1nm69d8-0.dCneXH')
-                                          if '+' in elem.text]
-
-                    logging.info(f"option_name: {option_name}")
-                    logging.info(f"price_elements: {price_elements}")
-
-                    if price_elements:
-                        raw_price = price_elements[0].text
-                        # Remove unwanted characters and any additional text
-                        raw_price = raw_price.replace('US', '').replace('+', '').replace('$', '').strip()
-
-                        try:
-                            # Attempt to convert to float
-                            cleaned_price = float(raw_price)
-                        except ValueError:
-                            # Handle cases where conversion to float fails
-                            cleaned_price = 0
-                    else:
-                        # Handle cases where price_elements was not used or found
-                        logging.info(f"No price found for {option_name}. Setting default price.")
-                        cleaned_price = 0  # Or you can set a default value like 0 or 0.0
-
-                    # Multiply cleaned price by 2
-                    price = cleaned_price * 2
-
-                    # Define possibleToAdd value based on element type
-                    possible_to_add = 999999 if 'sc-724a33a-8' in option.get_attribute('class') else 1
-
-                    options.append({
-                        'name': option_name,
-                        'possibleToAdd': possible_to_add,
-                        'price': price,
-                        'leftHalfPrice': cleaned_price,
-                        'rightHalfPrice': cleaned_price,
-                        'ingredientsGroup': []
-                    })
-
-                details.append({
-                    'type': "general",
-                    'name': detail_name,
-                    'requiresSelectionMin': 0,
-                    'requiresSelectionMax': select_value,
-                    'ingredients': options
-                })
-
-            # Append the item details to the global list
-            item_details = {
-                'item_name': item_name,
-                'item_details': details
-            }
-            all_items_details.append(item_details)
-
-            # Close the modal and handle any issues with closing
-            close_button = driver.find_element(By.CSS_SELECTOR, 'button[aria-label^="Close"]')
-            logging.info(f"close_button: {close_button}")
-
-            close_button.click()
-            logging.info("Close button clicked")
-
-            # Wait for the modal to close
-            WebDriverWait(driver, 60).until(
-                EC.invisibility_of_element_located((By.CSS_SELECTOR, '[data-testid="ItemModal"]'))
-            )
-            logging.info("Item modal closed")
-            time.sleep(5)
-
-            # Update the global menu with the item details
-            global restaurant_detail
-            if restaurant_detail:
-                restaurant_detail = append_item_details_to_menu_doordash(restaurant_detail, item_details)
+            with metrics.span('doordash', 'modal_read'):
+                item_details = None
+                if capture is not None:
+                    # Read the option groups from the itemPage GraphQL response
+                    payload = wait_until(driver, capture.item_page_ready, 'item_graphql', 10, required=False)
+                    if payload:
+                        item_details = item_page_to_details(payload)
+                        wait_until(driver, EC.visibility_of_element_located((By.CSS_SELECTOR, '[data-testid="ItemModal"]')),
+                                   'item_modal', 60)
+                        logging.info(f"Item details captured from GraphQL: {item_details['item_name']}")
+
+                if not item_details or not item_details['item_name']:
+                    # Wait for the item modal to become visible and finish rendering its options
+                    wait_until(driver, item_modal_filled(), 'item_modal', 60)
+                    logging.info("Item modal visible")
+                    with CommandCounter(driver) as counter:
+                        item_details, method = extract_item_modal(driver, capture_mode, session.modifier_groups)
+                    command_stats.record(method, counter.count)
+                    logging.info(f"Item modal read ({method}) with {counter.count} WebDriver commands")
+
+            # Append the item details to the session
+            session.add_item_details(item_details)
+
+            with metrics.span('doordash', 'modal_close'):
+                # Close the modal and handle any issues with closing
+                close_button = driver.find_element(By.CSS_SELECTOR, 'button[aria-label^="Close"]')
+                logging.info(f"close_button: {close_button}")
+
+                close_button.click()
+                logging.info("Close button clicked")
+
+                # Wait for the modal to close
+                wait_until(driver,
+                           EC.invisibility_of_element_located((By.CSS_SELECTOR, '[data-testid="ItemModal"]')),
+                           'modal_closed', 60)
+                logging.info("Item modal closed")
+
+            # Update the session menu with the item details
+            with metrics.span('doordash', 'merge'):
+                if session.restaurant_detail:
+                    append_item_details_to_menu_doordash(session.restaurant_detail, item_details, session.menu_index)
+            metrics.inc('items_scraped', 'doordash')
+            metrics.observe('doordash', 'item', time.perf_counter() - item_started)
+            session.emit('item', {'item_id': item_details.get('item_id'), 'item_name': item_details['item_name'],
+                                  'ingredientsGroups': item_details['item_details']})
+            return item_details
         else:
             logging.info(f"Item already clicked: {item_text}")
 
     except Exception as e:
         logging.error(f"Error interacting with item: {e}")
-        time.sleep(2)
+        metrics.inc('modal_failures', 'doordash')
+        # Let a modal left open by the failure close before the next item is clicked
+        try:
+            wait_until(driver, EC.invisibility_of_element_located((By.CSS_SELECTOR, '[data-testid="ItemModal"]')),
+                       'modal_closed', 2, required=False)
+        except Exception:
+            pass
+    return None
+
 
 
+def append_item_details_to_menu_doordash(menu, item_details, index=None):
+    """Merge one item's details into every listing of the item in menu.
 
-def append_item_details_to_menu_doordash(menu, item_details):
+    Pass the MenuIndex built for menu to merge in O(1), otherwise one is built.
+    """
     if not item_details:
         return menu
 
@@ -728,12 +889,11 @@ def append_item_details_to_menu_doordash(menu, item_details):
     if not item_name:
         return menu
 
-    for section in menu['data']['categories']:
-        for menu_item in section['menu']:
-            if menu_item['name'] == item_name:
-                # Only add details if the item does not already have them
-                if not menu_item.get('ingredientsGroups'):
-                    menu_item['ingredientsGroups'] = item_details['item_details']
+    index = index_for(menu['data']['categories'], index)
+    for menu_item in index.lookup(item_name, item_details.get('item_id')):
+        # Only add details if the item does not already have them
+        if not menu_item.get('ingredientsGroups'):
+            menu_item['ingredientsGroups'] = item_details['item_details']
 
     return menu
 
@@ -742,24 +902,93 @@ def is_scrolling(driver, previous_scroll_position):
     return current_scroll_position > previous_scroll_position
 
 
-def scrape_menu(url, menu_id):
-    global restaurant_detail, all_items_details, clicked_items
-    driver = Driver(uc=True, undetectable=True, headless=True)
-    driver.set_window_size(1024, 1024)  # Example for an iPad in portrait mode
+def count_menu_items(restaurant):
+    # Items can be listed in several categories, count each name once
+    return len({menu_item['name']
+                for category in restaurant.get('data', {}).get('categories', [])
+                for menu_item in category['menu']})
 
-    driver.get(url)
-    time.sleep(50)  # Adjust the sleep time based on how long the page takes to load
 
-    # Parse and save restaurant data
-    restaurant_detail = parse_store_data(driver)
-    restaurant_detail['data']['menu_id'] = menu_id  # Set the menu_id received as input
+def card_item_name(item_text):
+    # The first line of a menu card is the item name
+    return item_text.split('\n')[0]
+
+
+def shard_filter(shard, shard_count, skip_names=frozenset()):
+    """Build the click_item filter for one shard, also leaving out items in skip_names."""
+    if shard_count == 1 and not skip_names:
+        return None
 
-    # Scroll and fetch items
+    def item_filter(item_text):
+        name = card_item_name(item_text)
+        return name not in skip_names and shard_of(name, shard_count) == shard
+
+    return item_filter
+
+
+def load_previous_menu(menu_id):
+    """Return the last saved menu of menu_id, including one still being written."""
+    try:
+        return load_menu(menu_path('doordash', menu_id))
+    except (OSError, ValueError):
+        return None
+
+
+def item_signature(menu_item):
+    return (menu_item.get('price'), menu_item.get('description'), menu_item.get('imageUrl'))
+
+
+def carry_forward_unchanged_items(restaurant, previous):
+    """Copy ingredientsGroups from the previous snapshot to items whose storepage data is unchanged.
+
+    Returns the names of the carried items, their modals do not need to be opened again.
+    Items that had no groups last time are always re-opened.
+    """
+    previous_items = {}
+    for category in previous['data'].get('categories', []):
+        for menu_item in category['menu']:
+            if menu_item.get('ingredientsGroups'):
+                previous_items[menu_item['name']] = menu_item
+
+    unchanged = set()
+    for category in restaurant['data']['categories']:
+        for menu_item in category['menu']:
+            previous_item = previous_items.get(menu_item['name'])
+            if previous_item and item_signature(previous_item) == item_signature(menu_item):
+                menu_item['ingredientsGroups'] = previous_item['ingredientsGroups']
+                unchanged.add(menu_item['name'])
+    return unchanged
+
+
+def enumerate_doordash_menu(session, driver):
+    """Wait for the first menu cards and return the ordered work list of every item on the page."""
+    wait_until(driver, elements_settled(MENU_ITEMS_XPATH), 'menu_items', 10, required=False)
+    with metrics.span('doordash', 'enumerate'):
+        return enumerate_menu_items(driver, MENU_ITEMS_SELECTOR, session.menu_index)
+
+
+def click_work_list(session, driver, work_list, capture, capture_mode, item_filter, shard_progress):
+    # Visit each enumerated item once, in page order, bringing its card into view directly
+    for work_item in work_list:
+        if item_filter and not item_filter(work_item['name']):
+            continue
+        card = wait_until(driver, menu_item_locator(MENU_ITEMS_SELECTOR, work_item), 'locate_item', 5,
+                          required=False)
+        if card is None:
+            logging.warning(f"Menu item not found on the page: {work_item['name']}")
+            metrics.inc('modal_failures', 'doordash')
+            continue
+        if click_item(session, driver, card, capture, capture_mode, item_filter) and shard_progress:
+            shard_progress.advance()
+
+
+def scroll_and_click_items(session, driver, capture, capture_mode, item_filter, shard_progress):
+    # Fallback when enumeration found nothing: scroll in small steps, clicking the cards as they render
     driver.execute_script("window.scrollBy(0, 2000);")
-    time.sleep(10)
+    wait_until(driver, elements_settled(MENU_ITEMS_XPATH), 'menu_items', 10, required=False)
 
     # Fetch all items initially
-    items_xpath = '//div[@data-testid="MenuItem"]'
+    items_xpath = MENU_ITEMS_XPATH
     items = driver.find_elements(By.XPATH, items_xpath)
 
     previous_scroll_position = driver.execute_script("return window.scrollY;")
@@ -768,12 +997,14 @@ def scrape_menu(url, menu_id):
 
     while items:
         for item in items:
-            click_item(driver, item)
+            if click_item(session, driver, item, capture, capture_mode, item_filter) and shard_progress:
+                shard_progress.advance()
 
         # Scroll and check if new items are loaded
-        driver.execute_script("window.scrollBy(0, 100);")
-        time.sleep(2)
-        items = driver.find_elements(By.XPATH, items_xpath)
+        with metrics.span('doordash', 'scroll'):
+            driver.execute_script("window.scrollBy(0, 100);")
+            wait_until(driver, elements_settled(items_xpath), 'scroll_step', 2, required=False)
+            items = driver.find_elements(By.XPATH, items_xpath)
 
         if not items:
             logging.info("No more items found.")
@@ -789,44 +1020,413 @@ def scrape_menu(url, menu_id):
                 logging.info("No new items found after scrolling multiple times. Quitting.")
                 break
 
-    # After processing all items, update the restaurant data
-    if restaurant_detail:
-        for item_details in all_items_details:
-            restaurant_detail = append_item_details_to_menu_doordash(restaurant_detail, item_details)
 
-    # Close the browser when done
-    driver.quit()
+def click_all_items(session, driver, capture_mode=DOORDASH_CAPTURE_MODE, item_filter=None, shard_progress=None,
+                    work_list=None):
+    """Open every item modal accepted by item_filter.
 
-    return restaurant_detail
+    Items are visited in the order of work_list, enumerated from the page when
+    not given; the scroll-and-query loop only runs if enumeration found nothing.
+    """
+    capture = None
+    if capture_mode == 'network':
+        capture = GraphQLCapture(driver)
+        try:
+            capture.reset()
+        except Exception as e:
+            logging.warning(f"Performance log unavailable, reading item modals from the DOM: {e}")
+            capture = None
+
+    if work_list is None:
+        work_list = enumerate_doordash_menu(session, driver)
+    if work_list:
+        click_work_list(session, driver, work_list, capture, capture_mode, item_filter, shard_progress)
+    else:
+        scroll_and_click_items(session, driver, capture, capture_mode, item_filter, shard_progress)
+
+
+def scrape_menu_shard(session, driver, url, capture_mode, shard, shard_count, shard_progress, skip_names,
+                      work_list=None):
+    # Open the store already loaded by the session's browser and work through this shard's items
+    driver.set_window_size(1024, 1024)
+    share_store_context(session.driver, driver, url)
+    wait_until(driver, EC.presence_of_element_located((By.XPATH, APOLLO_SCRIPT_XPATH)), 'apollo_script', 60)
+    if work_list:
+        wait_until(driver, elements_settled(MENU_ITEMS_XPATH), 'menu_items', 10, required=False)
+    click_all_items(session, driver, capture_mode, shard_filter(shard, shard_count, skip_names), shard_progress,
+                    work_list)
+
+
+def scrape_menu(url, menu_id, driver=None, progress=None, capture_mode=DOORDASH_CAPTURE_MODE, shard_drivers=(),
+                incremental=False, report=None, on_event=None):
+    """Scrape a DoorDash store menu.
+
+    With incremental set, items unchanged since the last saved snapshot of
+    menu_id keep their ingredientsGroups and their modals are skipped;
+    the counts are written to the report dict. on_event receives the store
+    event once the storepage is parsed and an item event per opened modal.
+    """
+    started = time.perf_counter()
+    # Use a pooled driver when given one, otherwise launch our own
+    owns_driver = driver is None
+    if owns_driver:
+        driver = create_driver(log_cdp_events=capture_mode == 'network', profile='doordash')
+    driver.set_window_size(1024, 1024)  # Example for an iPad in portrait mode
+
+    with metrics.span('doordash', 'page_load'), measured_page_load(driver, 'doordash'):
+        driver.get(url)
+    # Everything this request collects lives in its session, so concurrent scrapes stay apart
+    session = ScrapeSession(driver, menu_id, on_event)
+
+    # Parse and save restaurant data, this waits for the Apollo script to load
+    restaurant_detail = parse_store_data(driver)
+    restaurant_detail['data']['menu_id'] = menu_id  # Set the menu_id received as input
+    # Item details are merged as each modal closes
+    session.set_menu(restaurant_detail)
+
+    skip_names = frozenset()
+    if incremental:
+        previous = load_previous_menu(menu_id)
+        if previous:
+            skip_names = frozenset(carry_forward_unchanged_items(restaurant_detail, previous))
+        else:
+            logging.info(f"No previous snapshot for menu {menu_id}, opening every item")
+    if report is not None:
+        report['modals_skipped'] = len(skip_names)
+    session.emit('store', restaurant_detail)
+    shard_progress = ShardProgress(progress, count_menu_items(restaurant_detail) - len(skip_names))
+
+    # Enumerate the menu once, every shard works from the same ordered list
+    work_list = enumerate_doordash_menu(session, driver)
+    if report is not None:
+        report['items_enumerated'] = len(work_list)
+
+    # Split the item modals across this browser and any shard browsers
+    shard_count = len(shard_drivers) + 1
+    shard_workers = [
+        lambda shard=shard, shard_driver=shard_driver: scrape_menu_shard(
+            session, shard_driver, url, capture_mode, shard, shard_count, shard_progress, skip_names, work_list)
+        for shard, shard_driver in enumerate(shard_drivers, start=1)
+    ]
+    with metrics.span('doordash', 'modals'):
+        run_shards(lambda: click_all_items(session, driver, capture_mode, shard_filter(0, shard_count, skip_names),
+                                           shard_progress, work_list),
+                   shard_workers)
+    if report is not None:
+        report['modals_opened'] = shard_progress.done
+
+    # Close the browser when done, pooled drivers are returned by the caller
+    if owns_driver:
+        quit_driver(driver)
+
+    metrics.observe('doordash', 'total', time.perf_counter() - started)
+    return session.restaurant_detail
 
 # Flask API route
 @doorbash_bp.route('/doordash_getmenu', methods=['POST'])
 def scrape_menu_api():
     try:
-        # Get URL and menu_id from the request arguments
-        url = request.args.get('url')
-        menu_id = request.args.get('menu_id')
+        # Get URL, menu_id and the scrape options from the request arguments
+        url, menu_id, capture_mode, parallelism, incremental, max_age, force_refresh = \
+            parse_doordash_args(request.args)
+        menu_format = parse_format(request.args)
+
+        # Serve a recent scrape of the same store without opening a browser
+        if not force_refresh:
+            cached = menu_cache.get('doordash', url, max_age)
+            if cached:
+                return jsonify(format_menu(with_menu_id(cached, menu_id), menu_format)), 200
+
+        # Queue the scrape and let the client poll /jobs/<job_id>
+        job = job_manager.submit(
+            'doordash', lambda job: run_doordash_scrape(job, url, menu_id, capture_mode, parallelism, incremental),
+            {'url': url, 'menu_id': menu_id, 'capture': capture_mode, 'parallelism': parallelism,
+             'incremental': incremental})
+        return job_accepted(job)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logging.error(f"Error during scraping: {e}")
+        return jsonify({"error": str(e)}), 500
 
-        if not url or not menu_id:
-            return jsonify({"error": "Please provide both 'url' and 'menu_id'"}), 400
 
-        # Call the scrape function
-        restaurant_data = scrape_menu(url, menu_id)
+@doorbash_bp.route('/doordash_menus/<menu_id>', methods=['GET'])
+def stored_doordash_menu(menu_id):
+    return stored_menu_response('doordash', menu_id)
 
-        # Save the restaurant data to a file
-        save_json_to_file(restaurant_data, 'restaurant_detail.json')
 
-        return jsonify(restaurant_data), 200
+@doorbash_bp.route('/doordash_getmenu/stream', methods=['POST'])
+def scrape_menu_stream_api():
+    """Stream the menu as NDJSON (or SSE with Accept: text/event-stream) while it is scraped."""
+    try:
+        url, menu_id, capture_mode, parallelism, incremental, max_age, force_refresh = \
+            parse_doordash_args(request.args)
+
+        if not force_refresh:
+            cached = menu_cache.get('doordash', url, max_age)
+            if cached:
+                return stream_response(cached_events(with_menu_id(cached, menu_id), wants_sse(request)),
+                                       wants_sse(request))
+
+        stream = MenuStream(wants_sse(request))
+        job = job_manager.submit(
+            'doordash', lambda job: run_streamed(job, stream, lambda job: run_doordash_scrape(
+                job, url, menu_id, capture_mode, parallelism, incremental, stream.emit)),
+            {'url': url, 'menu_id': menu_id, 'capture': capture_mode, 'parallelism': parallelism,
+             'incremental': incremental, 'stream': True})
+        return stream_response(streamed_job_events(job, stream), stream.sse)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+
+def parse_doordash_args(args):
+    """Read the DoorDash scrape arguments, raising ValueError for bad input."""
+    url = args.get('url')
+    menu_id = args.get('menu_id')
+    capture_mode = args.get('capture', DOORDASH_CAPTURE_MODE)
+
+    if not url or not menu_id:
+        raise ValueError("Please provide both 'url' and 'menu_id'")
+    if capture_mode not in DOORDASH_CAPTURE_MODES:
+        raise ValueError(f"'capture' must be one of {', '.join(DOORDASH_CAPTURE_MODES)}")
+    parallelism = parse_parallelism(args.get('parallelism'))
+    max_age, force_refresh = parse_cache_args(args)
+    incremental = args.get('incremental', '').lower() in ('1', 'true', 'yes')
+    return url, menu_id, capture_mode, parallelism, incremental, max_age, force_refresh
+
+
+def run_doordash_scrape(job, url, menu_id, capture_mode=DOORDASH_CAPTURE_MODE, parallelism=1, incremental=False,
+                        on_event=None):
+    # Call the scrape function with a browser from the pool
+    with driver_pool.driver() as driver:
+        # Extra browsers are only used if they are free right now
+        shard_drivers = driver_pool.checkout_available(parallelism - 1)
+        try:
+            restaurant_data = scrape_menu(url, menu_id, driver, progress=job.progress, capture_mode=capture_mode,
+                                          shard_drivers=shard_drivers, incremental=incremental, report=job.info,
+                                          on_event=on_event)
+        finally:
+            for shard_driver in shard_drivers:
+                driver_pool.release(shard_driver)
+
+    if restaurant_data:
+        save_menu('doordash', url, menu_id, restaurant_data)
+
+    return restaurant_data
+
+
+@app.route('/batch_scrape', methods=['POST'])
+def batch_scrape_api():
+    """Scrape a list of {platform, url, menu_id} restaurants, polled through /jobs/<job_id>."""
+    payload = request.get_json(silent=True) or {}
+    if isinstance(payload, list):
+        # A bare list of restaurants is accepted as well
+        payload = {'restaurants': payload}
+    try:
+        entries = parse_batch(payload, BATCH_SCRAPERS)
+        workers = payload.get('workers', driver_pool.size)
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError("'workers' must be a positive integer")
+        # One browser per worker, more workers would only wait on the pool
+        workers = min(workers, driver_pool.size)
+        capture_mode = payload.get('capture', DOORDASH_CAPTURE_MODE)
+        if capture_mode not in DOORDASH_CAPTURE_MODES:
+            raise ValueError(f"'capture' must be one of {', '.join(DOORDASH_CAPTURE_MODES)}")
+        max_age, force_refresh = parse_cache_args(request.args)
+
+        job = job_manager.submit(
+            'batch', lambda job: run_batch(job, entries, workers, capture_mode, max_age, force_refresh),
+            {'restaurants': len(entries), 'workers': workers, 'capture': capture_mode})
+        return job_accepted(job)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+
+def cached_menu(platform, url, menu_id, max_age, force_refresh, report):
+    if force_refresh:
+        return None
+    cached = menu_cache.get(platform, url, max_age)
+    if cached:
+        report['status'] = 'cached'
+        return with_menu_id(cached, menu_id)
+    return None
+
+
+def batch_scrape_doordash(url, menu_id, capture_mode, max_age, force_refresh, report):
+    restaurant_data = cached_menu('doordash', url, menu_id, max_age, force_refresh, report)
+    if restaurant_data:
+        return restaurant_data
+    with driver_pool.driver() as driver:
+        restaurant_data = scrape_menu(url, menu_id, driver, capture_mode=capture_mode, report=report)
+    if restaurant_data:
+        save_menu('doordash', url, menu_id, restaurant_data)
+    return restaurant_data
+
+
+def batch_scrape_ubereats(url, menu_id, capture_mode, max_age, force_refresh, report):
+    restaurant_data = cached_menu('ubereats', url, menu_id, max_age, force_refresh, report)
+    if restaurant_data:
+        return restaurant_data
+    with driver_pool.driver() as driver:
+        spider = UberEatsSpider(driver)
+        try:
+            restaurant_data = spider.parse(url, menu_id)
+        finally:
+            spider.close()
+    if restaurant_data:
+        save_menu('ubereats', url, menu_id, restaurant_data)
+    return restaurant_data
+
+
+BATCH_SCRAPERS = {'doordash': batch_scrape_doordash, 'ubereats': batch_scrape_ubereats}
+
+
+class BatchAdapter:
+    """Stages of the batch pipeline shared by both platforms, see pipeline.BatchPipeline."""
+
+    platform = None
+
+    def __init__(self, capture_mode, max_age, force_refresh):
+        self.capture_mode = capture_mode
+        self.max_age = max_age
+        self.force_refresh = force_refresh
+
+    def cached(self, restaurant, state):
+        return cached_menu(self.platform, restaurant['url'], restaurant['menu_id'], self.max_age,
+                           self.force_refresh, {})
+
+    def finish(self, restaurant, state):
+        save_menu(self.platform, restaurant['url'], restaurant['menu_id'], state['menu'])
+
+
+class DoorDashBatchAdapter(BatchAdapter):
+    platform = 'doordash'
+
+    def load(self, restaurant, state):
+        driver = state['driver']
+        driver.set_window_size(1024, 1024)
+        with metrics.span('doordash', 'page_load'), measured_page_load(driver, 'doordash'):
+            driver.get(restaurant['url'])
+        state['session'] = ScrapeSession(driver, restaurant['menu_id'])
+        state['raw'] = read_store_script(driver)
+
+    def parse(self, restaurant, state):
+        restaurant_detail = decode_store_data(state.pop('raw'))
+        if restaurant_detail:
+            restaurant_detail['data']['menu_id'] = restaurant['menu_id']
+            # Item details are merged into the menu as each modal closes
+            state['session'].set_menu(restaurant_detail)
+            state['menu'] = restaurant_detail
+
+    def extract(self, restaurant, state):
+        session = state.pop('session')
+        work_list = enumerate_doordash_menu(session, state['driver'])
+        with metrics.span('doordash', 'modals'):
+            click_all_items(session, state['driver'], self.capture_mode, work_list=work_list)
+
+
+class UberEatsBatchAdapter(BatchAdapter):
+    platform = 'ubereats'
+
+    def load(self, restaurant, state):
+        spider = UberEatsSpider(state['driver'])
+        with metrics.span('ubereats', 'page_load'):
+            if not spider.load_store(restaurant['url']):
+                raise ValueError('Failed to load the store page')
+        state['spider'] = spider
+        state['raw'] = spider.read_store_json()
+
+    def parse(self, restaurant, state):
+        raw = state.pop('raw')
+        with metrics.span('ubereats', 'json_extract'):
+            data = json.loads(raw) if raw else {}
+        if data:
+            state['menu'] = state['spider'].build_restaurant(data, restaurant['menu_id'])
+
+    def extract(self, restaurant, state):
+        spider = state.pop('spider')
+        with metrics.span('ubereats', 'modals'):
+            spider.extract_menu_items(state['menu']['data']['categories'])
+
+
+BATCH_ADAPTERS = {'doordash': DoorDashBatchAdapter, 'ubereats': UberEatsBatchAdapter}
+
+
+def run_batch(job, entries, workers, capture_mode, max_age, force_refresh):
+    if BATCH_ENGINE == 'pipeline':
+        adapters = {platform: adapter(capture_mode, max_age, force_refresh)
+                    for platform, adapter in BATCH_ADAPTERS.items()}
+        # The pipeline's own browsers are only held up by restaurants further along it, which always
+        # release them, so a load waits for one however long the restaurant before it takes to parse
+        engine = BatchPipeline(entries, adapters, workers, lambda: driver_pool.checkout(timeout=None),
+                               driver_pool.release, progress=job.progress)
+        # Per-restaurant status is visible on /jobs/<job_id> while the batch runs
+        job.info['results'] = engine.restaurants
+        return engine.run()
+
+    scrapers = {
+        platform: lambda url, menu_id, report, scrape=scrape: scrape(url, menu_id, capture_mode, max_age,
+                                                                     force_refresh, report)
+        for platform, scrape in BATCH_SCRAPERS.items()
+    }
+    scheduler = BatchScheduler(entries, scrapers, workers, progress=job.progress)
+    # Per-restaurant status is visible on /jobs/<job_id> while the batch runs
+    job.info['results'] = scheduler.restaurants
+    return scheduler.run()
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route('/driver_pool', methods=['GET'])
+def driver_pool_stats():
+    return jsonify(driver_pool.stats()), 200
+
+
+@app.route('/page_loads', methods=['GET'])
+def page_load_stats_route():
+    return jsonify(page_load_stats.stats()), 200
+
+
+@app.route('/wait_timings', methods=['GET'])
+def wait_timing_stats():
+    return jsonify(wait_timings.stats()), 200
+
+
+@app.route('/menu_cache', methods=['GET'])
+def menu_cache_stats():
+    return jsonify({**menu_cache.stats(), 'writer': menu_writer.stats()}), 200
+
+
+@app.route('/webdriver_commands', methods=['GET'])
+def webdriver_command_stats():
+    return jsonify(command_stats.stats()), 200
 
-    except Exception as e:
-        logging.error(f"Error during scraping: {e}")
-        return jsonify({"error": str(e)}), 500
 
+# Compress menu payloads and answer conditional requests with 304
+for blueprint in (ubereats_bp, doorbash_bp, jobs_bp):
+    blueprint.after_request(finalize_response)
 
 # Register the Blueprint
 app.register_blueprint(ubereats_bp)
 app.register_blueprint(doorbash_bp)
+app.register_blueprint(jobs_bp)
 
 
 if __name__ == '__main__':
+    # Only pre-launch browsers in the serving process, not the reloader parent
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        browser_profiles.cleanup()
+        driver_pool.warm()
     app.run(debug=True)
\ No newline at end of file
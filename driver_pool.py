@@ -0,0 +1,230 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from seleniumbase import Driver
+from metrics import metrics
+from resource_blocking import BLOCK_RESOURCES, apply_resource_blocking
+from browser_profiles import BROWSER_PROFILES, PROFILE_DISK_CACHE_MB, browser_profiles
+
+# Number of browsers kept warm for the scraper blueprints
+DRIVER_POOL_SIZE = int(os.environ.get('DRIVER_POOL_SIZE', '2'))
+# Seconds a request waits for a free browser before giving up
+DRIVER_CHECKOUT_TIMEOUT = float(os.environ.get('DRIVER_CHECKOUT_TIMEOUT', '600'))
+
+
+def create_driver(log_cdp_events=False, block_resources=BLOCK_RESOURCES, profile=None):
+    """Launch a browser, on a persistent profile of that name when profile is given and profiles are enabled."""
+    # Initialize the driver with undetectable mode enabled
+    metrics.inc('driver_launches')
+    profile_dir = browser_profiles.acquire(profile) if profile and BROWSER_PROFILES else None
+    try:
+        if profile_dir:
+            driver = Driver(uc=True, undetectable=True, headless=True, log_cdp_events=log_cdp_events,
+                            user_data_dir=os.path.abspath(profile_dir),
+                            chromium_arg=f"--disk-cache-size={PROFILE_DISK_CACHE_MB * 1024 * 1024}")
+        else:
+            driver = Driver(uc=True, undetectable=True, headless=True, log_cdp_events=log_cdp_events)
+    except Exception:
+        if profile_dir:
+            browser_profiles.release(profile_dir)
+        raise
+    driver.profile_dir = profile_dir
+    if block_resources:
+        # Set once per browser, the blocked URLs outlive navigations and pool resets
+        apply_resource_blocking(driver)
+    return driver
+
+
+def quit_driver(driver, count_use=True):
+    """Quit a browser and hand its profile back.
+
+    A browser launched for one scrape counts that scrape on its profile here,
+    so it rotates like pooled ones; the pool counts each checkout on release
+    and passes count_use=False.
+    """
+    profile_dir = getattr(driver, 'profile_dir', None)
+    try:
+        driver.quit()
+    finally:
+        if profile_dir:
+            if count_use:
+                browser_profiles.use(profile_dir)
+            browser_profiles.release(profile_dir)
+
+
+def is_driver_healthy(driver):
+    try:
+        return driver.execute_script("return 1;") == 1
+    except Exception as e:
+        logging.warning(f"Driver health check failed: {e}")
+        return False
+
+
+def reset_driver(driver):
+    """Bring a used driver back to a blank state before the next checkout.
+
+    Browsers on a persistent profile keep their cookies and localStorage, so
+    bot checks and first-visit dialogs stay passed for the next scrape.
+    """
+    handles = driver.window_handles
+    # Close any extra tabs opened during the scrape
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+    if getattr(driver, 'profile_dir', None):
+        driver.execute_script("try { window.sessionStorage.clear(); } catch (e) {}")
+    else:
+        driver.execute_script(
+            "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}"
+        )
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+    driver.get('about:blank')
+    try:
+        # Drain the performance log so entries do not pile up between scrapes
+        driver.get_log('performance')
+    except Exception:
+        pass
+
+
+class DriverPool:
+    def __init__(self, size=DRIVER_POOL_SIZE, factory=create_driver):
+        self.size = size
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._launched = 0
+        # Checkout wait metrics
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=1000)
+
+    def _launch(self):
+        logging.info("Launching a new pooled browser")
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._launched -= 1
+            raise
+
+    def _reserve_launch(self):
+        with self._lock:
+            if self._launched < self.size:
+                self._launched += 1
+                return True
+            return False
+
+    def _discard(self, driver):
+        with self._lock:
+            self._launched -= 1
+        try:
+            quit_driver(driver, count_use=False)
+        except Exception as e:
+            logging.warning(f"Error quitting pooled browser: {e}")
+
+    def warm(self):
+        """Launch browsers in the background until the pool is full."""
+        def fill():
+            while self._reserve_launch():
+                try:
+                    self._idle.put(self._launch())
+                except Exception as e:
+                    logging.error(f"Error pre-launching browser: {e}")
+                    return
+
+        threading.Thread(target=fill, name='driver-pool-warm', daemon=True).start()
+
+    def checkout(self, timeout=DRIVER_CHECKOUT_TIMEOUT):
+        """Return a healthy browser, waiting up to timeout seconds for one (None to wait until one is free)."""
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                if self._reserve_launch():
+                    driver = self._launch()
+                elif deadline is None:
+                    driver = self._idle.get()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a browser from the pool")
+                    try:
+                        driver = self._idle.get(timeout=remaining)
+                    except queue.Empty:
+                        raise TimeoutError("Timed out waiting for a browser from the pool")
+
+            if is_driver_healthy(driver):
+                break
+            self._discard(driver)
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._recent_waits.append(waited)
+        logging.info(f"Browser checked out after waiting {waited:.3f}s")
+        return driver
+
+    def checkout_available(self, count):
+        """Check out up to count more browsers without waiting for busy ones."""
+        drivers = []
+        for _ in range(count):
+            try:
+                drivers.append(self.checkout(timeout=0))
+            except TimeoutError:
+                break
+        return drivers
+
+    def release(self, driver):
+        profile_dir = getattr(driver, 'profile_dir', None)
+        if profile_dir and browser_profiles.use(profile_dir):
+            # The profile is due for rotation, the next launch starts a fresh one
+            self._discard(driver)
+            return
+        try:
+            reset_driver(driver)
+        except Exception as e:
+            logging.warning(f"Could not reset pooled browser, discarding it: {e}")
+            self._discard(driver)
+            return
+        self._idle.put(driver)
+
+    @contextmanager
+    def driver(self, timeout=DRIVER_CHECKOUT_TIMEOUT):
+        driver = self.checkout(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            return {
+                'size': self.size,
+                'launched': self._launched,
+                'idle': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'checkout_wait_total': self._wait_total,
+                'checkout_wait_max': self._wait_max,
+                'checkout_wait_avg': self._wait_total / self._checkouts if self._checkouts else 0.0,
+                'checkout_wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+                'profiles': browser_profiles.stats(),
+            }
+
+    def close(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(driver)
@@ -0,0 +1,174 @@
+import re
+
+# Hash of everything a parsed DoorDash option group is built from: its rendered text
+# (name, selection limits, option names and prices) and whether options are steppers
+DOORDASH_GROUP_FINGERPRINT_JS = """
+const groupFingerprint = group => {
+    const key = (group.querySelector('div.sc-724a33a-8') ? 'stepper|' : 'choice|') + (group.innerText || '');
+    let h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+    for (let i = 0; i < key.length; i++) {
+        const code = key.charCodeAt(i);
+        h1 = Math.imul(h1 ^ code, 2654435761);
+        h2 = Math.imul(h2 ^ code, 1597334677);
+    }
+    h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+    h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+    return (h2 >>> 0).toString(16).padStart(8, '0') + (h1 >>> 0).toString(16).padStart(8, '0') + ':' + key.length;
+};
+"""
+
+# Fingerprints of the option groups of the open modal, in document order
+DOORDASH_GROUP_FINGERPRINTS_JS = DOORDASH_GROUP_FINGERPRINT_JS + """
+return Array.from(document.querySelectorAll('div[role="group"]')).map(groupFingerprint);
+"""
+
+# Serializes the open DoorDash ItemModal in one call, using the same selectors as the DOM walk.
+# Groups whose fingerprint is in arguments[0] are returned as the fingerprint only.
+DOORDASH_ITEM_MODAL_JS = DOORDASH_GROUP_FINGERPRINT_JS + """
+const known = new Set(arguments[0] || []);
+const text = el => (el ? el.innerText || el.textContent || '' : '').trim();
+const title = document.evaluate('//h2[@class="Text-sc-1nm69d8-0 dtvoNG"]/span', document, null,
+                                XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (!title) { return null; }
+const groups = [];
+for (const group of document.querySelectorAll('div[role="group"]')) {
+    const fingerprint = groupFingerprint(group);
+    if (known.has(fingerprint)) {
+        groups.push({fingerprint: fingerprint});
+        continue;
+    }
+    const selectSpans = group.querySelectorAll('span.Text-sc-1nm69d8-0.gFJzBa');
+    let optionElements = group.querySelectorAll('div.sc-724a33a-8');
+    if (!optionElements.length) { optionElements = group.querySelectorAll('label'); }
+    const options = [];
+    for (const option of optionElements) {
+        const stepper = (option.getAttribute('class') || '').includes('sc-724a33a-8');
+        const name = option.querySelector(stepper ? 'span.Text-sc-1nm69d8-0.ZNLaC' : 'span.Text-sc-1nm69d8-0');
+        const prices = Array.from(option.querySelectorAll('span.Text-sc-1nm69d8-0.dCneXH'))
+            .map(text).filter(price => price.includes('+'));
+        options.push({name: text(name), price: prices.length ? prices[0] : null, stepper: stepper});
+    }
+    groups.push({
+        fingerprint: fingerprint,
+        name: text(group.querySelector('h3.Text-sc-1nm69d8-0.hBnZXN')),
+        selectText: selectSpans.length > 1 ? text(selectSpans[1]) : '',
+        options: options
+    });
+}
+return {itemName: text(title), groups: groups};
+"""
+
+
+def parse_select_value(select_text):
+    select_value = re.sub(r'[^0-9]', '', select_text or '')
+    return int(select_value) if select_value else 0
+
+
+def parse_option_price(price_text):
+    if not price_text:
+        return 0
+    # Remove unwanted characters and any additional text
+    raw_price = price_text.replace('US', '').replace('+', '').replace('$', '').strip()
+    try:
+        return float(raw_price)
+    except ValueError:
+        return 0
+
+
+def doordash_snapshot_to_details(snapshot, group_cache=None):
+    """Turn a DOORDASH_ITEM_MODAL_JS result into the item_details structure.
+
+    Groups sent as a fingerprint only are taken from group_cache, new ones are
+    added to it. Returns None if a fingerprint is missing from the cache.
+    """
+    details = []
+    for group in snapshot.get('groups', []):
+        if 'name' not in group:
+            cached = group_cache.get(group['fingerprint']) if group_cache is not None else None
+            if cached is None:
+                return None
+            details.append(cached)
+            continue
+        options = []
+        for option in group.get('options', []):
+            cleaned_price = parse_option_price(option.get('price'))
+            options.append({
+                'name': option.get('name', ''),
+                'possibleToAdd': 999999 if option.get('stepper') else 1,
+                'price': cleaned_price * 2,
+                'leftHalfPrice': cleaned_price,
+                'rightHalfPrice': cleaned_price,
+                'ingredientsGroup': []
+            })
+
+        group_details = {
+            'type': "general",
+            'name': group.get('name', ''),
+            'requiresSelectionMin': 0,
+            'requiresSelectionMax': parse_select_value(group.get('selectText')),
+            'ingredients': options
+        }
+        if group_cache is not None:
+            group_details = group_cache.put(group.get('fingerprint'), group_details)
+        details.append(group_details)
+
+    return {
+        'item_name': snapshot.get('itemName', ''),
+        'item_details': details
+    }
+
+
+# Serializes the open UberEats customization dialog in one call, pick-many groups first then pick-one
+UBEREATS_DIALOG_JS = """
+const text = el => (el ? el.innerText || el.textContent || '' : '').trim();
+const dialog = document.querySelector('div[role="dialog"][aria-label="dialog"]');
+if (!dialog) { return null; }
+const image = dialog.querySelector('img[role="presentation"]');
+const groups = [];
+for (const kind of ['customization-pick-many', 'customization-pick-one']) {
+    const groupSelector = 'div[data-testid="' + kind + '"]';
+    for (const group of dialog.querySelectorAll(groupSelector)) {
+        const header = group.querySelector(groupSelector + ' > div > div > div');
+        if (!header) { continue; }
+        const options = [];
+        for (const label of group.querySelectorAll('label')) {
+            const parts = label.querySelectorAll('label > div > div > div > div > div');
+            options.push({name: text(parts[0]), price: text(parts[2])});
+        }
+        groups.push({name: text(header.querySelector('div')), limitText: text(header), options: options});
+    }
+}
+return {itemName: text(dialog.querySelector('h1')), imageUrl: image ? image.src : '', groups: groups};
+"""
+
+
+def parse_ubereats_price(price_text):
+    price_cleaned = re.sub(r'[^\d.]+', '', price_text or '').strip()
+    try:
+        return float(price_cleaned) if price_cleaned else 0.0
+    except ValueError:
+        return 0.0
+
+
+def ubereats_snapshot_to_details(snapshot):
+    """Turn a UBEREATS_DIALOG_JS result into the item details used by UberEatsSpider."""
+    details = []
+    for group in snapshot.get('groups', []):
+        option_details = []
+        for option in group.get('options', []):
+            price = parse_ubereats_price(option.get('price'))
+            option_details.append(
+                {'name': option.get('name', ''), 'possibleToAdd': 1, 'price': price * 2,
+                 'leftHalfPrice': price, 'rightHalfPrice': price})
+
+        match = re.search(r'(\d+)', group.get('limitText', ''))
+        details.append({
+            'type': "general",
+            'name': group.get('name', ''),
+            'requiresSelectionMin': 0,
+            'requiresSelectionMax': int(match.group(1)) if match else 0,
+            'ingredients': option_details
+        })
+
+    return {'item_name': snapshot.get('itemName', ''), 'image_url': snapshot.get('imageUrl', ''),
+            'item_details': details}
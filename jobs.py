@@ -0,0 +1,135 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, jsonify
+from menu_format import parse_format, format_result
+
+# Number of scrapes running at once, keep in line with DRIVER_POOL_SIZE
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+# Jobs waiting for a worker before new submissions are refused
+JOB_MAX_QUEUED = int(os.environ.get('JOB_MAX_QUEUED', '100'))
+# Seconds a finished job (and its result) is kept for polling
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', '3600'))
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.info = {}  # Extra counts reported by the scrape, e.g. modals skipped
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def progress(self, done, total=None):
+        # Called by the scrape function as items are extracted
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def to_dict(self):
+        job = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'progress': {'done': self.done, 'total': self.total},
+            'info': self.info,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.status == 'finished':
+            job['result'] = self.result
+        if self.error:
+            job['error'] = self.error
+        return job
+
+
+class JobManager:
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED, result_ttl=JOB_RESULT_TTL):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scrape-job')
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def submit(self, kind, func, params):
+        """Queue func(job) on the worker pool and return the Job right away."""
+        job = Job(kind, params)
+        with self.lock:
+            self._purge_expired()
+            queued = sum(1 for existing in self.jobs.values() if existing.status == 'queued')
+            if queued >= self.max_queued:
+                raise JobQueueFull("Too many scrape jobs queued, try again later")
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, func)
+        logging.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def _run(self, job, func):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            result = func(job)
+            if result:
+                job.result = result
+                job.status = 'finished'
+            else:
+                job.error = 'Failed to scrape the menu data'
+                job.status = 'failed'
+        except Exception as e:
+            logging.error(f"Error running job {job.id}: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            logging.info(f"Job {job.id} {job.status} in {job.finished_at - job.started_at:.1f}s")
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+
+job_manager = JobManager()
+
+
+def job_accepted(job):
+    return jsonify({'job_id': job.id, 'status': job.status, 'status_url': f"/jobs/{job.id}"}), 202
+
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        menu_format = parse_format(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    job_dict = job.to_dict()
+    if 'result' in job_dict:
+        job_dict['result'] = format_result(job_dict['result'], menu_format)
+    return jsonify(job_dict), 200
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from persistence import read_menu
+from menu_model import compact_menu, menu_dict
+
+# Menus kept in memory
+MENU_CACHE_SIZE = int(os.environ.get('MENU_CACHE_SIZE', '64'))
+# Seconds a scraped menu is served before it is scraped again
+MENU_CACHE_TTL = float(os.environ.get('MENU_CACHE_TTL', '21600'))
+# Most recently served menus kept as their served dict, so repeated hits return the same dict (and its
+# normalized form, see menu_format.normalize_categories) instead of rebuilding it from the model every time
+MENU_CACHE_SERVED = int(os.environ.get('MENU_CACHE_SERVED', '16'))
+# Index of menu files already written to disk, empty to keep the cache in memory only
+MENU_CACHE_INDEX = os.environ.get('MENU_CACHE_INDEX', 'menu_cache_index.json')
+
+
+class MenuCache:
+    """LRU cache of scraped menus keyed by platform and store URL.
+
+    The last served_entries menus served are held as the dict they were
+    served as and served again as they are, menus are not modified once
+    served. Older entries are compacted into menu_model.Restaurant objects,
+    which intern repeated option groups, and turned back into a dict when
+    next served; an entry holds one form or the other, never both. The
+    disk tier does not copy menus,
+    it indexes the menu JSON files the scrapers already write so entries
+    survive a restart.
+    """
+
+    def __init__(self, max_entries=MENU_CACHE_SIZE, ttl=MENU_CACHE_TTL, index_path=MENU_CACHE_INDEX,
+                 served_entries=MENU_CACHE_SERVED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.index_path = index_path
+        self.served_entries = served_entries
+        # key -> (stored_at, served dict or Restaurant)
+        self._entries = OrderedDict()
+        # Keys whose entries hold their served dict, least recently served first
+        self._served = OrderedDict()
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def key(platform, url):
+        return f"{platform}:{url}"
+
+    def _load_index(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path) as infile:
+                return json.load(infile)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable menu cache index: {e}")
+            return {}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w') as outfile:
+            json.dump(self._index, outfile)
+        os.replace(tmp_path, self.index_path)
+
+    def _load_from_disk(self, key):
+        entry = self._index.get(key)
+        if not entry:
+            return None
+        try:
+            # The file is shared with later scrapes, only trust it if it was not rewritten since
+            if os.path.getmtime(entry['path']) != entry['mtime']:
+                return None
+            return entry['stored_at'], read_menu(entry['path'])
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not read cached menu for {key}: {e}")
+            return None
+
+    def _serve(self, key, stored_at, menu):
+        served = menu_dict(menu)
+        if key not in self._entries:
+            # Evicted right away, the cache holds no menus
+            return served
+        self._entries[key] = (stored_at, served)
+        self._served[key] = None
+        self._served.move_to_end(key)
+        while len(self._served) > self.served_entries:
+            # The dict is replaced by its model, callers still holding it keep their copy
+            demoted, _ = self._served.popitem(last=False)
+            demoted_at, demoted_menu = self._entries[demoted]
+            self._entries[demoted] = (demoted_at, compact_menu(demoted_menu))
+        return served
+
+    def _insert(self, key, stored_at, menu):
+        self._entries[key] = (stored_at, menu)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._served.pop(evicted, None)
+            self.evictions += 1
+
+    def get(self, platform, url, max_age=None):
+        """Return the cached menu if it is younger than max_age (default: the TTL)."""
+        key = self.key(platform, url)
+        limit = self.ttl if max_age is None else max_age
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            from_disk = False
+            if entry is None and self.index_path:
+                entry = self._load_from_disk(key)
+                from_disk = entry is not None
+            if entry is not None:
+                stored_at, menu = entry
+                if now - stored_at <= limit:
+                    self.hits += 1
+                    if from_disk:
+                        self.disk_hits += 1
+                    self._insert(key, stored_at, menu)
+                    return self._serve(key, stored_at, menu)
+                if now - stored_at > self.ttl and key in self._entries:
+                    del self._entries[key]
+                    self._served.pop(key, None)
+                    self.expirations += 1
+            self.misses += 1
+            return None
+
+    def _record_file(self, key, path, stored_at):
+        if not self.index_path:
+            return
+        try:
+            self._index[key] = {'path': path, 'mtime': os.path.getmtime(path), 'stored_at': stored_at}
+            self._save_index()
+        except OSError as e:
+            logging.warning(f"Could not write menu cache index: {e}")
+
+    def put(self, platform, url, menu, path=None):
+        """Cache a freshly scraped menu, path is the file it was already saved to."""
+        key = self.key(platform, url)
+        stored_at = time.time()
+        with self._lock:
+            self._insert(key, stored_at, menu)
+            # The scraped dict is what the scrape's job already served
+            self._serve(key, stored_at, menu)
+            if path:
+                self._record_file(key, path, stored_at)
+
+    def record_file(self, platform, url, path):
+        """Index the file a cached menu was written to once the writer has finished, so it survives a restart."""
+        key = self.key(platform, url)
+        with self._lock:
+            entry = self._entries.get(key)
+            self._record_file(key, path, entry[0] if entry else time.time())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'served_entries': len(self._served),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+menu_cache = MenuCache()
+
+
+def parse_cache_args(args):
+    """Read max_age and force_refresh from the request arguments."""
+    max_age = args.get('max_age')
+    if max_age is not None:
+        try:
+            max_age = float(max_age)
+        except ValueError:
+            raise ValueError("'max_age' must be a number of seconds")
+    force_refresh = args.get('force_refresh', '').lower() in ('1', 'true', 'yes')
+    return max_age, force_refresh
+
+
+def with_menu_id(menu, menu_id):
+    # The same store can be requested under another menu_id, copy only the top level
+    return {**menu, 'data': {**menu.get('data', {}), 'menu_id': menu_id}}
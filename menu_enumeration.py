@@ -0,0 +1,98 @@
+import os
+import logging
+
+# Upper bound in seconds of the in-page enumeration of a whole menu
+ENUMERATION_TIMEOUT = float(os.environ.get('ENUMERATION_TIMEOUT', '60'))
+# Milliseconds the page gets to render lazy sections after each viewport-sized scroll
+ENUMERATION_STEP_MS = int(os.environ.get('ENUMERATION_STEP_MS', '250'))
+# The script calls back with the cards found so far this long before the driver's script timeout
+ENUMERATION_DEADLINE_MARGIN = 5
+
+# Scrolls the page a viewport at a time in the browser, collecting every card as its
+# section renders, and calls back with the cards ordered by their position on the page.
+# Cards are keyed by name, an item listed in several sections is visited once.
+ENUMERATE_MENU_ITEMS_JS = """
+const [selector, stepMs, deadlineMs] = arguments;
+const done = arguments[arguments.length - 1];
+const started = performance.now();
+const cards = new Map();
+const cardId = card => {
+    const link = card.querySelector('a[href*="item"]');
+    const match = link && link.getAttribute('href').match(/item(?:_id=|\\/)(\\d+)/);
+    return card.getAttribute('data-item-id') || (match ? match[1] : null);
+};
+const collect = () => {
+    for (const card of document.querySelectorAll(selector)) {
+        const name = (card.innerText || '').split('\\n')[0].trim();
+        if (!name || cards.has(name)) { continue; }
+        cards.set(name, {name: name, id: cardId(card),
+                         y: Math.round(card.getBoundingClientRect().top + window.scrollY)});
+    }
+};
+let previous = -1;
+const step = () => {
+    collect();
+    const atBottom = window.scrollY + window.innerHeight >= document.documentElement.scrollHeight - 2;
+    // At the bottom and nothing more rendered during the last wait, or out of time: return what was found
+    if ((atBottom && window.scrollY === previous) || performance.now() - started > deadlineMs) {
+        window.scrollTo(0, 0);
+        done(Array.from(cards.values()).sort((a, b) => a.y - b.y));
+        return;
+    }
+    previous = window.scrollY;
+    window.scrollBy(0, Math.max(200, Math.floor(window.innerHeight * 0.9)));
+    setTimeout(step, stepMs);
+};
+window.scrollTo(0, 0);
+setTimeout(step, stepMs);
+"""
+
+# Brings the card of one work item into view and returns it, or null while its section is not rendered
+LOCATE_MENU_ITEM_JS = """
+const [selector, name, y] = arguments;
+const find = () => Array.from(document.querySelectorAll(selector))
+    .find(card => (card.innerText || '').split('\\n')[0].trim() === name);
+let card = find();
+if (!card) {
+    window.scrollTo(0, Math.max(0, y - window.innerHeight / 2));
+    card = find();
+}
+if (card) { card.scrollIntoView({block: 'center'}); }
+return card || null;
+"""
+
+
+def enumerate_menu_items(driver, selector, index=None):
+    """Return the ordered work list of the menu cards on the page, one entry per item.
+
+    Each entry holds the card name, its vertical position and the platform
+    item id, read from the card or looked up by name in the MenuIndex.
+    """
+    # Pooled drivers keep their script timeout for later scrapes, so it is put back afterwards
+    previous_timeout = driver.timeouts.script
+    deadline = max(ENUMERATION_TIMEOUT - ENUMERATION_DEADLINE_MARGIN, ENUMERATION_TIMEOUT / 2)
+    driver.set_script_timeout(ENUMERATION_TIMEOUT)
+    try:
+        cards = driver.execute_async_script(ENUMERATE_MENU_ITEMS_JS, selector, ENUMERATION_STEP_MS,
+                                            int(deadline * 1000))
+    except Exception as e:
+        logging.warning(f"Menu enumeration failed: {e}")
+        return []
+    finally:
+        driver.set_script_timeout(previous_timeout)
+    work_list = []
+    for card in cards or []:
+        item_id = card.get('id')
+        if not item_id and index is not None:
+            listings = index.lookup(card['name'])
+            item_id = listings[0].get('id') if listings else None
+        work_list.append({'name': card['name'], 'item_id': item_id, 'y': card['y']})
+    logging.info(f"Enumerated {len(work_list)} menu items")
+    return work_list
+
+
+def menu_item_locator(selector, work_item):
+    """Wait condition returning the card of work_item once it is rendered."""
+    def locate(driver):
+        return driver.execute_script(LOCATE_MENU_ITEM_JS, selector, work_item['name'], work_item['y'])
+    return locate
@@ -0,0 +1,184 @@
+import json
+import threading
+from collections import OrderedDict
+
+MENU_FORMATS = ('full', 'normalized')
+
+NORMALIZED_VERSION = 1
+# Normalized forms kept for menus served repeatedly, e.g. from the menu cache or a polled job
+NORMALIZED_MEMO_SIZE = 16
+
+_normalized_memo = OrderedDict()
+_normalized_memo_lock = threading.Lock()
+
+
+def parse_format(args):
+    """Read the ?format= response format, 'full' (the default) or 'normalized'."""
+    menu_format = args.get('format', 'full')
+    if menu_format not in MENU_FORMATS:
+        raise ValueError(f"'format' must be one of {', '.join(MENU_FORMATS)}")
+    return menu_format
+
+
+def is_menu(restaurant):
+    return (isinstance(restaurant, dict) and isinstance(restaurant.get('data'), dict)
+            and isinstance(restaurant['data'].get('categories'), list))
+
+
+class _Tables:
+    """Shared group and option tables, each distinct value stored once."""
+
+    def __init__(self):
+        self.groups = []
+        self.options = []
+        self._group_ids = {}
+        self._option_ids = {}
+        # Groups reused by reference (see ModifierGroupCache) are only encoded once
+        self._seen = {}
+
+    @staticmethod
+    def _key(value):
+        # The type keeps 2 and 2.0 (or 1 and True) apart, which compare equal in a tuple
+        try:
+            key = tuple((name, type(field), tuple(field) if isinstance(field, list) else field)
+                        for name, field in sorted(value.items()))
+            hash(key)
+            return key
+        except TypeError:
+            return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+    @classmethod
+    def _add(cls, table, ids, value):
+        key = cls._key(value)
+        ref = ids.get(key)
+        if ref is None:
+            ref = ids[key] = len(table)
+            table.append(value)
+        return ref
+
+    def option_ref(self, option):
+        seen = self._seen.get(id(option))
+        if seen is not None and seen[0] is option:
+            return seen[1]
+        normalized = option
+        if isinstance(option.get('ingredientsGroup'), list):
+            normalized = {key: self.group_refs(value) if key == 'ingredientsGroup' else value
+                          for key, value in option.items()}
+        ref = self._add(self.options, self._option_ids, normalized)
+        self._seen[id(option)] = (option, ref)
+        return ref
+
+    def group_ref(self, group):
+        seen = self._seen.get(id(group))
+        if seen is not None and seen[0] is group:
+            return seen[1]
+        normalized = {key: [self.option_ref(option) for option in value] if key == 'ingredients' else value
+                      for key, value in group.items()}
+        ref = self._add(self.groups, self._group_ids, normalized)
+        self._seen[id(group)] = (group, ref)
+        return ref
+
+    def group_refs(self, groups):
+        return [self.group_ref(group) for group in groups]
+
+
+def normalize_categories(categories):
+    """Return the categories with group references and the group and option tables."""
+    # Menus are not modified once served, so the same categories list normalizes the same way
+    with _normalized_memo_lock:
+        memo = _normalized_memo.get(id(categories))
+        if memo is not None and memo[0] is categories:
+            _normalized_memo.move_to_end(id(categories))
+            return memo[1]
+
+    tables = _Tables()
+    normalized_categories = []
+    for category in categories:
+        menu = []
+        for menu_item in category['menu']:
+            if isinstance(menu_item.get('ingredientsGroups'), list):
+                menu_item = {key: tables.group_refs(value) if key == 'ingredientsGroups' else value
+                             for key, value in menu_item.items()}
+            menu.append(menu_item)
+        normalized_categories.append({key: menu if key == 'menu' else value for key, value in category.items()})
+    normalized = (normalized_categories, tables.groups, tables.options)
+
+    with _normalized_memo_lock:
+        _normalized_memo[id(categories)] = (categories, normalized)
+        while len(_normalized_memo) > NORMALIZED_MEMO_SIZE:
+            _normalized_memo.popitem(last=False)
+    return normalized
+
+
+def normalize_menu(restaurant):
+    """Return restaurant with every option group and option stored once in top-level tables.
+
+    Items keep their keys; ingredientsGroups (and the ingredientsGroup of
+    options) hold indexes into the ingredientsGroups table, and a group's
+    ingredients hold indexes into the ingredients table. expand_menu()
+    restores the full shape.
+    """
+    data = restaurant['data']
+    categories, groups, options = normalize_categories(data['categories'])
+    return {
+        **{key: value for key, value in restaurant.items() if key != 'data'},
+        'format': 'normalized',
+        'version': NORMALIZED_VERSION,
+        'data': {key: categories if key == 'categories' else value for key, value in data.items()},
+        'ingredientsGroups': groups,
+        'ingredients': options,
+    }
+
+
+def expand_menu(normalized):
+    """Rebuild the full menu shape from normalize_menu() output."""
+    if normalized.get('format') != 'normalized':
+        return normalized
+    group_table = normalized['ingredientsGroups']
+    option_table = normalized['ingredients']
+    groups = [None] * len(group_table)
+    options = [None] * len(option_table)
+
+    def option(ref):
+        if options[ref] is None:
+            value = option_table[ref]
+            if isinstance(value.get('ingredientsGroup'), list):
+                value = {key: [group(child) for child in child_refs] if key == 'ingredientsGroup' else child_refs
+                         for key, child_refs in value.items()}
+            options[ref] = value
+        return options[ref]
+
+    def group(ref):
+        if groups[ref] is None:
+            groups[ref] = {key: [option(child) for child in value] if key == 'ingredients' else value
+                           for key, value in group_table[ref].items()}
+        return groups[ref]
+
+    data = normalized['data']
+    categories = []
+    for category in data['categories']:
+        menu = []
+        for menu_item in category['menu']:
+            if isinstance(menu_item.get('ingredientsGroups'), list):
+                menu_item = {key: [group(ref) for ref in value] if key == 'ingredientsGroups' else value
+                             for key, value in menu_item.items()}
+            menu.append(menu_item)
+        categories.append({key: menu if key == 'menu' else value for key, value in category.items()})
+    restaurant = {key: value for key, value in normalized.items()
+                  if key not in ('format', 'version', 'data', 'ingredientsGroups', 'ingredients')}
+    restaurant['data'] = {key: categories if key == 'categories' else value for key, value in data.items()}
+    return restaurant
+
+
+def format_menu(restaurant, menu_format):
+    """Apply the requested response format to a menu, other values are returned as they are."""
+    if menu_format == 'normalized' and is_menu(restaurant):
+        return normalize_menu(restaurant)
+    return restaurant
+
+
+def format_result(result, menu_format):
+    # UberEats responses wrap the menu in restaurant_data
+    if isinstance(result, dict) and 'restaurant_data' in result:
+        return {**result, 'restaurant_data': format_menu(result['restaurant_data'], menu_format)}
+    return format_menu(result, menu_format)
@@ -0,0 +1,36 @@
+class MenuIndex:
+    """Index of the items in a menu's categories by name and platform item id.
+
+    An item listed in several categories (for example Most Ordered and its own
+    section) maps to every listing, so one merge updates all of them.
+    """
+
+    def __init__(self, categories):
+        self.categories = categories
+        self.by_name = {}
+        self.by_id = {}
+        for category in categories:
+            for menu_item in category['menu']:
+                self.add(menu_item)
+
+    def add(self, menu_item):
+        self.by_name.setdefault((menu_item.get('name') or '').strip(), []).append(menu_item)
+        item_id = menu_item.get('id')
+        if item_id:
+            self.by_id.setdefault(str(item_id), []).append(menu_item)
+
+    def lookup(self, name=None, item_id=None):
+        """Return every listing of the item, matching on the item id first."""
+        if item_id and str(item_id) in self.by_id:
+            return self.by_id[str(item_id)]
+        return self.by_name.get((name or '').strip(), [])
+
+    def item_count(self):
+        return len(self.by_name)
+
+
+def index_for(categories, index=None):
+    # Reuse index while it still covers these categories, otherwise build a new one
+    if index is not None and index.categories is categories:
+        return index
+    return MenuIndex(categories)
@@ -0,0 +1,241 @@
+import json
+from dataclasses import dataclass
+
+
+class _Missing:
+    """Marks a key the menu dict did not have, so to_dict() leaves it out again."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+def _split(value, fields):
+    # Known keys become fields, anything else is kept in extra so no key is lost
+    known = {name: value.get(name, MISSING) for name in fields}
+    extra = {name: field for name, field in value.items() if name not in known}
+    return known, extra or None
+
+
+def _put(result, name, value):
+    if value is not MISSING:
+        result[name] = value
+
+
+def _field_key(value):
+    # The type keeps 2 and 2.0 (or 1 and True) apart, which compare equal
+    if isinstance(value, (list, dict)):
+        return (type(value), json.dumps(value, sort_keys=True))
+    return (type(value), value)
+
+
+@dataclass(slots=True, frozen=True)
+class Option:
+    name: object = MISSING
+    possibleToAdd: object = MISSING
+    price: object = MISSING
+    leftHalfPrice: object = MISSING
+    rightHalfPrice: object = MISSING
+    # Nested option groups, DoorDash only
+    ingredientsGroup: object = MISSING
+    extra: object = None
+
+    FIELDS = ('name', 'possibleToAdd', 'price', 'leftHalfPrice', 'rightHalfPrice')
+
+    @classmethod
+    def from_dict(cls, value, interned):
+        known, extra = _split(value, cls.FIELDS + ('ingredientsGroup',))
+        groups = known['ingredientsGroup']
+        if isinstance(groups, list):
+            groups = known['ingredientsGroup'] = tuple(OptionGroup.from_dict(group, interned) for group in groups)
+        # Nested groups are interned already, their identity stands for their content
+        key = ('option', tuple(_field_key(known[name]) for name in cls.FIELDS),
+               tuple(map(id, groups)) if isinstance(groups, tuple) else _field_key(groups),
+               _field_key(extra) if extra else None)
+        option = interned.get(key)
+        if option is None:
+            option = interned[key] = cls(**known, extra=extra)
+        return option
+
+    def to_dict(self, memo):
+        result = memo.get(id(self))
+        if result is not None:
+            return result
+        result = {}
+        _put(result, 'name', self.name)
+        _put(result, 'possibleToAdd', self.possibleToAdd)
+        _put(result, 'price', self.price)
+        _put(result, 'leftHalfPrice', self.leftHalfPrice)
+        _put(result, 'rightHalfPrice', self.rightHalfPrice)
+        if isinstance(self.ingredientsGroup, tuple):
+            result['ingredientsGroup'] = [group.to_dict(memo) for group in self.ingredientsGroup]
+        else:
+            _put(result, 'ingredientsGroup', self.ingredientsGroup)
+        if self.extra:
+            result.update(self.extra)
+        memo[id(self)] = result
+        return result
+
+
+@dataclass(slots=True, frozen=True)
+class OptionGroup:
+    type: object = MISSING
+    name: object = MISSING
+    requiresSelectionMin: object = MISSING
+    requiresSelectionMax: object = MISSING
+    ingredients: tuple = ()
+    extra: object = None
+
+    FIELDS = ('type', 'name', 'requiresSelectionMin', 'requiresSelectionMax')
+
+    @classmethod
+    def from_dict(cls, value, interned):
+        known, extra = _split(value, cls.FIELDS + ('ingredients',))
+        options = known.pop('ingredients')
+        if isinstance(options, list):
+            options = tuple(Option.from_dict(option, interned) for option in options)
+        key = ('group', tuple(_field_key(known[name]) for name in cls.FIELDS),
+               tuple(map(id, options)) if isinstance(options, tuple) else _field_key(options),
+               _field_key(extra) if extra else None)
+        group = interned.get(key)
+        if group is None:
+            group = interned[key] = cls(**known, ingredients=options, extra=extra)
+        return group
+
+    def to_dict(self, memo):
+        result = memo.get(id(self))
+        if result is not None:
+            return result
+        result = {}
+        _put(result, 'type', self.type)
+        _put(result, 'name', self.name)
+        _put(result, 'requiresSelectionMin', self.requiresSelectionMin)
+        _put(result, 'requiresSelectionMax', self.requiresSelectionMax)
+        if isinstance(self.ingredients, tuple):
+            result['ingredients'] = [option.to_dict(memo) for option in self.ingredients]
+        else:
+            _put(result, 'ingredients', self.ingredients)
+        if self.extra:
+            result.update(self.extra)
+        memo[id(self)] = result
+        return result
+
+
+@dataclass(slots=True)
+class MenuItem:
+    id: object = MISSING
+    type: object = MISSING
+    name: object = MISSING
+    description: object = MISSING
+    imageUrl: object = MISSING
+    image_url: object = MISSING
+    price: object = MISSING
+    ingredientsGroups: object = MISSING
+    extra: object = None
+
+    FIELDS = ('id', 'type', 'name', 'description', 'imageUrl', 'image_url', 'price', 'ingredientsGroups')
+
+    @classmethod
+    def from_dict(cls, value, interned):
+        known, extra = _split(value, cls.FIELDS)
+        if isinstance(known['ingredientsGroups'], list):
+            known['ingredientsGroups'] = [OptionGroup.from_dict(group, interned)
+                                          for group in known['ingredientsGroups']]
+        return cls(**known, extra=extra)
+
+    def to_dict(self, memo):
+        result = {}
+        _put(result, 'id', self.id)
+        _put(result, 'type', self.type)
+        _put(result, 'name', self.name)
+        _put(result, 'description', self.description)
+        _put(result, 'imageUrl', self.imageUrl)
+        _put(result, 'image_url', self.image_url)
+        _put(result, 'price', self.price)
+        if isinstance(self.ingredientsGroups, list):
+            result['ingredientsGroups'] = [group.to_dict(memo) for group in self.ingredientsGroups]
+        else:
+            _put(result, 'ingredientsGroups', self.ingredientsGroups)
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+
+@dataclass(slots=True)
+class Category:
+    title: object = MISSING
+    menu: list = None
+    extra: object = None
+
+    @classmethod
+    def from_dict(cls, value, interned):
+        known, extra = _split(value, ('title', 'menu'))
+        return cls(title=known['title'], menu=[MenuItem.from_dict(menu_item, interned) for menu_item in value['menu']],
+                   extra=extra)
+
+    def to_dict(self, memo):
+        result = {}
+        _put(result, 'title', self.title)
+        result['menu'] = [menu_item.to_dict(memo) for menu_item in self.menu]
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+
+@dataclass(slots=True)
+class Restaurant:
+    """A scraped menu of either platform, in the shape compile_restaurant_data and UberEatsSpider build.
+
+    The store fields differ per platform and exist once per menu, they stay
+    a dict in store. Identical option groups and options are interned, every
+    item offering them refers to the same object.
+
+    This is the storage form of the menus MenuCache has not served
+    recently only (the recent ones stay the dict they were served as), the
+    scrapers still build and merge dicts. Most of the saving is the interning: menus read from
+    disk or scraped from UberEats take 1.5-10x less memory as a model, a
+    DoorDash scrape already shares its groups (ModifierGroupCache) and its
+    dicts are as small or smaller. See benchmarks/bench_menu_model.py.
+    """
+
+    store: dict
+    categories: list
+    extra: object = None
+
+    @classmethod
+    def from_dict(cls, restaurant):
+        # Content key to the one Option or OptionGroup kept for it
+        interned = {}
+        data = restaurant['data']
+        return cls(store={key: value for key, value in data.items() if key != 'categories'},
+                   categories=[Category.from_dict(category, interned) for category in data['categories']],
+                   extra={key: value for key, value in restaurant.items() if key != 'data'} or None)
+
+    def to_dict(self):
+        """Serialize to the menu dict, an option group shared by several items is one shared dict."""
+        memo = {}
+        result = {'data': {**self.store, 'categories': [category.to_dict(memo) for category in self.categories]}}
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    def item_count(self):
+        return sum(len(category.menu) for category in self.categories)
+
+
+def compact_menu(menu):
+    """Return menu as a Restaurant when it has the menu shape, otherwise as it is."""
+    if isinstance(menu, dict) and isinstance(menu.get('data'), dict) and isinstance(menu['data'].get('categories'), list):
+        return Restaurant.from_dict(menu)
+    return menu
+
+
+def menu_dict(menu):
+    return menu.to_dict() if isinstance(menu, Restaurant) else menu
@@ -0,0 +1,86 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the stage histogram buckets, from a modal read up to a whole store
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+
+COUNTERS = {
+    'items_scraped': 'Items whose details were extracted.',
+    'modal_failures': 'Item modals or dialogs that could not be read.',
+    'driver_launches': 'Browsers started.',
+    'modifier_group_hits': 'Option groups reused from an earlier item of the same scrape.',
+    'modifier_group_misses': 'Option groups read and parsed from an item modal.',
+}
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+class Metrics:
+    """Stage timings and event counters of the scrapers, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+
+    def observe(self, platform, stage, seconds):
+        with self._lock:
+            entry = self._stages.get((platform, stage))
+            if entry is None:
+                entry = self._stages[(platform, stage)] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry['buckets'][position] += 1
+            entry['sum'] += seconds
+            entry['count'] += 1
+
+    @contextmanager
+    def span(self, platform, stage):
+        """Time the block as one observation of stage, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(platform, stage, time.perf_counter() - started)
+
+    def inc(self, name, platform=None, amount=1):
+        key = (name, platform)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append('# HELP scraper_stage_duration_seconds Time spent in each scrape stage.')
+            lines.append('# TYPE scraper_stage_duration_seconds histogram')
+            for (platform, stage), entry in sorted(self._stages.items()):
+                labels = [('platform', platform), ('stage', stage)]
+                for bound, count in zip(self.buckets, entry['buckets']):
+                    lines.append(f"scraper_stage_duration_seconds_bucket{format_labels(labels + [('le', bound)])} {count}")
+                lines.append(f"scraper_stage_duration_seconds_bucket{format_labels(labels + [('le', '+Inf')])} "
+                             f"{entry['count']}")
+                lines.append(f"scraper_stage_duration_seconds_sum{format_labels(labels)} {entry['sum']}")
+                lines.append(f"scraper_stage_duration_seconds_count{format_labels(labels)} {entry['count']}")
+            for name, description in COUNTERS.items():
+                lines.append(f"# HELP scraper_{name}_total {description}")
+                lines.append(f"# TYPE scraper_{name}_total counter")
+                for (counter, platform), value in sorted(self._counters.items(), key=lambda item: str(item[0])):
+                    if counter == name:
+                        labels = [('platform', platform)] if platform else []
+                        lines.append(f"scraper_{name}_total{format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
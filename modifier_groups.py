@@ -0,0 +1,53 @@
+import threading
+from metrics import metrics
+
+
+class ModifierGroupCache:
+    """Parsed option groups of one scrape, keyed by the fingerprint the modal scripts compute.
+
+    A fingerprint hashes everything the parsed group is built from (the
+    group's rendered text and option kind), so a hit is the same group and
+    its parsed form is reused as is. Cached groups are shared between items
+    and must not be modified.
+    """
+
+    def __init__(self, platform='doordash'):
+        self.platform = platform
+        self._groups = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprints(self):
+        with self._lock:
+            return list(self._groups)
+
+    def get(self, fingerprint):
+        """Return the parsed group of fingerprint, counting a hit, or None."""
+        with self._lock:
+            group = self._groups.get(fingerprint)
+            if group is not None:
+                self.hits += 1
+        if group is not None:
+            metrics.inc('modifier_group_hits', self.platform)
+        return group
+
+    def put(self, fingerprint, group):
+        """Store a freshly parsed group, counting a miss.
+
+        Returns the cached group when another shard stored it first.
+        """
+        with self._lock:
+            self.misses += 1
+            if fingerprint:
+                group = self._groups.setdefault(fingerprint, group)
+        metrics.inc('modifier_group_misses', self.platform)
+        return group
+
+    def __contains__(self, fingerprint):
+        with self._lock:
+            return fingerprint in self._groups
+
+    def __len__(self):
+        with self._lock:
+            return len(self._groups)
@@ -0,0 +1,260 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import time
+import queue
+import atexit
+import logging
+import tempfile
+import threading
+from metrics import metrics
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, only needed for MENU_STORE_FORMAT=msgpack
+    msgpack = None
+
+# Directory the scraped menus are written to, one file per platform and menu_id
+MENU_STORE_DIR = os.environ.get('MENU_STORE_DIR', 'menus')
+# Encoding of the menu files: 'json' (compact), 'json.gz' or 'msgpack'
+MENU_STORE_FORMATS = ('json', 'json.gz', 'msgpack')
+MENU_STORE_FORMAT = os.environ.get('MENU_STORE_FORMAT', 'json')
+if MENU_STORE_FORMAT == 'msgpack' and msgpack is None:
+    logging.warning("msgpack is not installed, writing menus as json.gz")
+    MENU_STORE_FORMAT = 'json.gz'
+
+
+def store_format(fmt=None):
+    fmt = fmt or MENU_STORE_FORMAT
+    if fmt not in MENU_STORE_FORMATS:
+        raise ValueError(f"Menu store format must be one of {', '.join(MENU_STORE_FORMATS)}")
+    if fmt == 'msgpack' and msgpack is None:
+        raise ValueError("Menu store format 'msgpack' needs the msgpack package")
+    return fmt
+
+
+def menu_path(platform, menu_id, fmt=None, directory=None):
+    # menu_id comes from the request, keep it to characters that are safe in a file name
+    safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', str(menu_id)).lstrip('.')
+    return os.path.join(directory or MENU_STORE_DIR, f"{platform}_menu_{safe_id}.{store_format(fmt)}")
+
+
+def encode_menu(menu, fmt):
+    if fmt == 'msgpack':
+        return msgpack.packb(menu, use_bin_type=True)
+    data = json.dumps(menu, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if fmt == 'json.gz':
+        # Level 6 is most of the gain of 9 for a fraction of the time, mtime=0 keeps the bytes (and ETag) stable
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    return data
+
+
+def decode_menu(data, fmt):
+    if fmt == 'msgpack':
+        return msgpack.unpackb(data, raw=False)
+    if fmt == 'json.gz':
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+def path_format(path):
+    for fmt in sorted(MENU_STORE_FORMATS, key=len, reverse=True):
+        if path.endswith(f".{fmt}"):
+            return fmt
+    return 'json'
+
+
+def write_atomic(path, data):
+    """Write bytes to path through a temporary file in the same directory, so readers never see half a file."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as outfile:
+            outfile.write(data)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_menu(path):
+    with open(path, 'rb') as infile:
+        return decode_menu(infile.read(), path_format(path))
+
+
+_etags = {}
+_etags_lock = threading.Lock()
+
+
+def content_etag(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _remember_etag(path, etag):
+    stat = os.stat(path)
+    with _etags_lock:
+        _etags[path] = (stat.st_mtime_ns, stat.st_size, etag)
+
+
+def menu_etag(path):
+    """Content hash of the menu file at path, None if there is no file.
+
+    Hashes are kept per file and only recomputed when the file changes.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _etags_lock:
+        entry = _etags.get(path)
+    if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+        return entry[2]
+    try:
+        with open(path, 'rb') as infile:
+            etag = content_etag(infile.read())
+        _remember_etag(path, etag)
+    except OSError:
+        return None
+    return etag
+
+
+class MenuWriter:
+    """Background thread that writes scraped menus to disk.
+
+    save() returns at once; if the same path is saved again before it is
+    written, only the latest menu is written. on_written(path) is called
+    once the file is in place.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = {}
+        # Path to (pending menu, hash of its encoding), so a pending menu is encoded once for its ETag
+        self._pending_etags = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.writes = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.bytes_written = 0
+        self.write_time = 0.0
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='menu-writer', daemon=True)
+            self._thread.start()
+
+    def save(self, path, menu, on_written=None, platform=None):
+        with self._lock:
+            self._start()
+            if path in self._pending:
+                self.coalesced += 1
+            else:
+                self._queue.put(path)
+            self._pending[path] = (menu, on_written, platform)
+        return path
+
+    def pending(self, path):
+        # A menu saved but not yet on disk, so readers do not see the older file
+        with self._lock:
+            entry = self._pending.get(path)
+        return entry[0] if entry else None
+
+    def etag(self, path):
+        """Content hash of the menu at path as it is, or once pending, will be on disk; None without either."""
+        menu = self.pending(path)
+        if menu is None:
+            return menu_etag(path)
+        with self._lock:
+            entry = self._pending_etags.get(path)
+        if entry and entry[0] is menu:
+            return entry[1]
+        etag = content_etag(encode_menu(menu, path_format(path)))
+        with self._lock:
+            # Only remembered while the menu is still waiting, the writer drops it under the same lock
+            entry = self._pending.get(path)
+            if entry is not None and entry[0] is menu:
+                self._pending_etags[path] = (menu, etag)
+        return etag
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            try:
+                self._write(path)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path):
+        with self._lock:
+            menu, on_written, platform = self._pending[path]
+        started = time.perf_counter()
+        data = None
+        try:
+            data = encode_menu(menu, path_format(path))
+            write_atomic(path, data)
+            # Hash the bytes at hand so serving the file does not read it back
+            _remember_etag(path, content_etag(data))
+        except Exception as e:
+            logging.error(f"Could not write menu {path}: {e}")
+            data = None
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if data is None:
+                self.failures += 1
+            else:
+                self.writes += 1
+                self.bytes_written += len(data)
+                self.write_time += elapsed
+            # A newer save of the same path is queued again rather than dropped
+            if self._pending[path][0] is menu:
+                del self._pending[path]
+                self._pending_etags.pop(path, None)
+            else:
+                self._queue.put(path)
+        if data is None:
+            return
+        metrics.observe(platform or 'unknown', 'file_write', elapsed)
+        logging.info(f"Menu written to {path} ({len(data) / 1024:.0f} KiB)")
+        if on_written:
+            try:
+                on_written(path)
+            except Exception as e:
+                logging.error(f"Error after writing menu {path}: {e}")
+
+    def flush(self):
+        """Block until every saved menu is on disk."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'writes': self.writes,
+                'coalesced': self.coalesced,
+                'failures': self.failures,
+                'bytes_written': self.bytes_written,
+                'avg_write': self.write_time / self.writes if self.writes else None,
+            }
+
+
+menu_writer = MenuWriter()
+# Let queued menus reach the disk when the server shuts down
+atexit.register(menu_writer.flush)
+
+
+def load_menu(path):
+    """Return the menu saved at path, including one still waiting to be written."""
+    pending = menu_writer.pending(path)
+    if pending is not None:
+        return pending
+    return read_menu(path)
@@ -0,0 +1,253 @@
+import os
+import time
+import queue
+import logging
+import threading
+from batch import interleave_platforms
+
+# Items waiting between two stages, a full queue holds the stage before it back
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '2'))
+# Workers of each CPU-bound stage (decoding, transforming, serializing)
+PIPELINE_CPU_WORKERS = int(os.environ.get('PIPELINE_CPU_WORKERS', '2'))
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name, func, workers):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+
+    def record(self, elapsed, failed=False):
+        with self._lock:
+            self.processed += 1
+            self.busy += elapsed
+            if failed:
+                self.failed += 1
+
+    def stats(self, elapsed):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'processed': self.processed,
+                'failed': self.failed,
+                'busy': round(self.busy, 3),
+                # Share of the stage's worker time spent working rather than waiting for input
+                'utilization': round(self.busy / (elapsed * self.workers), 3) if elapsed else None,
+            }
+
+
+class Pipeline:
+    """Run items through stages, each stage on its own worker threads, linked by bounded queues.
+
+    A stage's func(item) returns False when the item is done early (e.g. a
+    cache hit) and anything else to pass it to the next stage; an exception
+    fails the item. on_finish(item, error) is called once for every item as
+    it leaves the pipeline, so resources it holds can be released.
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE, on_finish=None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_finish = on_finish
+        self._queues = []
+        self._exited = []
+        self._lock = threading.Lock()
+        self.elapsed = 0.0
+
+    def _finish(self, item, error):
+        if self.on_finish:
+            try:
+                self.on_finish(item, error)
+            except Exception as e:
+                logging.error(f"Error finishing pipeline item: {e}")
+
+    def _stage_exited(self, index):
+        # The last worker of a stage to see the end of its input passes the end on
+        with self._lock:
+            self._exited[index] += 1
+            last = self._exited[index] == self.stages[index].workers
+        if last and index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                self._queues[index + 1].put(_DONE)
+
+    def _work(self, index):
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                self._stage_exited(index)
+                return
+            started = time.perf_counter()
+            try:
+                passed = stage.func(item)
+            except Exception as e:
+                logging.error(f"Pipeline stage {stage.name} failed: {e}")
+                stage.record(time.perf_counter() - started, failed=True)
+                self._finish(item, e)
+                continue
+            stage.record(time.perf_counter() - started)
+            if passed is False or index + 1 == len(self.stages):
+                self._finish(item, None)
+            else:
+                self._queues[index + 1].put(item)
+
+    def run(self, items):
+        started = time.perf_counter()
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self._exited = [0] * len(self.stages)
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,), name=f"pipeline-{stage.name}-{worker}",
+                                          daemon=True)
+                thread.start()
+                threads.append(thread)
+        for item in items:
+            self._queues[0].put(item)
+        for _ in range(self.stages[0].workers):
+            self._queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - started
+
+    def stats(self):
+        return {stage.name: stage.stats(self.elapsed) for stage in self.stages}
+
+
+class BatchPipeline:
+    """Scrape a batch of restaurants in four pipelined stages.
+
+    load (browser): serve the cache or check out a browser, open the store
+        and read its raw page data
+    parse (CPU): decode and transform the page data into the menu
+    extract (browser): open the item modals into the menu, then return the browser
+    finish (CPU): cache and queue the menu for writing
+
+    A browser is held from load to the end of extract, so while one
+    restaurant is parsed or finished the browser of the last one already
+    loads the next. checkout() should wait until a browser is free rather
+    than time out: the browser a load waits for may sit through a parse. adapters maps a platform to an object with cached, load,
+    parse, extract and finish methods, each called with the restaurant's
+    status dict and a private state dict carrying the browser ('driver')
+    and the menu ('menu') between stages. restaurants holds the live status
+    like BatchScheduler.restaurants; platform_limit is not needed as the
+    browser stages hand restaurants over to the CPU stages instead of
+    blocking on them.
+    """
+
+    def __init__(self, entries, adapters, browsers, checkout, release, cpu_workers=PIPELINE_CPU_WORKERS,
+                 queue_size=PIPELINE_QUEUE_SIZE, progress=None):
+        self.adapters = adapters
+        self.browsers = max(1, browsers)
+        self.checkout = checkout
+        self.release = release
+        self.progress = progress
+        self.restaurants = [
+            {**entry, 'status': 'queued', 'started_at': None, 'finished_at': None, 'elapsed': None,
+             'items': None, 'error': None}
+            for entry in entries
+        ]
+        # Private per-restaurant state, kept out of the status dicts shown on /jobs
+        self._state = {id(restaurant): {} for restaurant in self.restaurants}
+        self.pipeline = Pipeline([
+            Stage('load', self._load, self.browsers),
+            Stage('parse', self._parse, cpu_workers),
+            Stage('extract', self._extract, self.browsers),
+            Stage('finish', self._finish_menu, cpu_workers),
+        ], queue_size, on_finish=self._done)
+        self._lock = threading.Lock()
+        self.done = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def _release_driver(self, state):
+        driver = state.pop('driver', None)
+        if driver is not None:
+            self.release(driver)
+
+    def _load(self, restaurant):
+        state = self._state[id(restaurant)]
+        adapter = self.adapters[restaurant['platform']]
+        restaurant['status'] = 'running'
+        restaurant['started_at'] = time.time()
+        cached = adapter.cached(restaurant, state)
+        if cached:
+            state['menu'] = cached
+            restaurant['status'] = 'cached'
+            return False
+        state['driver'] = self.checkout()
+        adapter.load(restaurant, state)
+
+    def _parse(self, restaurant):
+        state = self._state[id(restaurant)]
+        self.adapters[restaurant['platform']].parse(restaurant, state)
+        if not state.get('menu'):
+            raise ValueError('Failed to scrape the menu data')
+
+    def _extract(self, restaurant):
+        state = self._state[id(restaurant)]
+        try:
+            self.adapters[restaurant['platform']].extract(restaurant, state)
+        finally:
+            # The next restaurant can load in this browser while this one is finished
+            self._release_driver(state)
+
+    def _finish_menu(self, restaurant):
+        state = self._state[id(restaurant)]
+        self.adapters[restaurant['platform']].finish(restaurant, state)
+
+    def _done(self, restaurant, error):
+        state = self._state[id(restaurant)]
+        self._release_driver(state)
+        if error is not None:
+            logging.error(f"Error scraping {restaurant['platform']} menu {restaurant['menu_id']}: {error}")
+            restaurant['status'] = 'failed'
+            restaurant['error'] = str(error)
+        else:
+            if restaurant['status'] == 'running':
+                restaurant['status'] = 'finished'
+            menu = state.get('menu') or {}
+            restaurant['items'] = sum(len(category['menu'])
+                                      for category in menu.get('data', {}).get('categories', []))
+        restaurant['finished_at'] = time.time()
+        if restaurant['started_at']:
+            restaurant['elapsed'] = round(restaurant['finished_at'] - restaurant['started_at'], 3)
+        # The menu itself is in the cache and on disk, drop it from the batch
+        state.clear()
+        with self._lock:
+            self.done += 1
+            done = self.done
+        if self.progress:
+            self.progress(done, len(self.restaurants))
+
+    def run(self):
+        self.started_at = time.time()
+        if self.progress:
+            self.progress(0, len(self.restaurants))
+        self.pipeline.run(interleave_platforms(self.restaurants))
+        self.finished_at = time.time()
+        return self.summary()
+
+    def summary(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0
+        counts = {}
+        for restaurant in self.restaurants:
+            counts[restaurant['status']] = counts.get(restaurant['status'], 0) + 1
+        scraped = counts.get('finished', 0)
+        return {
+            'restaurants': len(self.restaurants),
+            'statuses': counts,
+            'elapsed': round(elapsed, 3),
+            # Only restaurants that needed a browser count towards the scrape rate
+            'restaurants_per_hour': round(scraped / elapsed * 3600, 1) if elapsed and scraped else None,
+            'workers': self.browsers,
+            'engine': 'pipeline',
+            'stages': self.pipeline.stats(),
+        }
@@ -0,0 +1,157 @@
+import os
+import random
+import logging
+import threading
+from contextlib import contextmanager
+
+# Block images, fonts, media and trackers in the scraping browsers
+BLOCK_RESOURCES = os.environ.get('BLOCK_RESOURCES', 'true').lower() in ('1', 'true', 'yes')
+# Share of store page loads made without blocking, so /page_loads can compare both modes in one run
+BLOCK_CONTROL_SHARE = float(os.environ.get('BLOCK_CONTROL_SHARE', '0.05'))
+
+# Network.setBlockedURLs only matches URL wildcards and has no exceptions, so resource types are
+# matched by extension and only on the platforms' own hosts. Bot checks (captcha, PerimeterX, Arkose,
+# DataDome) load their images and fonts from their own domains and are never matched.
+# The trailing * keeps query strings matching, e.g. photo.jpg?width=300
+BLOCKED_EXTENSIONS = (
+    # Images, their URLs are read from the JSON and src attributes without loading them
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'bmp', 'ico',
+    # Fonts
+    'woff', 'woff2', 'ttf', 'otf', 'eot',
+    # Media
+    'mp4', 'webm', 'm4v', 'mov', 'mp3', 'm3u8',
+)
+# Hosts whose images, fonts and media are blocked, subdomains included
+ASSET_HOSTS = ('doordash.com', 'cdn4dd.com', 'uber.com', 'ubereats.com')
+# Image CDNs whose URLs carry no extension (resized through path parameters)
+BLOCKED_HOSTS = (
+    'img.cdn4dd.com',
+    'tb-static.uber.com/prod/image-proc',
+    'dkl8of78aprwd.cloudfront.net',
+)
+# Analytics and advertising, never needed to render a menu
+TRACKER_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googleadservices.com',
+    'connect.facebook.net', 'facebook.com/tr', 'analytics.tiktok.com', 'sc-static.net', 'snap.licdn.com',
+    'bat.bing.com', 'cdn.segment.com', 'api.segment.io', 'cdn.amplitude.com', 'api2.amplitude.com',
+    'cdn.mxpnl.com', 'static.hotjar.com', 'script.hotjar.com', 'cdn.optimizely.com', 'logx.optimizely.com',
+    'cdn.branch.io', 'app.link', 'sdk.iad-01.braze.com', 'js.appboycdn.com', 'static.ads-twitter.com',
+    'ct.pinterest.com', 'criteo.com', 'quantserve.com', 'scorecardresearch.com',
+)
+# Hosts taken off the lists above, comma separated, e.g. BLOCK_ALLOWLIST=uber.com to load its images again
+BLOCK_ALLOWLIST = tuple(filter(None, os.environ.get('BLOCK_ALLOWLIST', '').split(',')))
+
+PAGE_LOAD_JS = """
+const navigation = performance.getEntriesByType('navigation')[0];
+if (!navigation) { return null; }
+const resources = performance.getEntriesByType('resource');
+let transferred = navigation.transferSize || navigation.encodedBodySize || 0;
+for (const entry of resources) { transferred += entry.transferSize || entry.encodedBodySize || 0; }
+return {
+    load: navigation.loadEventEnd > 0 ? navigation.loadEventEnd : performance.now(),
+    dom_content_loaded: navigation.domContentLoadedEventEnd,
+    transferred: transferred,
+    requests: resources.length + 1,
+};
+"""
+
+
+def blocked_url_patterns(allowlist=BLOCK_ALLOWLIST):
+    """Wildcard patterns for Network.setBlockedURLs, leaving out the hosts in allowlist."""
+    def allowed(host):
+        return any(entry in host for entry in allowlist)
+
+    patterns = [f"*://*{host}/*.{extension}*"
+                for host in ASSET_HOSTS if not allowed(host) for extension in BLOCKED_EXTENSIONS]
+    patterns += [f"*{host}*" for host in BLOCKED_HOSTS + TRACKER_HOSTS if not allowed(host)]
+    return patterns
+
+
+def apply_resource_blocking(driver, enabled=True):
+    """Turn URL blocking on or off for every later request of the driver."""
+    patterns = blocked_url_patterns() if enabled else []
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    except Exception as e:
+        logging.warning(f"Could not set up resource blocking: {e}")
+        enabled = False
+    # Remembered on the driver so page load stats can be split by mode
+    driver.blocks_resources = enabled
+    return driver
+
+
+@contextmanager
+def measured_page_load(driver, platform, control_share=BLOCK_CONTROL_SHARE):
+    """Wrap a store page load and record its stats once it completes.
+
+    A control_share of the loads of a blocking browser run with blocking
+    turned off, blocking is back on when the block exits.
+    """
+    control = getattr(driver, 'blocks_resources', False) and random.random() < control_share
+    if control:
+        apply_resource_blocking(driver, enabled=False)
+    try:
+        yield
+        page_load_stats.record(driver, platform)
+    finally:
+        if control:
+            apply_resource_blocking(driver)
+
+
+class PageLoadStats:
+    """Page load time and bytes transferred per platform, with and without resource blocking.
+
+    Sizes come from the Resource Timing API, which reports 0 for cross-origin
+    responses without Timing-Allow-Origin, so the byte counts are a lower bound.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loads = {}
+
+    def record(self, driver, platform):
+        try:
+            page = driver.execute_script(PAGE_LOAD_JS)
+        except Exception as e:
+            logging.debug(f"Could not read page load timing: {e}")
+            return None
+        if not page:
+            return None
+        mode = 'blocked' if getattr(driver, 'blocks_resources', False) else 'unblocked'
+        with self._lock:
+            entry = self._loads.setdefault((platform, mode), {'pages': 0, 'load': 0.0, 'transferred': 0,
+                                                              'requests': 0})
+            entry['pages'] += 1
+            entry['load'] += page['load'] / 1000
+            entry['transferred'] += page['transferred']
+            entry['requests'] += page['requests']
+        logging.info(f"{platform} page loaded in {page['load'] / 1000:.2f}s, "
+                     f"{page['transferred'] / 1024:.0f} KiB over {page['requests']} requests ({mode})")
+        return page
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for (platform, mode), entry in self._loads.items():
+                stats.setdefault(platform, {})[mode] = {
+                    'pages': entry['pages'],
+                    'avg_load': entry['load'] / entry['pages'],
+                    'avg_transferred': entry['transferred'] / entry['pages'],
+                    'avg_requests': entry['requests'] / entry['pages'],
+                }
+            for platform_stats in stats.values():
+                blocked = platform_stats.get('blocked')
+                unblocked = platform_stats.get('unblocked')
+                if blocked and unblocked:
+                    platform_stats['saved'] = {
+                        'load': unblocked['avg_load'] - blocked['avg_load'],
+                        'transferred': unblocked['avg_transferred'] - blocked['avg_transferred'],
+                        'load_ratio': blocked['avg_load'] / unblocked['avg_load'] if unblocked['avg_load'] else None,
+                        'transferred_ratio': (blocked['avg_transferred'] / unblocked['avg_transferred']
+                                              if unblocked['avg_transferred'] else None),
+                    }
+            return stats
+
+
+page_load_stats = PageLoadStats()
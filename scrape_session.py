@@ -0,0 +1,47 @@
+import threading
+from menu_index import MenuIndex
+from modifier_groups import ModifierGroupCache
+
+
+class ScrapeSession:
+    """State of one scrape request.
+
+    Owns the driver, the menu being filled in, the extracted item details and
+    the set of menu cards already clicked, and the option groups parsed so
+    far for reuse by later items. Shard browsers of the same scrape
+    share one session; everything is released with the session when the
+    request ends. on_event, if given, is called with (event, data) as parts
+    of the menu become available.
+    """
+
+    def __init__(self, driver, menu_id=None, on_event=None):
+        self.driver = driver
+        self.menu_id = menu_id
+        self.on_event = on_event
+        self.restaurant_detail = {}
+        self.menu_index = None
+        self.all_items_details = []
+        self.clicked_items = set()
+        self.modifier_groups = ModifierGroupCache()
+        self._lock = threading.Lock()
+
+    def set_menu(self, restaurant_detail):
+        self.restaurant_detail = restaurant_detail
+        if restaurant_detail:
+            self.menu_index = MenuIndex(restaurant_detail['data']['categories'])
+
+    def claim_item(self, item_text):
+        """Record a card as clicked, returning False if it was clicked before."""
+        with self._lock:
+            if item_text in self.clicked_items:
+                return False
+            self.clicked_items.add(item_text)
+            return True
+
+    def add_item_details(self, item_details):
+        with self._lock:
+            self.all_items_details.append(item_details)
+
+    def emit(self, event, data):
+        if self.on_event:
+            self.on_event(event, data)
@@ -0,0 +1,60 @@
+import os
+import zlib
+import logging
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# Default number of browsers used to open item modals for one restaurant
+SCRAPE_PARALLELISM = int(os.environ.get('SCRAPE_PARALLELISM', '1'))
+
+
+def shard_of(key, shard_count):
+    # Stable across processes and browsers, unlike hash()
+    return zlib.crc32(key.encode('utf-8')) % shard_count
+
+
+class ShardProgress:
+    """Progress counter shared by the shards of one scrape."""
+
+    def __init__(self, progress, total):
+        self.progress = progress
+        self.total = total
+        self.done = 0
+        self._lock = threading.Lock()
+        if progress:
+            progress(0, total)
+
+    def advance(self):
+        with self._lock:
+            self.done += 1
+            if self.progress:
+                self.progress(self.done, max(self.total, self.done))
+
+
+def share_store_context(source, target, url):
+    """Open url in target with the cookies source picked up on the same store."""
+    parts = urlsplit(url)
+    target.get(f"{parts.scheme}://{parts.netloc}/")
+    for cookie in source.get_cookies():
+        cookie.pop('sameSite', None)
+        try:
+            target.add_cookie(cookie)
+        except Exception as e:
+            logging.debug(f"Skipping cookie {cookie.get('name')}: {e}")
+    target.get(url)
+
+
+def run_shards(primary, shard_workers):
+    """Run primary() in this thread and every shard worker in its own thread."""
+    if not shard_workers:
+        primary()
+        return
+    with ThreadPoolExecutor(max_workers=len(shard_workers), thread_name_prefix='scrape-shard') as executor:
+        futures = [executor.submit(worker) for worker in shard_workers]
+        primary()
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error in scrape shard: {e}")
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from flask import Response
+
+# Seconds without an event before a heartbeat is sent, keeps proxies from closing the connection
+STREAM_HEARTBEAT = float(os.environ.get('STREAM_HEARTBEAT', '15'))
+
+
+class MenuStream:
+    """Events of one streamed scrape, handed from the scrape job to the HTTP response.
+
+    The scrape calls emit() from its worker (and shard) threads, the response
+    generator drains them in order. Events are: store (header and categories,
+    as soon as the storepage is parsed), item (one per extracted item),
+    summary at the end, or error. Each event is serialized when it is emitted,
+    so later changes to the menu do not leak into events already queued.
+    """
+
+    def __init__(self, sse=False):
+        self.sse = sse
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.items = 0
+        self.started_at = time.time()
+
+    def emit(self, event, data):
+        if event == 'item':
+            with self._lock:
+                self.items += 1
+        self._queue.put(format_event(event, data, self.sse))
+
+    def close(self):
+        self._queue.put(None)
+
+    def events(self, heartbeat=STREAM_HEARTBEAT):
+        while True:
+            try:
+                line = self._queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield format_event('heartbeat', {}, self.sse)
+                continue
+            if line is None:
+                return
+            yield line
+
+
+def format_event(event, data, sse=False):
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({'event': event, 'data': data}) + '\n'
+
+
+def wants_sse(request):
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def stream_response(lines, sse=False):
+    """Stream formatted events as NDJSON, or as Server-Sent Events when sse is set."""
+    mimetype = 'text/event-stream' if sse else 'application/x-ndjson'
+    # Ask nginx-style proxies not to buffer the stream
+    return Response(lines, mimetype=mimetype, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def run_streamed(job, stream, scrape):
+    """Job function for a streamed scrape: run scrape(job), then send the summary and close the stream.
+
+    The job keeps only the summary, the menu itself has already gone out as events.
+    """
+    try:
+        restaurant_data = scrape(job)
+        if not restaurant_data:
+            stream.emit('error', {'error': 'Failed to scrape the menu data'})
+            return None
+        summary = {
+            'menu_id': job.params.get('menu_id'),
+            'items': stream.items,
+            'elapsed': round(time.time() - stream.started_at, 3),
+            **job.info,
+        }
+        stream.emit('summary', summary)
+        return summary
+    except Exception as e:
+        logging.error(f"Error in streamed scrape {job.id}: {e}")
+        stream.emit('error', {'error': str(e)})
+        raise
+    finally:
+        stream.close()
+
+
+def streamed_job_events(job, stream):
+    # Tell the client which job it is before the first scrape event arrives
+    yield format_event('job', {'job_id': job.id, 'status_url': f"/jobs/{job.id}"}, stream.sse)
+    yield from stream.events()
+
+
+def cached_events(restaurant_data, sse=False):
+    # A cache hit streams the whole menu at once
+    yield format_event('store', restaurant_data, sse)
+    yield format_event('summary', {'menu_id': restaurant_data.get('data', {}).get('menu_id'), 'cached': True}, sse)
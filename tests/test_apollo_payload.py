@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from apollo_payload import payload_text, load_apollo_payload, extract_storepage_feed
+
+STORE = {'storeHeader': {'name': "Joe's \"Pizza\" \\ Café"}, 'itemLists': [{'name': 'Pizza', 'items': []}]}
+PAYLOAD = json.dumps({'platformProps': {'apolloCacheData': [
+    {'data': {'menuLayout': {'rows': [1, 2]}}},
+    {'data': {'storepageFeed': STORE}},
+]}}, ensure_ascii=False)
+
+
+def single_quoted(text, escape_double_quotes=False):
+    body = text.replace('\\', '\\\\').replace("'", "\\'")
+    if escape_double_quotes:
+        body = body.replace('"', '\\"')
+    return f"'{body}'"
+
+
+SCRIPTS = {
+    'string literal': f'self.__next_f.push([1,{json.dumps(PAYLOAD, ensure_ascii=False)}])',
+    'ascii string literal': f'self.__next_f.push([1,{json.dumps(PAYLOAD)}])',
+    'prefixed literal': f'self.__next_f.push([1,"5:{json.dumps(PAYLOAD, ensure_ascii=False)[1:]}])',
+    'single-quoted literal': f'self.__next_f.push([1,{single_quoted(PAYLOAD)}])',
+    'single-quoted escaped literal': f'self.__next_f.push([1,{single_quoted(PAYLOAD, True)}])',
+    'plain JSON': f'window.__APOLLO__ = {PAYLOAD};',
+}
+
+
+@pytest.mark.parametrize('name', SCRIPTS)
+def test_payload_text_unescapes_every_embedding(name):
+    assert json.loads(payload_text(SCRIPTS[name])) == json.loads(PAYLOAD)
+
+
+@pytest.mark.parametrize('name', SCRIPTS)
+def test_extract_storepage_feed(name):
+    assert extract_storepage_feed(SCRIPTS[name]) == STORE
+
+
+def test_js_only_escapes_are_read_as_the_bare_character():
+    script = 'push([1,"{\\"a\\":\\"it\\\'s \\$5\\"}"])'
+    assert load_apollo_payload(script) == {'a': "it's $5"}
+
+
+def test_falls_back_to_the_full_payload_without_the_key():
+    # An escaped character in the key hides it from the direct search, the full payload still has it
+    payload = '{"platformProps": {"apolloCacheData": [{"data": {"storepage\\u0046eed": {"x": 1}}}]}}'
+    assert extract_storepage_feed(json.dumps(payload)) == {'x': 1}
+
+
+def test_scripts_without_json_raise():
+    with pytest.raises(json.JSONDecodeError):
+        payload_text('self.__next_f.push([1,"no payload"])')
@@ -0,0 +1,87 @@
+import gzip
+
+import pytest
+from flask import Flask, jsonify
+from werkzeug.datastructures import ETags
+
+import compression
+from compression import negotiate_encoding, etag_matches, finalize_response, not_modified
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('', None),
+    ('identity', None),
+    ('gzip', 'gzip'),
+    ('gzip, deflate', 'gzip'),
+    ('GZIP;q=0.5', 'gzip'),
+    ('gzip;q=0', None),
+    ('gzip;q=nonsense', None),
+    ('*', 'gzip'),
+    ('*;q=0, gzip', 'gzip'),
+])
+def test_negotiate_gzip(header, expected, monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    assert negotiate_encoding(header) == expected
+
+
+def test_negotiate_prefers_brotli_when_installed(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', object())
+    assert negotiate_encoding('gzip, br') == 'br'
+    assert negotiate_encoding('gzip, br;q=0') == 'gzip'
+
+
+def test_etag_matches_any_encoding_of_the_content():
+    assert etag_matches(ETags(['abc']), 'abc')
+    assert etag_matches(ETags(['abc-gzip']), 'abc')
+    assert etag_matches(ETags(['other', 'abc-br']), 'abc')
+    assert not etag_matches(ETags(['abcd']), 'abc')
+    assert not etag_matches(ETags([]), 'abc')
+    assert etag_matches(ETags(star_tag=True), 'abc')
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    app = Flask(__name__)
+
+    @app.route('/menu')
+    def menu():
+        return jsonify({'items': ['pizza'] * 500})
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/stored')
+    def stored():
+        return not_modified('hash.full') or jsonify({'stored': True})
+
+    app.after_request(finalize_response)
+    return app.test_client()
+
+
+def test_responses_are_compressed_with_their_own_etag(app):
+    response = app.get('/menu', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.get_etag()[0].endswith('-gzip')
+    assert gzip.decompress(response.data).startswith(b'{')
+
+    etag = response.get_etag()[0]
+    again = app.get('/menu', headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}"'})
+    assert again.status_code == 304 and not again.data
+
+
+def test_small_responses_are_not_compressed(app):
+    response = app.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_not_modified_sends_the_negotiated_etag(app):
+    response = app.get('/stored', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"hash.full-gzip"'})
+    assert response.status_code == 304
+    assert response.get_etag()[0] == 'hash.full-gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    identity = app.get('/stored', headers={'If-None-Match': '"hash.full-gzip"'})
+    assert identity.status_code == 304 and identity.get_etag()[0] == 'hash.full'
+    assert app.get('/stored', headers={'If-None-Match': '"other"'}).status_code == 200
@@ -0,0 +1,38 @@
+from menu_cache import MenuCache
+from menu_model import Restaurant
+
+
+def menu(name):
+    group = {'name': 'Size', 'ingredients': [{'name': 'Large', 'price': 1.5}]}
+    return {'data': {'name': name, 'categories': [
+        {'title': 'Mains', 'menu': [{'name': 'Pie', 'ingredientsGroups': [group]}]}]}}
+
+
+def test_repeated_hits_return_the_same_dict():
+    cache = MenuCache(index_path='')
+    scraped = menu('a')
+    cache.put('doordash', 'a', scraped)
+    assert cache.get('doordash', 'a') is scraped
+    assert cache.get('doordash', 'a') is scraped
+
+
+def test_an_entry_holds_either_its_dict_or_its_model():
+    cache = MenuCache(index_path='', served_entries=1)
+    first, second = menu('a'), menu('b')
+    cache.put('doordash', 'a', first)
+    cache.put('doordash', 'b', second)
+    held = {key: value for key, (_, value) in cache._entries.items()}
+    assert isinstance(held['doordash:a'], Restaurant)
+    assert held['doordash:b'] is second
+
+    served = cache.get('doordash', 'a')
+    assert served == first
+    held = {key: value for key, (_, value) in cache._entries.items()}
+    assert held['doordash:a'] is served
+    assert isinstance(held['doordash:b'], Restaurant)
+
+
+def test_a_cache_without_entries_still_serves_the_menu():
+    cache = MenuCache(index_path='', max_entries=0)
+    cache.put('ubereats', 'a', menu('a'))
+    assert cache.get('ubereats', 'a') is None
@@ -0,0 +1,83 @@
+import copy
+import json
+import os
+
+import pytest
+
+from menu_format import normalize_menu, expand_menu, format_menu, format_result, parse_format
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = ('restaurant_detail.json', 'ubereats_menu_18344.json', 'ubereats_menu_18345.json')
+
+
+def load_fixture(name):
+    with open(os.path.join(ROOT, name)) as infile:
+        return json.load(infile)
+
+
+def group(name, *options, **fields):
+    return {'type': 'radio', 'name': name, 'requiresSelectionMin': 1, 'requiresSelectionMax': 1,
+            'ingredients': [{'name': option, 'price': 0} for option in options], **fields}
+
+
+@pytest.fixture
+def menu():
+    size = group('Size', 'Small', 'Large')
+    return {'data': {'menu_id': '1', 'title': 'Store', 'categories': [
+        {'title': 'Pizza', 'menu': [
+            {'name': 'Margherita', 'price': 10, 'ingredientsGroups': [size, group('Crust', 'Thin', 'Thick')]},
+            {'name': 'Marinara', 'price': 9, 'ingredientsGroups': [copy.deepcopy(size)]},
+            {'name': 'Bread', 'price': 3},
+        ]},
+        {'title': 'Drinks', 'menu': [
+            {'name': 'Soda', 'price': 2, 'ingredientsGroups': [
+                {**group('Flavor', 'Cola'), 'ingredients': [
+                    {'name': 'Cola', 'price': 0, 'ingredientsGroup': [group('Ice', 'Yes', 'No')]}]}]},
+        ]},
+    ]}}
+
+
+@pytest.mark.parametrize('name', FIXTURES)
+def test_expand_restores_the_scraped_menus(name):
+    restaurant = load_fixture(name)
+    normalized = json.loads(json.dumps(normalize_menu(restaurant)))
+    assert expand_menu(normalized) == restaurant
+
+
+def test_identical_groups_are_stored_once(menu):
+    normalized = normalize_menu(menu)
+    assert [entry['name'] for entry in normalized['ingredientsGroups']] == ['Size', 'Crust', 'Ice', 'Flavor']
+    pizzas = normalized['data']['categories'][0]['menu']
+    assert pizzas[0]['ingredientsGroups'] == [0, 1]
+    assert pizzas[1]['ingredientsGroups'] == [0]
+    assert pizzas[2] == {'name': 'Bread', 'price': 3}
+    assert expand_menu(json.loads(json.dumps(normalized))) == menu
+
+
+def test_values_equal_across_types_are_kept_apart():
+    menu = {'data': {'categories': [{'title': 'A', 'menu': [
+        {'name': 'x', 'ingredientsGroups': [{'name': 'g', 'ingredients': [{'name': 'o', 'price': 1}]}]},
+        {'name': 'y', 'ingredientsGroups': [{'name': 'g', 'ingredients': [{'name': 'o', 'price': 1.0}]}]},
+        {'name': 'z', 'ingredientsGroups': [{'name': 'g', 'ingredients': [{'name': 'o', 'price': True}]}]},
+    ]}]}}
+    normalized = normalize_menu(menu)
+    assert len(normalized['ingredients']) == 3
+    assert expand_menu(normalized) == menu
+
+
+def test_expand_leaves_full_menus_alone(menu):
+    assert expand_menu(menu) is menu
+
+
+def test_format_only_touches_menus(menu):
+    assert format_menu(menu, 'full') is menu
+    assert format_menu({'error': 'x'}, 'normalized') == {'error': 'x'}
+    wrapped = format_result({'restaurant_data': menu, 'status': 'ok'}, 'normalized')
+    assert wrapped['status'] == 'ok' and wrapped['restaurant_data']['format'] == 'normalized'
+
+
+def test_parse_format_rejects_unknown_formats():
+    assert parse_format({}) == 'full'
+    assert parse_format({'format': 'normalized'}) == 'normalized'
+    with pytest.raises(ValueError):
+        parse_format({'format': 'compact'})
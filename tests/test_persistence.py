@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+import persistence
+from persistence import MenuWriter, menu_path, read_menu, encode_menu, content_etag, path_format
+
+
+@pytest.fixture
+def writer():
+    return MenuWriter()
+
+
+def menu(title):
+    return {'data': {'title': title, 'categories': []}}
+
+
+def test_saves_of_a_pending_path_are_coalesced(writer, tmp_path, monkeypatch):
+    release = threading.Event()
+    write = writer._write
+
+    def held_write(path):
+        release.wait(5)
+        write(path)
+
+    monkeypatch.setattr(writer, '_write', held_write)
+    path = str(tmp_path / 'doordash_menu_1.json')
+    written = []
+    writer.save(path, menu('first'), on_written=written.append)
+    writer.save(path, menu('second'), on_written=written.append)
+    writer.save(path, menu('third'), on_written=written.append)
+    assert writer.pending(path) == menu('third')
+    release.set()
+    writer.flush()
+    assert read_menu(path) == menu('third')
+    assert writer.pending(path) is None
+    stats = writer.stats()
+    assert stats['writes'] == 1 and stats['coalesced'] == 2
+    assert written == [path]
+
+
+def test_a_save_during_the_write_is_written_after_it(writer, tmp_path, monkeypatch):
+    path = str(tmp_path / 'doordash_menu_1.json')
+    first_writing = threading.Event()
+    write_atomic = persistence.write_atomic
+
+    def save_again(target, data):
+        if not first_writing.is_set():
+            first_writing.set()
+            writer.save(path, menu('second'))
+        write_atomic(target, data)
+
+    monkeypatch.setattr(persistence, 'write_atomic', save_again)
+    writer.save(path, menu('first'))
+    writer.flush()
+    assert read_menu(path) == menu('second')
+    assert writer.stats()['writes'] == 2
+
+
+def test_failed_writes_are_counted(writer, tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    writer.save(str(blocker / 'doordash_menu_1.json'), menu('x'))
+    writer.flush()
+    assert writer.stats()['failures'] == 1
+    assert writer.pending(str(blocker / 'doordash_menu_1.json')) is None
+
+
+@pytest.mark.parametrize('fmt', ['json', 'json.gz'])
+def test_pending_and_written_menus_have_the_same_etag(writer, tmp_path, monkeypatch, fmt):
+    release = threading.Event()
+    write = writer._write
+    monkeypatch.setattr(writer, '_write', lambda path: (release.wait(5), write(path)))
+    path = menu_path('doordash', '1', fmt, str(tmp_path))
+    writer.save(path, menu('x'))
+    pending_etag = writer.etag(path)
+    assert pending_etag == content_etag(encode_menu(menu('x'), path_format(path)))
+    release.set()
+    writer.flush()
+    assert writer.etag(path) == pending_etag
+
+
+def test_menu_path_keeps_ids_safe(tmp_path):
+    assert menu_path('ubereats', '../etc/passwd', 'json', str(tmp_path)) == \
+        str(tmp_path / 'ubereats_menu__etc_passwd.json')
+
+
+def test_an_etag_computed_as_the_write_finishes_is_not_kept(writer, tmp_path, monkeypatch):
+    path = menu_path('doordash', '1', 'json', str(tmp_path))
+    encode = persistence.encode_menu
+    written = threading.Event()
+
+    def encode_while_writing(value, fmt):
+        # The etag() call encodes the pending menu, the write completes before it records the hash
+        if threading.current_thread().name != 'menu-writer' and not written.is_set():
+            writer.flush()
+            written.set()
+        return encode(value, fmt)
+
+    monkeypatch.setattr(persistence, 'encode_menu', encode_while_writing)
+    writer.save(path, menu('first'))
+    writer.etag(path)
+    assert writer._pending_etags == {}
+
+    writer.save(path, menu('second'))
+    writer.flush()
+    assert writer.etag(path) == content_etag(encode(menu('second'), 'json'))
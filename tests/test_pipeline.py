@@ -0,0 +1,194 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import Pipeline, Stage, BatchPipeline
+
+
+class FakePool:
+    """Checkout/release pair recording every browser handed out."""
+
+    def __init__(self, size):
+        self._free = [f"driver-{index}" for index in range(size)]
+        self._condition = threading.Condition()
+        self.checked_out = []
+        self.released = []
+
+    def checkout(self):
+        with self._condition:
+            while not self._free:
+                self._condition.wait()
+            driver = self._free.pop()
+            self.checked_out.append(driver)
+            return driver
+
+    def release(self, driver):
+        with self._condition:
+            self.released.append(driver)
+            self._free.append(driver)
+            self._condition.notify()
+
+
+class FakeAdapter:
+    """Fails the restaurant whose menu_id names a stage, serves menu_id 'cached' from the cache."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, stage, restaurant):
+        with self._lock:
+            self.calls.append((stage, restaurant['menu_id']))
+        if restaurant['menu_id'] == stage:
+            raise RuntimeError(f"{stage} failed")
+
+    def cached(self, restaurant, state):
+        if restaurant['menu_id'] == 'cached':
+            return {'data': {'categories': [{'menu': [{}]}]}}
+        return None
+
+    def load(self, restaurant, state):
+        assert state['driver']
+        self._call('load', restaurant)
+        state['raw'] = restaurant['menu_id']
+
+    def parse(self, restaurant, state):
+        self._call('parse', restaurant)
+        if state.pop('raw') != 'empty':
+            state['menu'] = {'data': {'categories': [{'menu': [{}, {}]}]}}
+
+    def extract(self, restaurant, state):
+        assert state['driver']
+        self._call('extract', restaurant)
+
+    def finish(self, restaurant, state):
+        self._call('finish', restaurant)
+
+
+def run_batch(menu_ids, browsers=2, cpu_workers=2, queue_size=1):
+    pool = FakePool(browsers)
+    adapter = FakeAdapter()
+    entries = [{'platform': ('doordash', 'ubereats')[index % 2], 'url': f"https://store/{menu_id}",
+                'menu_id': menu_id} for index, menu_id in enumerate(menu_ids)]
+    progress = []
+    batch = BatchPipeline(entries, {'doordash': adapter, 'ubereats': adapter}, browsers, pool.checkout,
+                          pool.release, cpu_workers=cpu_workers, queue_size=queue_size,
+                          progress=lambda done, total: progress.append((done, total)))
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(summary=batch.run()))
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), 'BatchPipeline.run() did not return'
+    return batch, pool, adapter, progress, result['summary']
+
+
+def test_pipeline_passes_every_item_through_every_stage():
+    seen = {name: [] for name in ('first', 'second', 'third')}
+    lock = threading.Lock()
+
+    def stage(name):
+        def func(item):
+            with lock:
+                seen[name].append(item)
+        return func
+
+    finished = []
+    pipeline = Pipeline([Stage('first', stage('first'), 3), Stage('second', stage('second'), 1),
+                         Stage('third', stage('third'), 4)], queue_size=1,
+                        on_finish=lambda item, error: finished.append((item, error)))
+    pipeline.run(range(50))
+    for name in seen:
+        assert sorted(seen[name]) == list(range(50))
+    assert sorted(finished) == [(item, None) for item in range(50)]
+    # Every worker of every stage saw the end of its input and exited
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('pipeline-')]
+    assert pipeline.stats()['third']['processed'] == 50
+
+
+def test_pipeline_with_no_items_returns():
+    pipeline = Pipeline([Stage('only', lambda item: None, 2), Stage('next', lambda item: None, 3)])
+    pipeline.run([])
+    assert pipeline.stats()['only']['processed'] == 0
+
+
+def test_pipeline_stops_failed_and_early_items():
+    reached = []
+
+    def first(item):
+        if item == 1:
+            raise ValueError('bad item')
+        return item != 2
+
+    finished = {}
+    pipeline = Pipeline([Stage('first', first, 2), Stage('second', reached.append, 2)],
+                        on_finish=lambda item, error: finished.setdefault(item, error))
+    pipeline.run([0, 1, 2, 3])
+    assert sorted(reached) == [0, 3]
+    assert isinstance(finished.pop(1), ValueError)
+    assert finished == {0: None, 2: None, 3: None}
+    assert pipeline.stats()['first']['failed'] == 1
+
+
+def test_pipeline_survives_a_failing_on_finish():
+    def on_finish(item, error):
+        raise RuntimeError('cleanup failed')
+
+    pipeline = Pipeline([Stage('only', lambda item: None, 2)], on_finish=on_finish)
+    pipeline.run(range(5))
+    assert pipeline.stats()['only']['processed'] == 5
+
+
+def test_batch_scrapes_every_restaurant():
+    batch, pool, adapter, progress, summary = run_batch([str(index) for index in range(9)])
+    assert [restaurant['status'] for restaurant in batch.restaurants] == ['finished'] * 9
+    assert all(restaurant['items'] == 2 and restaurant['elapsed'] is not None for restaurant in batch.restaurants)
+    assert summary['statuses'] == {'finished': 9}
+    assert progress[0] == (0, 9) and progress[-1] == (9, 9)
+    assert sorted(pool.released) == sorted(pool.checked_out)
+    assert len(pool.checked_out) == 9
+
+
+@pytest.mark.parametrize('failing_stage', ['load', 'parse', 'extract', 'finish', 'empty'])
+def test_batch_releases_browsers_when_a_stage_fails(failing_stage):
+    menu_ids = ['1', failing_stage, '2', '3']
+    batch, pool, adapter, progress, summary = run_batch(menu_ids, browsers=1)
+    statuses = {restaurant['menu_id']: restaurant['status'] for restaurant in batch.restaurants}
+    assert statuses == {'1': 'finished', failing_stage: 'failed', '2': 'finished', '3': 'finished'}
+    failed = next(restaurant for restaurant in batch.restaurants if restaurant['menu_id'] == failing_stage)
+    assert failed['error']
+    # Each browser checked out is released exactly once, whichever stage failed
+    assert len(pool.checked_out) == len(menu_ids)
+    assert sorted(pool.released) == sorted(pool.checked_out)
+    assert progress[-1] == (4, 4)
+
+
+def test_batch_serves_cache_hits_without_a_browser():
+    batch, pool, adapter, progress, summary = run_batch(['cached', '1', 'cached'])
+    assert [restaurant['status'] for restaurant in batch.restaurants] == ['cached', 'finished', 'cached']
+    assert batch.restaurants[0]['items'] == 1
+    assert len(pool.checked_out) == 1
+    # Cache hits leave the pipeline at the load stage
+    assert {stage for stage, menu_id in adapter.calls if menu_id == 'cached'} == set()
+    assert summary['stages']['parse']['processed'] == 1
+
+
+def test_batch_loads_the_next_restaurant_while_the_last_is_finished():
+    finishing = threading.Event()
+    loaded_while_finishing = []
+
+    class SlowFinish(FakeAdapter):
+        def load(self, restaurant, state):
+            loaded_while_finishing.append(finishing.is_set())
+            super().load(restaurant, state)
+
+        def finish(self, restaurant, state):
+            finishing.set()
+            time.sleep(0.05)
+            finishing.clear()
+
+    pool = FakePool(1)
+    adapter = SlowFinish()
+    entries = [{'platform': 'doordash', 'url': 'u', 'menu_id': str(index)} for index in range(4)]
+    BatchPipeline(entries, {'doordash': adapter}, 1, pool.checkout, pool.release, cpu_workers=1).run()
+    assert any(loaded_while_finishing)
@@ -4,10 +4,13 @@ import re
 import logging
 from flask import Flask, request, jsonify, Blueprint
 from selenium.webdriver.common.by import By
-from seleniumbase import Driver
+from driver_pool import create_driver, quit_driver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime
+from menu_index import index_for
+from persistence import menu_writer, menu_path
+from resource_blocking import measured_page_load
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,17 +21,19 @@ ubereats_bp = Blueprint('ubereats', __name__)
 class UberEatsSpider:
     def __init__(self):
         # Initialize the driver with undetectable mode enabled
-        self.driver = Driver(uc=True, undetectable=True, headless=True)
+        self.driver = create_driver(profile='ubereats')
         self.driver.set_window_size(1024, 768)  # Set window size for consistency
         self.data = {}  # Initialize a dictionary to store the data
         self.section_names = set()  # Initialize a set to store unique section names
+        self.menu_index = None  # MenuIndex of the menu being filled in
 
     def parse(self, url, menu_id):
         # Load the URL using Selenium
-        self.driver.get(url)
-        # Try reloading the page after initial load to ensure it functions properly
-        time.sleep(5)  # Give it a moment to load the initial elements
-        self.driver.refresh()  # Manually refresh the page
+        with measured_page_load(self.driver, 'ubereats'):
+            self.driver.get(url)
+            # Try reloading the page after initial load to ensure it functions properly
+            time.sleep(5)  # Give it a moment to load the initial elements
+            self.driver.refresh()  # Manually refresh the page
         self.handle_delivery_popup()
 
         # Wait for the necessary elements to load
@@ -352,22 +357,17 @@ class UberEatsSpider:
         if not item_name:
             return menu
 
-        for section in menu:
-            for menu_item in section['menu']:
-                if menu_item['name'] == item_name:
-                    menu_item['ingredientsGroups'] = item_details['item_details']
-                    if image_url:
-                        menu_item['image_url'] = image_url
-                    return menu
+        # Update every listing of the item, e.g. when it also appears under a featured section
+        self.menu_index = index_for(menu, self.menu_index)
+        for menu_item in self.menu_index.lookup(item_name):
+            menu_item['ingredientsGroups'] = item_details['item_details']
+            if image_url:
+                menu_item['image_url'] = image_url
 
         return menu
 
-    def save_data_to_file(self, filename='ubereats_data.json'):
-        with open(filename, 'w') as f:
-            json.dump(self.data, f, indent=4)
-
     def close(self):
-        self.driver.quit()
+        quit_driver(self.driver)
 
 @ubereats_bp.route('/ubereats_get_menu', methods=['POST'])
 def scrape():
@@ -381,7 +381,8 @@ def scrape():
     try:
         restaurant_data = spider.parse(url, menu_id)
         if restaurant_data:
-            spider.save_data_to_file(f"ubereats_menu_{menu_id}.json")
+            # Written in the background, the response does not wait for the disk
+            menu_writer.save(menu_path('ubereats', menu_id), restaurant_data)
             return jsonify({
                 'restaurant_data': restaurant_data
             }), 200
@@ -0,0 +1,107 @@
+import time
+import logging
+import threading
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# How often conditions are re-checked while waiting
+POLL_INTERVAL = 0.1
+
+# Fixed sleeps each wait stage replaced, used to report the time saved
+LEGACY_SLEEPS = {
+    'apollo_script': 50,
+    'menu_items': 10,
+    'scroll_step': 2,
+    'item_modal': 5,
+    'modal_closed': 5,
+    'ubereats_modal': 10,
+}
+
+ITEM_MODAL_SNAPSHOT_JS = """
+const modal = document.querySelector('[data-testid="ItemModal"]');
+if (!modal || !modal.getClientRects().length) { return null; }
+const title = modal.querySelector('h2');
+if (!title || !title.textContent.trim()) { return null; }
+return [title.textContent.trim(), modal.querySelectorAll('div[role="group"]').length,
+        modal.querySelectorAll('label').length].join('|');
+"""
+
+
+class WaitTimings:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, elapsed, timed_out=False):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0})
+            entry['count'] += 1
+            entry['total'] += elapsed
+            entry['max'] = max(entry['max'], elapsed)
+            if timed_out:
+                entry['timeouts'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for stage, entry in self._stages.items():
+                stage_stats = dict(entry)
+                stage_stats['avg'] = entry['total'] / entry['count']
+                if stage in LEGACY_SLEEPS:
+                    stage_stats['saved'] = entry['count'] * LEGACY_SLEEPS[stage] - entry['total']
+                stats[stage] = stage_stats
+            return stats
+
+
+wait_timings = WaitTimings()
+
+
+def wait_until(driver, condition, stage, timeout, required=True):
+    """Poll condition until it holds and record how long the stage waited.
+
+    When required is False a timeout is logged and None returned instead of raising.
+    """
+    start = time.monotonic()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(condition)
+    except TimeoutException:
+        elapsed = time.monotonic() - start
+        wait_timings.record(stage, elapsed, timed_out=True)
+        if required:
+            raise
+        logging.info(f"Wait '{stage}' gave up after {elapsed:.2f}s")
+        return None
+    elapsed = time.monotonic() - start
+    wait_timings.record(stage, elapsed)
+    logging.info(f"Wait '{stage}' satisfied after {elapsed:.2f}s")
+    return result
+
+
+class ScriptSettled:
+    """Condition that holds once a script returns the same non-null value twice in a row."""
+
+    def __init__(self, script, *args):
+        self.script = script
+        self.args = args
+        self.previous = None
+
+    def __call__(self, driver):
+        current = driver.execute_script(self.script, *self.args)
+        if current is not None and current == self.previous:
+            return current
+        self.previous = current
+        return False
+
+
+def item_modal_filled():
+    # The modal is visible, titled and its option groups stopped changing
+    return ScriptSettled(ITEM_MODAL_SNAPSHOT_JS)
+
+
+def elements_settled(xpath):
+    # The number of matching elements is non-zero and stopped changing
+    return ScriptSettled(
+        "const n = document.evaluate('count(' + arguments[0] + ')', document, null, "
+        "XPathResult.NUMBER_TYPE, null).numberValue; return n > 0 ? n : null;",
+        xpath,
+    )